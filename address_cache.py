@@ -0,0 +1,160 @@
+"""
+Cache for parsed address records.
+
+Classes:
+- AddressCache(maxsize, path):
+    Bounded, least-recently-used cache of scourgify address records keyed by the
+    raw address string, optionally persisted to a local SQLite file so that later
+    runs can reuse earlier results.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class AddressCache:
+    """
+    Least-recently-used cache of normalized address records.
+
+    Records are kept in memory up to `maxsize` entries; the least recently used
+    entry is evicted when the bound is exceeded. When `path` is given, records are
+    also stored in a SQLite file. Entries evicted from memory are still found on
+    disk, and new records are written in batches when `flush` or `close` is called.
+
+    A cached value of None means the address could not be normalized, so failures
+    are not re-parsed either. The cache can be shared between threads.
+
+    Args:
+        maxsize (int): Maximum number of records kept in memory.
+        path (str, optional): Path of the SQLite file used to persist records.
+    """
+
+    def __init__(self, maxsize=100_000, path=None):
+        if maxsize < 1:
+            raise ValueError("Parameter 'maxsize' must be at least 1.")
+
+        self.maxsize = maxsize
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._records = OrderedDict()
+        self._pending = {}
+        self._connection = None
+        self._lock = threading.RLock()
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS addresses "
+                "(address TEXT PRIMARY KEY, record TEXT)"
+            )
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, address, default=None):
+        """
+        Returns the cached record for an address, counting a hit or a miss.
+
+        Args:
+            address (str): The raw address string.
+            default: Value returned when the address is not cached.
+
+        Returns:
+            dict or None: The cached record, or `default` on a miss.
+        """
+        with self._lock:
+            record = self._records.get(address, _MISSING)
+            if record is not _MISSING:
+                self._records.move_to_end(address)
+                self.hits += 1
+                return record
+
+            record = self._load(address)
+            if record is not _MISSING:
+                self._remember(address, record)
+                self.hits += 1
+                return record
+
+            self.misses += 1
+            return default
+
+    def __contains__(self, address):
+        with self._lock:
+            return address in self._records or self._load(address) is not _MISSING
+
+    def put(self, address, record):
+        """
+        Stores the record for an address.
+
+        Args:
+            address (str): The raw address string.
+            record (dict or None): The normalized record, or None if normalization failed.
+        """
+        with self._lock:
+            self._remember(address, record)
+            if self._connection is not None:
+                self._pending[address] = record
+
+    def flush(self):
+        """
+        Writes records added since the last flush to the SQLite file, if any.
+        """
+        with self._lock:
+            if self._connection is None or not self._pending:
+                return
+
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO addresses (address, record) VALUES (?, ?)",
+                    [
+                        (address, json.dumps(record))
+                        for address, record in self._pending.items()
+                    ],
+                )
+            self._pending.clear()
+
+    def close(self):
+        """
+        Flushes pending records and closes the SQLite file, if any.
+        """
+        with self._lock:
+            self.flush()
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def stats(self):
+        """
+        Returns hit and miss counts.
+
+        Returns:
+            dict: The 'hits', 'misses' and in-memory 'size' of the cache.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    def _remember(self, address, record):
+        self._records[address] = record
+        self._records.move_to_end(address)
+        if len(self._records) > self.maxsize:
+            self._records.popitem(last=False)
+
+    def _load(self, address):
+        if address in self._pending:
+            return self._pending[address]
+        if self._connection is None:
+            return _MISSING
+
+        row = self._connection.execute(
+            "SELECT record FROM addresses WHERE address = ?", (address,)
+        ).fetchone()
+        return _MISSING if row is None else json.loads(row[0])
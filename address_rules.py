@@ -0,0 +1,309 @@
+"""
+Rule-based normalization of well-formed addresses.
+
+Most addresses in the exports are plain "123 N MAIN ST" streets, or the "street, city,
+state, ZIP" strings built by `data_processing.standardize_address`. Tagging them with
+the usaddress CRF model through scourgify is the slowest step of the pipeline. This
+module normalizes such addresses with a tokenizer and the USPS Publication 28 suffix,
+directional and unit abbreviations instead, and gives the same record as
+`scourgify.normalize_address_record`.
+
+The rules only accept addresses whose tagging is unambiguous. Anything else, such as
+a street name containing a word that is also a suffix, a unit, a directional, a state
+or a pre-type such as "CAMINO", an unknown suffix, "CT" (also a state), "#" units or a
+missing ZIP code, is left to scourgify.
+
+Functions:
+- normalize_address_record(address):
+    Normalizes a well-formed address like scourgify, or returns None.
+"""
+
+import re
+
+# USPS street suffixes (Publication 28, appendix C1) and their abbreviation. Only the
+# standard abbreviations and the most common full names are included: the usaddress
+# model does not always tag rarer full names such as "EXPRESSWAY" as a suffix
+STREET_SUFFIXES = {
+    "ALY": "ALY",
+    "AVE": "AVE",
+    "AVENUE": "AVE",
+    "BLVD": "BLVD",
+    "BOULEVARD": "BLVD",
+    "CIR": "CIR",
+    "DR": "DR",
+    "DRIVE": "DR",
+    "EXPY": "EXPY",
+    "FWY": "FWY",
+    "HWY": "HWY",
+    "LN": "LN",
+    "LANE": "LN",
+    "PKWY": "PKWY",
+    "PL": "PL",
+    "RD": "RD",
+    "SQ": "SQ",
+    "ST": "ST",
+    "STREET": "ST",
+    "TER": "TER",
+    "TRL": "TRL",
+    "WAY": "WAY",
+}
+
+# Directionals and their abbreviation
+DIRECTIONALS = {
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "NORTHEAST": "NE",
+    "NORTHWEST": "NW",
+    "SOUTHEAST": "SE",
+    "SOUTHWEST": "SW",
+    "N": "N",
+    "S": "S",
+    "E": "E",
+    "W": "W",
+    "NE": "NE",
+    "NW": "NW",
+    "SE": "SE",
+    "SW": "SW",
+}
+
+# Unit designators (Publication 28, appendix C2) and their abbreviation
+UNIT_TYPES = {
+    "APT": "APT",
+    "SUITE": "STE",
+    "STE": "STE",
+    "UNIT": "UNIT",
+}
+
+# State abbreviations, as written in the exports
+STATES = frozenset(
+    "AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO MT "
+    "NE NV NH NJ NM NY NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY".split()
+)
+
+# Every word of the USPS street suffixes (Publication 28, appendix C1) and of the
+# route types such as "COUNTY ROAD", in all the forms scourgify abbreviates, which
+# include "LA" for "LN"
+SUFFIX_WORDS = frozenset(
+    "ALLEE ALLEY ALLY ALY ANEX ANNEX ANNX ANX ARC ARCADE AV AVE AVEN AVENU AVENUE AVN "
+    "AVNUE BAYOO BAYOU BCH BEACH BEND BG BGS BLF BLFS BLUF BLUFF BLUFFS BLVD BND BOT "
+    "BOTTM BOTTOM BOUL BOULEVARD BOULV BR BRANCH BRDGE BRG BRIDGE BRK BRKS BRNCH BROOK "
+    "BROOKS BTM BURG BURGS BYP BYPA BYPAS BYPASS BYPS BYU CAMP CANYN CANYON CAPE "
+    "CAUSEWAY CAUSWAY CEN CENT CENTER CENTERS CENTR CENTRE CIR CIRC CIRCL CIRCLE "
+    "CIRCLES CIRS CK CLB CLF CLFS CLIFF CLIFFS CLUB CMN CMP CNTER CNTR CNYN COMMON COR "
+    "CORNER CORNERS CORS COUNTY COURSE COURT COURTS COVE COVES CP CPE CR CRCL CRCLE "
+    "CRECENT CREEK CRES CRESCENT CRESENT CREST CRK CROSSING CROSSROAD CRSCNT CRSE "
+    "CRSENT CRSNT CRSSING CRSSNG CRST CRT CSWY CT CTR CTRS CTS CURV CURVE CV CVS CYN "
+    "DALE DAM DIV DIVIDE DL DM DR DRIV DRIVE DRIVES DRS DRV DV DVD EST ESTATE ESTATES "
+    "ESTS EXP EXPR EXPRESS EXPRESSWAY EXPW EXPY EXT EXTENSION EXTENSIONS EXTN EXTNSN "
+    "EXTS FALL FALLS FERRY FIELD FIELDS FLAT FLATS FLD FLDS FLS FLT FLTS FORD FORDS "
+    "FOREST FORESTS FORG FORGE FORGES FORK FORKS FORT FRD FRDS FREEWAY FREEWY FRG FRGS "
+    "FRK FRKS FRRY FRST FRT FRWAY FRWY FRY FT FWY GARDEN GARDENS GARDN GATEWAY GATEWY "
+    "GATWAY GDN GDNS GLEN GLENS GLN GLNS GRDEN GRDN GRDNS GREEN GREENS GRN GRNS GROV "
+    "GROVE GROVES GRV GRVS GTWAY GTWY HARB HARBOR HARBORS HARBR HAVEN HAVN HBR HBRS "
+    "HEIGHT HEIGHTS HGTS HIGHWAY HIGHWY HILL HILLS HIWAY HIWY HL HLLW HLS HOLLOW "
+    "HOLLOWS HOLW HOLWS HRBOR HT HTS HVN HWAY HWY INLET INLT IS ISLAND ISLANDS ISLE "
+    "ISLES ISLND ISLNDS ISS JCT JCTION JCTN JCTNS JCTS JUNCTION JUNCTIONS JUNCTN "
+    "JUNCTON KEY KEYS KNL KNLS KNOL KNOLL KNOLLS KY KYS LA LAKE LAKES LAND LANDING "
+    "LANE LANES LCK LCKS LDG LDGE LF LGT LGTS LIGHT LIGHTS LK LKS LN LNDG LNDNG LOAF "
+    "LOCK LOCKS LODG LODGE LOOP LOOPS MALL MANOR MANORS MDW MDWS MEADOW MEADOWS MEDOWS "
+    "MEWS MILL MILLS MISSION MISSN ML MLS MNR MNRS MNT MNTAIN MNTN MNTNS MOTORWAY "
+    "MOUNT MOUNTAIN MOUNTAINS MOUNTIN MSN MSSN MT MTIN MTN MTNS MTWY NCK NECK OPAS "
+    "ORCH ORCHARD ORCHRD OVAL OVERPASS OVL PARK PARKS PARKWAY PARKWAYS PARKWY PASS "
+    "PASSAGE PATH PATHS PIKE PIKES PINE PINES PK PKWAY PKWY PKWYS PKY PL PLACE PLAIN "
+    "PLAINES PLAINS PLAZA PLN PLNS PLZ PLZA PNE PNES POINT POINTS PORT PORTS PR "
+    "PRAIRIE PRARIE PRK PRR PRT PRTS PSGE PT PTS RAD RADIAL RADIEL RADL RAMP RANCH "
+    "RANCHES RAPID RAPIDS RD RDG RDGE RDGS RDS REST RIDGE RIDGES RIV RIVER RIVR RNCH "
+    "RNCHS ROAD ROADS ROUTE ROW RPD RPDS RST RT RTE RUE RUN RVR SHL SHLS SHOAL SHOALS "
+    "SHOAR SHOARS SHORE SHORES SHR SHRS SKWY SKYWAY SMT SPG SPGS SPNG SPNGS SPRING "
+    "SPRINGS SPRNG SPRNGS SPUR SPURS SQ SQR SQRE SQRS SQS SQU SQUARE SQUARES ST STA "
+    "STATE STATION STATN STN STR STRA STRAV STRAVE STRAVEN STRAVENUE STRAVN STREAM "
+    "STREET STREETS STREME STRM STRT STRVN STRVNUE STS SUMIT SUMITT SUMMIT TER TERR "
+    "TERRACE THROUGHWAY TPK TPKE TR TRACE TRACES TRACK TRACKS TRAFFICWAY TRAIL TRAILS "
+    "TRAK TRCE TRFY TRK TRKS TRL TRLS TRNPK TRPK TRWY TUNEL TUNL TUNLS TUNNEL TUNNELS "
+    "TUNNL TURNPIKE TURNPK UN UNDERPASS UNION UNIONS UNS UPAS US VALLEY VALLEYS VALLY "
+    "VDCT VIA VIADCT VIADUCT VIEW VIEWS VILL VILLAG VILLAGE VILLAGES VILLE VILLG "
+    "VILLIAGE VIS VIST VISTA VL VLG VLGS VLLY VLY VLYS VST VSTA VW VWS WALK WALKS WALL "
+    "WAY WAYS WELL WELLS WL WLS WY XING XRD".split()
+)
+
+# Every form of the unit designators, as abbreviated by scourgify
+UNIT_WORDS = frozenset(
+    "APARTMENT APT BASEMENT BLDG BSMT BUILDING DEPARTMENT DEPT FL FLOOR FRNT FRONT "
+    "HANGER HNGR KEY LBBY LOBBY LOT LOWER LOWR OFC OFFICE PENTHOUSE PH PIER REAR RM "
+    "ROOM SIDE SLIP SPACE SPC STE STOP SUITE TRAILER TRLR UNIT UPPER".split()
+)
+
+# Words of post office box and rural route addresses, which scourgify rejects or
+# tags apart from the street
+PO_BOX_WORDS = frozenset(["PO", "BOX", "RR", "HC", "HCR"])
+
+# Street types written before the name, as in "CAMINO REAL" or "FM 1960" (farm to
+# market road). The model tags them as a pre-type, and scourgify then leaves the
+# suffix unabbreviated and the unit in the first line
+PRE_TYPE_WORDS = frozenset(
+    "ALAMEDA AVENIDA CALLE CALLEJON CAMINITO CAMINO CARRETERA CERRADA CIRCULO ENTRADA "
+    "FM PASEO PLACITA RUE SR VEREDA VIA".split()
+)
+
+# Words the model reads as part of a place or building rather than a street name, as
+# in "74951 BUSINESS CITY WAY" ("74951 BUSINESS" in "CITY WAY")
+PLACE_WORDS = frozenset(["CITY", "STATES", "TOWER"])
+
+# Words inside a name of several words after which the model may end the street
+# name, as in "4003 CENTURY SAN PKWY" ("4003 CENTURY")
+NAME_BREAK_WORDS = frozenset(["AND", "SAN"])
+
+# Words that make the tagging of a city ambiguous
+RESERVED_WORDS = (
+    frozenset(STREET_SUFFIXES) | frozenset(DIRECTIONALS) | frozenset(UNIT_TYPES)
+)
+
+# Words that make the tagging of a street name ambiguous: the usaddress model may
+# read any suffix, unit designator, directional, state or pre-type in a name as such,
+# as in "1 LA CIENEGA BLVD" ("1 LN CIENEGA BLVD") or "3 HIGHWAY DR" ("3 HWY DR")
+RESERVED_NAME_WORDS = (
+    RESERVED_WORDS
+    | SUFFIX_WORDS
+    | UNIT_WORDS
+    | PO_BOX_WORDS
+    | STATES
+    | PRE_TYPE_WORDS
+    | PLACE_WORDS
+)
+
+# Only plain ASCII addresses are normalized; other characters need scourgify's
+# Unicode cleaning
+ADDRESS_PATTERN = re.compile(r"[A-Za-z0-9 ,.]+")
+# Periods are dropped unless they are decimal points, as in scourgify
+PERIOD_PATTERN = re.compile(r"\.(?!\d)")
+HOUSE_NUMBER_PATTERN = re.compile(r"[1-9]\d*")
+NAME_PATTERN = re.compile(r"[A-Z]{2,}|\d*(?:1ST|2ND|3RD|[04-9]TH|1[1-3]TH)")
+UNIT_ID_PATTERN = re.compile(r"\d+[A-Z]?|[A-Z]")
+CITY_WORD_PATTERN = re.compile(r"[A-Z]{3,}")
+ZIP_CODE_PATTERN = re.compile(r"\d{5}(?:-\d{4})?")
+
+# Maximum number of words of a street name or city
+MAX_NAME_WORDS = 3
+
+
+def normalize_address_record(address):
+    """
+    Normalizes a well-formed address like scourgify, or returns None.
+
+    Two forms are accepted, in any letter case and with periods after abbreviations:
+
+    - A street line: a house number, an optional directional, a street name of one to
+      three words (one after a directional), a suffix and an optional unit, such as
+      "123 N Main St Apt 4".
+    - A street line followed by a city, a state abbreviation and a ZIP code, separated
+      by commas, such as "123 Main St, Los Angeles, CA, 90001".
+
+    Args:
+        address (str): The address to be normalized.
+
+    Returns:
+        dict: The normalized record, with the "address_line_1", "address_line_2",
+        "city", "state" and "postal_code" values `scourgify.normalize_address_record`
+        gives, or None if the address is not in one of the accepted forms.
+    """
+    if not isinstance(address, str) or not ADDRESS_PATTERN.fullmatch(address):
+        return None
+
+    parts = [
+        part.split() for part in PERIOD_PATTERN.sub("", address).upper().split(",")
+    ]
+    if len(parts) == 1:
+        city = state = postal_code = None
+    elif len(parts) == 4:
+        city, state, postal_code = _parse_last_line(*parts[1:])
+        if city is None:
+            return None
+    else:
+        return None
+
+    street = _parse_street_line(parts[0])
+    if street is None:
+        return None
+    address_line_1, address_line_2 = street
+
+    return {
+        "address_line_1": address_line_1,
+        "address_line_2": address_line_2,
+        "city": city,
+        "state": state,
+        "postal_code": postal_code,
+    }
+
+
+def _parse_street_line(tokens):
+    """
+    Returns the normalized first and second address lines of the tokens of a street
+    line, or None.
+    """
+    # Optional unit at the end
+    address_line_2 = None
+    if len(tokens) >= 2 and tokens[-2] in UNIT_TYPES:
+        # "APT E" may also be read as a directional
+        if tokens[-1] in DIRECTIONALS or not UNIT_ID_PATTERN.fullmatch(tokens[-1]):
+            return None
+        address_line_2 = f"{UNIT_TYPES[tokens[-2]]} {tokens[-1]}"
+        tokens = tokens[:-2]
+
+    if len(tokens) < 3 or not HOUSE_NUMBER_PATTERN.fullmatch(tokens[0]):
+        return None
+    words = [tokens[0]]
+    tokens = tokens[1:]
+
+    # Optional directional before the name. A directional after the suffix is left
+    # to scourgify, which may read it as a unit
+    pre_directional = None
+    if tokens[0] in DIRECTIONALS:
+        pre_directional = DIRECTIONALS[tokens[0]]
+        tokens = tokens[1:]
+
+    # After a directional, the model may read a name of several words, such as
+    # "SANTA FE", as a city
+    name, suffix = tokens[:-1], tokens[-1] if tokens else None
+    max_words = 1 if pre_directional else MAX_NAME_WORDS
+    if suffix not in STREET_SUFFIXES or not 1 <= len(name) <= max_words:
+        return None
+    if any(
+        word in RESERVED_NAME_WORDS or not NAME_PATTERN.fullmatch(word) for word in name
+    ):
+        return None
+    # Ordinals are only read as a name on their own, as in "3RD ST", and the model
+    # may read the last two words of a name ending in two letters, such as
+    # "SANTA FE", as a city and a state
+    if len(name) > 1 and (
+        any(word[0].isdigit() or word in NAME_BREAK_WORDS for word in name)
+        or len(name[-1]) < 3
+    ):
+        return None
+
+    if pre_directional:
+        words.append(pre_directional)
+    words.extend(name)
+    words.append(STREET_SUFFIXES[suffix])
+    return " ".join(words), address_line_2
+
+
+def _parse_last_line(city, state, postal_code):
+    """
+    Returns the city, state and ZIP code of the tokens of the last line, or a tuple of
+    None.
+    """
+    if (
+        not 1 <= len(city) <= MAX_NAME_WORDS
+        or any(
+            word in RESERVED_WORDS or not CITY_WORD_PATTERN.fullmatch(word)
+            for word in city
+        )
+        or len(state) != 1
+        or state[0] not in STATES
+        or len(postal_code) != 1
+        or not ZIP_CODE_PATTERN.fullmatch(postal_code[0])
+    ):
+        return None, None, None
+    return " ".join(city), state[0], postal_code[0]
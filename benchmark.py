@@ -0,0 +1,771 @@
+"""
+Benchmark of the report pipeline on synthetic Traumasoft and Call the Car exports.
+
+Generates realistic Download*.csv (Call the Car) and dispatch*.csv (Traumasoft) files of
+configurable size, address cardinality and match rate, then times each stage of the
+pipeline separately and saves the results as JSON so that runs can be compared between
+commits. Everything runs offline.
+
+Functions:
+- generate_exports(directory, rows, addresses, match_rate, files, seed):
+    Writes synthetic Download and dispatch CSV files to a directory.
+
+- run_benchmark(rows, addresses, match_rate, files, seed, trace_memory):
+    Times each pipeline stage on generated exports of the given size.
+
+- compare_csv_engines(rows, repeat, seed):
+    Times reading generated dispatch exports with each CSV engine.
+
+- compare_join_engines(rows, repeat, seed):
+    Times the merge of generated prepared data with each join engine.
+
+- time_trailing_row_cleanup(rows, repeat):
+    Times the removal of the footer rows of a dispatch export on its own.
+
+- measure_startup(repeat):
+    Times the startup of fresh interpreters running the command-line script.
+
+Usage:
+    python benchmark.py [--rows N [N ...]] [--addresses N] [--match-rate R]
+                        [--files N] [--seed N] [--trace-memory] [--no-copy-on-write]
+                        [--engine-rows N] [--join-rows N [N ...]] [--cleanup-rows N]
+                        [--startup-repeat N]
+                        [--output FILE]
+
+Example:
+    $ python benchmark.py --rows 1000 100000 --output bench.json
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import data_processing as dt
+import engines
+import pipeline
+import profiling
+import schema
+
+FIRST_NAMES = [
+    "John",
+    "Maria",
+    "Wei",
+    "Aisha",
+    "Carlos",
+    "Linda",
+    "Omar",
+    "Grace",
+    "David",
+    "Sofia",
+    "Minh",
+    "Fatima",
+    "Jose",
+    "Emily",
+    "Hiroshi",
+    "Ana",
+    "Robert",
+    "Priya",
+]
+LAST_NAMES = [
+    "Smith",
+    "Garcia",
+    "Chen",
+    "Khan",
+    "Lopez",
+    "Nguyen",
+    "Brown",
+    "Kim",
+    "Patel",
+    "Martinez",
+    "Johnson",
+    "Hernandez",
+    "Lee",
+    "Gonzalez",
+    "Wilson",
+    "Tanaka",
+]
+STREET_NAMES = [
+    "Main",
+    "Oak",
+    "Park",
+    "3rd",
+    "Sunset",
+    "Maple",
+    "Elm",
+    "Colorado",
+    "Glenoaks",
+    "Brand",
+    "Lake",
+    "Washington",
+    "Figueroa",
+    "Vermont",
+    "Olive",
+    "Hill",
+]
+STREET_SUFFIXES = ["Street", "St", "Ave", "Avenue", "Blvd", "Dr", "Road", "Way"]
+DIRECTIONALS = ["", "", "", "N ", "S ", "E ", "W ", "north "]
+UNITS = ["", "", "", "", " Apt 5", " Suite 200", " Unit B"]
+CITIES = [
+    ("Los Angeles", "90001"),
+    ("Pasadena", "91101"),
+    ("Glendale", "91203"),
+    ("Burbank", "91502"),
+    ("Long Beach", "90802"),
+    ("Torrance", "90501"),
+]
+LEVELS_OF_SERVICE = ["BLS", "ALS", "CCT", "Gurney"]
+COMMENTS = [
+    "Wait time: 0 minutes//Dx ESRD// None//H: 5'5 W:110 lbs.",
+    "Wait time: 90 minutes//Oxygen 1L Deep suction /Height 5'4  Weight 147 lbs.// Oxygen//Wait4Return//Deep suction//Resp Therapist REQ//H: 5'4 W:147 lbs.",
+    "Wait time: 0 minutes//// Deep suction//Resp Therapist REQ//H: 4'8 W:112 lbs.",
+    "Wait time: 30 minutes//RT on board //TBAR 2 LITERS// Deep suction//H: 4'8 W:112 lbs.",
+    "Wait time: 0 minutes//Traumatic brain injury// // Vent//Resp Therapist REQ//Trach Tube//H: 5'8 W:124 lbs.",
+    "Wait time: 0 minutes//DX abdominal pain// has cane// covid negative// Cane//Call Upon Arrival//H: 5'6 W:150 lbs.",
+]
+
+DOWNLOAD_FIELDS = [
+    "Trip ID",
+    "Date of Service",
+    "First Name",
+    "Last Name",
+    "Origin Street",
+    "Origin City",
+    "Origin State",
+    "Origin Postal",
+    "Origin Comments",
+    "Destination Street",
+    "Destination City",
+    "Destination State",
+    "Destination Postal",
+    "Pickup Time",
+    "Appointment Time",
+    "LOS",
+    "Status",
+    "Member ID",
+    "Notes",
+]
+DISPATCH_FIELDS = [
+    "Run #",
+    "Date of Service",
+    "Patient Name",
+    "PU Address",
+    "At Scene",
+    "At Destination",
+    "Pickup Time",
+    "LOS",
+    "Status",
+    "Crew",
+    "Driver's License",
+    "VIN",
+    "Miles",
+    "Unit",
+    "Billing Notes",
+]
+
+
+def _make_addresses(rng, count):
+    addresses = []
+    for _ in range(count):
+        city, postal = rng.choice(CITIES)
+        street = (
+            f"{rng.randint(1, 19999)} {rng.choice(DIRECTIONALS)}"
+            f"{rng.choice(STREET_NAMES)} {rng.choice(STREET_SUFFIXES)}{rng.choice(UNITS)}"
+        )
+        addresses.append((street, city, postal))
+    return addresses
+
+
+def generate_exports(directory, rows, addresses=3000, match_rate=0.8, files=1, seed=0):
+    """
+    Writes synthetic Download and dispatch CSV files to a directory.
+
+    Each Call the Car trip gets a patient, a date in June 2024, pick up and drop off
+    addresses drawn from `addresses` distinct addresses, and an origin comment. A share
+    of `match_rate` of the trips also appear in the dispatch export with the same
+    patient, date and pick up street, sometimes in different letter case. Dispatch
+    files end with the blank and "Total:" footer rows of the real exports.
+
+    Args:
+        directory (str): The directory the files are written to.
+        rows (int): Number of Call the Car trips.
+        addresses (int): Number of distinct addresses.
+        match_rate (float): Share of trips that also appear in the dispatch export.
+        files (int): Number of Download/dispatch file pairs the rows are split over.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: The number of 'download_rows' and 'dispatch_rows' written.
+    """
+    rng = random.Random(seed)
+    address_pool = _make_addresses(rng, max(1, addresses))
+    dispatch_rows = 0
+
+    for file_number in range(files):
+        start = rows * file_number // files
+        end = rows * (file_number + 1) // files
+        download_path = os.path.join(directory, f"Download_{file_number:03d}.csv")
+        dispatch_path = os.path.join(directory, f"dispatch_{file_number:03d}.csv")
+
+        with (
+            open(download_path, "w", newline="", encoding="utf-8") as download_file,
+            open(dispatch_path, "w", newline="", encoding="utf-8") as dispatch_file,
+        ):
+            download_writer = csv.writer(download_file)
+            dispatch_writer = csv.writer(dispatch_file)
+            download_writer.writerow(DOWNLOAD_FIELDS)
+            dispatch_writer.writerow(DISPATCH_FIELDS)
+
+            for trip in range(start, end):
+                first_name = rng.choice(FIRST_NAMES)
+                last_name = rng.choice(LAST_NAMES)
+                month_day = f"06/{rng.randint(1, 30):02d}/2024"
+                pickup_street, pickup_city, pickup_postal = rng.choice(address_pool)
+                dropoff_street, dropoff_city, dropoff_postal = rng.choice(address_pool)
+                level_of_service = rng.choice(LEVELS_OF_SERVICE)
+                pickup_hour = rng.randint(6, 18)
+
+                download_writer.writerow(
+                    [
+                        100000 + trip,
+                        month_day.lstrip("0"),
+                        f"{first_name} ",
+                        last_name,
+                        pickup_street,
+                        pickup_city,
+                        "CA",
+                        pickup_postal,
+                        rng.choice(COMMENTS),
+                        dropoff_street,
+                        dropoff_city,
+                        "CA",
+                        dropoff_postal,
+                        f"{pickup_hour:02d}:00",
+                        f"{pickup_hour + 1:02d}:00",
+                        level_of_service,
+                        "Completed",
+                        f"M{rng.randint(10000000, 99999999)}",
+                        "Synthetic trip generated for benchmarking",
+                    ]
+                )
+
+                if rng.random() >= match_rate:
+                    continue
+
+                dispatch_rows += 1
+                run_number = str(500000 + trip)
+                if rng.random() < 0.1:
+                    run_number += "-1"
+                dispatch_writer.writerow(
+                    [
+                        run_number,
+                        month_day,
+                        f"{last_name}, {first_name}",
+                        pickup_street.upper() if rng.random() < 0.5 else pickup_street,
+                        f"{month_day} {pickup_hour:02d}:05",
+                        f"{month_day} {pickup_hour:02d}:45",
+                        f"{pickup_hour:02d}:00",
+                        level_of_service,
+                        "Closed",
+                        f"{rng.choice(LAST_NAMES)}, {rng.choice(FIRST_NAMES)}",
+                        f"D{rng.randint(1000000, 9999999)}",
+                        f"1FTBF2A6{rng.randint(100000000, 999999999)}",
+                        rng.randint(1, 60),
+                        f"Unit {rng.randint(1, 40)}",
+                        "",
+                    ]
+                )
+
+            # Footer rows of the Traumasoft export
+            dispatch_writer.writerow([""] * len(DISPATCH_FIELDS))
+            dispatch_writer.writerow(["Total:"] + [""] * (len(DISPATCH_FIELDS) - 1))
+
+    return {"download_rows": rows, "dispatch_rows": dispatch_rows}
+
+
+def run_benchmark(
+    rows, addresses=3000, match_rate=0.8, files=1, seed=0, trace_memory=False
+):
+    """
+    Times each pipeline stage on generated exports of the given size.
+
+    The stages follow `main.main`: load, trailing-row cleanup, preparation of the
+    dispatch and download data with `data_processing.prepare_dispatch_df` and
+    `data_processing.prepare_download_df` (dates, comments, names and addresses),
+    merge, unmatched diagnostics, fuzzy matching of the unmatched trips, and write. The
+    address cache is reset first, so address normalization starts cold.
+
+    Args:
+        rows (int): Number of Call the Car trips.
+        addresses (int): Number of distinct addresses.
+        match_rate (float): Share of trips that also appear in the dispatch export.
+        files (int): Number of Download/dispatch file pairs the rows are split over.
+        seed (int): Seed of the random generator.
+        trace_memory (bool): If True, also measure the peak memory allocated in each
+            stage with tracemalloc. Tracing slows every stage down.
+
+    Returns:
+        dict: The parameters, row counts, the seconds spent in each stage and, if
+        traced, the peak megabytes allocated in each stage.
+    """
+    stages = {}
+    peak_memory = {}
+    profiler = profiling.StageProfiler(trace_memory=trace_memory)
+    if trace_memory:
+        tracemalloc.start()
+
+    def timed(name, function, *args, **kwargs):
+        with profiler.stage(name) as record:
+            result = function(*args, **kwargs)
+        stages[name] = record.wall_time
+        if record.peak_memory is not None:
+            peak_memory[name] = record.peak_memory / 2**20
+        return result
+
+    dt.configure_address_cache()
+
+    with tempfile.TemporaryDirectory() as directory:
+        counts = generate_exports(directory, rows, addresses, match_rate, files, seed)
+        _, download_files, dispatch_files = dt.list_input_files(directory)
+
+        def read(file, file_type):
+            file_schema = schema.schema_for(file_type)
+            file_path = os.path.join(directory, file)
+            return pd.read_csv(
+                file_path,
+                header=0,
+                index_col=False,
+                usecols=file_schema.select(
+                    pd.read_csv(file_path, nrows=0).columns, file
+                ),
+                dtype=file_schema.dtypes,
+            )
+
+        def load():
+            return (
+                pd.concat(
+                    [read(file, "Download") for file in download_files],
+                    ignore_index=True,
+                ),
+                pd.concat(
+                    [read(file, "dispatch") for file in dispatch_files],
+                    ignore_index=True,
+                ),
+            )
+
+        ctc_df, ts_df = timed("load", load)
+        ts_df = timed(
+            "trailing_row_cleanup", dt.remove_trailing_nan_rows, ts_df, "Run #"
+        )
+
+        ts_df = timed("dispatch_preparation", dt.prepare_dispatch_df, ts_df)
+        ctc_df = timed("download_preparation", dt.prepare_download_df, ctc_df)
+        merged_df = timed("merge", pipeline.merge_report, ctc_df, ts_df)
+        timed("diagnostics", pipeline.diagnose_unmatched, ctc_df, ts_df)
+        timed("fuzzy_match", pipeline.fuzzy_match_report, ctc_df, ts_df)
+        timed(
+            "write",
+            dt.write_report,
+            merged_df,
+            os.path.join(directory, "merged.csv"),
+        )
+
+    if trace_memory:
+        tracemalloc.stop()
+
+    return {
+        "parameters": {
+            "rows": rows,
+            "addresses": addresses,
+            "match_rate": match_rate,
+            "files": files,
+            "seed": seed,
+            "copy_on_write": pd.options.mode.copy_on_write,
+        },
+        "rows": {**counts, "merged_rows": len(merged_df)},
+        "address_cache": dt.address_cache.stats(),
+        "address_parser": dt.address_parser_stats(),
+        "stages": stages,
+        "total": sum(stages.values()),
+        "peak_memory": peak_memory or None,
+    }
+
+
+def compare_csv_engines(rows=200_000, repeat=3, seed=0):
+    """
+    Times reading generated dispatch exports with each CSV engine.
+
+    A dispatch file of `rows` runs is read with `data_processing.read_input_file` and
+    each engine of `data_processing.CSV_ENGINES`, `repeat` times, keeping the fastest
+    run. The memory of the resulting DataFrame, strings included, is measured too.
+    Engines that are not installed are skipped.
+
+    Args:
+        rows (int): Number of dispatch runs.
+        repeat (int): Number of reads with each engine.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: The seconds of the fastest read and the megabytes of the DataFrame, for
+        each engine.
+    """
+    timings = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # Every trip is dispatched, so the dispatch file has `rows` runs
+        generate_exports(directory, rows, match_rate=1.0, seed=seed)
+        _, _, dispatch_files = dt.list_input_files(directory)
+        file_path = os.path.join(directory, dispatch_files[0])
+
+        for engine in dt.CSV_ENGINES:
+            if dt.resolve_csv_engine(engine) != engine:
+                continue
+
+            runs = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                df, _ = dt.read_input_file(file_path, "dispatch", engine=engine)
+                runs.append(time.perf_counter() - start)
+            timings[engine] = {
+                "seconds": min(runs),
+                "memory": df.memory_usage(deep=True).sum() / 2**20,
+            }
+    return timings
+
+
+def compare_join_engines(rows=1_000_000, repeat=3, seed=0):
+    """
+    Times the merge of generated prepared data with each join engine.
+
+    `rows` trips and as many runs are generated directly as prepared DataFrames, four
+    in five of them matching, so that only the merge is timed. Each installed engine of
+    `engines.JOIN_ENGINES` runs `pipeline.merge_report` `repeat` times, and the join of
+    the encoded keys is also timed on its own.
+
+    Args:
+        rows (int): Number of trips and of runs.
+        repeat (int): Number of merges with each engine.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: The seconds of the fastest join and of the fastest whole merge, and the
+        number of merged rows, for each engine.
+    """
+    rng = random.Random(seed)
+    patients = [
+        f"{last}, {first} {number}"
+        for last in LAST_NAMES
+        for first in FIRST_NAMES
+        for number in range(max(rows // 2000, 1))
+    ]
+    addresses = [street for street, _, _ in _make_addresses(rng, 3000)]
+    dates = pd.date_range("2024-01-01", periods=365).tolist()
+    trips = [
+        (rng.choice(patients), rng.choice(dates), rng.choice(addresses))
+        for _ in range(rows)
+    ]
+    # Unmatched runs are picked up somewhere else
+    runs = [
+        trip if rng.random() < 0.8 else (trip[0], trip[1], rng.choice(addresses))
+        for trip in trips
+    ]
+    rng.shuffle(runs)
+
+    def frame(keys, columns):
+        df = pd.DataFrame(keys, columns=pipeline.JOIN_COLUMNS)
+        for column in columns:
+            df[column] = "2024-01-01 08:30" if column.startswith("At ") else "value"
+        return df
+
+    ts_df = frame(runs, pipeline.TS_REPORT_COLUMNS)
+    ctc_df = frame(trips, pipeline.CTC_REPORT_COLUMNS)
+    ts_codes, ctc_codes, _ = pipeline.encode_join_keys(ts_df, ctc_df)
+
+    timings = {}
+    for name, (engine_class, package) in engines.JOIN_ENGINES.items():
+        if package is not None and importlib.util.find_spec(package) is None:
+            continue
+
+        engine = engine_class()
+        joins, merges = [], []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            engine.join(ts_codes, ctc_codes, pipeline.JOIN_COLUMNS)
+            joins.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            merged_df = pipeline.merge_report(
+                ctc_df, ts_df, pipeline.ReportConfig(engine=name)
+            )
+            merges.append(time.perf_counter() - start)
+        timings[name] = {
+            "join": min(joins),
+            "merge_report": min(merges),
+            "merged_rows": len(merged_df),
+        }
+    return timings
+
+
+def time_trailing_row_cleanup(rows=1_000_000, repeat=5):
+    """
+    Times the removal of the footer rows of a dispatch export on its own.
+
+    `data_processing.remove_trailing_nan_rows` is run `repeat` times on a "Run #"
+    column of `rows` run numbers, one in ten with a trip number, followed by the blank
+    and "Total:" footer rows. The column is timed as Python strings (C parser), as Arrow
+    strings (pyarrow engine, when installed) and as numbers (columnar input files).
+
+    Args:
+        rows (int): Number of runs.
+        repeat (int): Number of runs of each case.
+
+    Returns:
+        dict: The seconds of the fastest run of each column type.
+    """
+    runs = [f"{500000 + run}{'-1' if run % 10 == 0 else ''}" for run in range(rows)]
+    cases = {"object": pd.DataFrame({"Run #": runs + [None, "Total:"]})}
+    if dt.resolve_csv_engine("pyarrow") == "pyarrow":
+        cases["string[pyarrow]"] = cases["object"].astype("string[pyarrow]")
+    cases["numeric"] = pd.DataFrame({"Run #": [*range(rows), None]}, dtype="float64")
+
+    timings = {}
+    for name, df in cases.items():
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            dt.remove_trailing_nan_rows(df, "Run #")
+            durations.append(time.perf_counter() - start)
+        timings[name] = min(durations)
+    return timings
+
+
+# Commands timed by measure_startup, each run in a fresh interpreter
+STARTUP_COMMANDS = {
+    "interpreter": ["-c", "pass"],
+    "main_help": ["main.py", "--help"],
+    "import_pipeline": ["-c", "import pipeline"],
+    "first_address": [
+        "-c",
+        "import data_processing as dt; dt.parse_address('1 Main St, Los Angeles, CA 90001')",
+    ],
+}
+
+
+def measure_startup(repeat=5):
+    """
+    Times the startup of fresh interpreters running the command-line script.
+
+    Each command in `STARTUP_COMMANDS` is run `repeat` times and the fastest run is
+    kept: the bare interpreter, `main.py --help`, importing the pipeline (pandas), and
+    parsing a first address (scourgify and the usaddress model).
+
+    Args:
+        repeat (int): Number of runs of each command.
+
+    Returns:
+        dict: The seconds of the fastest run of each command.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    timings = {}
+    for name, arguments in STARTUP_COMMANDS.items():
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, *arguments],
+                cwd=directory,
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+            runs.append(time.perf_counter() - start)
+        timings[name] = min(runs)
+    return timings
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """
+    Entry point of the benchmark.
+
+    Runs the benchmark for each requested size, prints the stage timings and saves
+    all results as JSON.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        type=int,
+        nargs="+",
+        default=[1_000, 10_000, 100_000],
+        help="Numbers of Call the Car trips to benchmark (default: 1000 10000 100000).",
+    )
+    parser.add_argument(
+        "--addresses",
+        type=int,
+        default=3000,
+        help="Number of distinct addresses (default: 3000).",
+    )
+    parser.add_argument(
+        "--match-rate",
+        type=float,
+        default=0.8,
+        help="Share of trips that also appear in the dispatch export (default: 0.8).",
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=1,
+        help="Number of Download/dispatch file pairs (default: 1).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0).")
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Also measure the peak memory allocated in each stage (slower).",
+    )
+    parser.add_argument(
+        "--no-copy-on-write",
+        action="store_true",
+        help="Run with pandas copy-on-write disabled, for comparison.",
+    )
+    parser.add_argument(
+        "--engine-rows",
+        type=int,
+        default=200_000,
+        help="Number of rows of the dispatch export read with each CSV engine, or 0 to "
+        "skip the engine comparison (default: 200000).",
+    )
+    parser.add_argument(
+        "--join-rows",
+        type=int,
+        nargs="+",
+        default=[100_000, 1_000_000],
+        help="Numbers of trips and runs merged with each join engine, or 0 to skip the "
+        "engine comparison (default: 100000 1000000).",
+    )
+    parser.add_argument(
+        "--cleanup-rows",
+        type=int,
+        default=1_000_000,
+        help="Number of runs of the trailing row cleanup micro-benchmark, or 0 to skip "
+        "it (default: 1000000).",
+    )
+    parser.add_argument(
+        "--startup-repeat",
+        type=int,
+        default=5,
+        help="Number of runs of each startup command, or 0 to skip the startup "
+        "benchmark (default: 5).",
+    )
+    parser.add_argument(
+        "--output",
+        default="benchmark.json",
+        help="JSON file the results are saved to (default: benchmark.json).",
+    )
+    args = parser.parse_args()
+
+    pd.set_option("mode.copy_on_write", not args.no_copy_on_write)
+
+    results = []
+    for rows in args.rows:
+        result = run_benchmark(
+            rows,
+            args.addresses,
+            args.match_rate,
+            args.files,
+            args.seed,
+            trace_memory=args.trace_memory,
+        )
+        results.append(result)
+
+        print(f"\n{rows} rows ({result['rows']['merged_rows']} merged)")
+        peak_memory = result["peak_memory"] or {}
+        for stage, seconds in result["stages"].items():
+            line = f"  {stage:<22}{seconds:>10.3f} s"
+            if stage in peak_memory:
+                line += f"{peak_memory[stage]:>10.1f} MB peak"
+            print(line)
+        print(f"  {'total':<22}{result['total']:>10.3f} s")
+        if result["address_parser"]["hit_rate"] is not None:
+            print(
+                f"  {'address fast path':<22}"
+                f"{result['address_parser']['hit_rate']:>10.1%} of parsed addresses"
+            )
+
+    csv_engines = None
+    if args.engine_rows > 0:
+        csv_engines = compare_csv_engines(args.engine_rows, seed=args.seed)
+        print(f"\nCSV engines ({args.engine_rows} dispatch rows)")
+        for engine, result in csv_engines.items():
+            print(
+                f"  {engine:<22}{result['seconds']:>10.3f} s"
+                f"{result['memory']:>10.1f} MB"
+            )
+
+    join_engines = {}
+    for rows in args.join_rows:
+        if rows <= 0:
+            continue
+        join_engines[rows] = compare_join_engines(rows, seed=args.seed)
+        print(f"\nJoin engines ({rows} trips and runs)")
+        for engine, result in join_engines[rows].items():
+            print(
+                f"  {engine:<22}{result['join']:>10.3f} s join"
+                f"{result['merge_report']:>10.3f} s merge"
+            )
+
+    cleanup = None
+    if args.cleanup_rows > 0:
+        cleanup = time_trailing_row_cleanup(args.cleanup_rows)
+        print(f"\nTrailing row cleanup ({args.cleanup_rows} runs)")
+        for name, seconds in cleanup.items():
+            print(f"  {name:<22}{seconds:>10.3f} s")
+
+    startup = None
+    if args.startup_repeat > 0:
+        startup = measure_startup(args.startup_repeat)
+        print("\nStartup")
+        for name, seconds in startup.items():
+            print(f"  {name:<22}{seconds:>10.3f} s")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "pandas": pd.__version__,
+                "results": results,
+                "csv_engines": csv_engines,
+                "join_engines": join_engines or None,
+                "trailing_row_cleanup": cleanup,
+                "startup": startup,
+            },
+            f,
+            indent=2,
+        )
+
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
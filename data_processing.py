@@ -2,34 +2,168 @@
 Utilities for manipulating dataframes and normalizing addresses.
 
 Functions:
+- combine_csv_files(input_files, chunksize, read_workers, engine):
+    Combines the "Download" and "dispatch" CSV files into two DataFrames.
+
+- resolve_csv_engine(engine):
+    Returns the CSV engine to read with, falling back to pandas without pyarrow.
+
+- list_input_files(input_files):
+    Lists the "Download" and "dispatch" input files in a directory or a list of files.
+
+    Input files can be CSV, Parquet or Feather files (see `INPUT_EXTENSIONS`).
+
+- read_input_file(file_path, file_type, chunksize, engine):
+    Reads one "Download" or "dispatch" CSV, Parquet or Feather file.
+
 - remove_trailing_nan_rows(df, column_name):
-    Removes rows from a dataframe starting from the first row where the specified
-    column has NaN values.
+    Removes the footer rows of a dispatch export, and any other row without a valid
+    run number in the specified column.
 
 - extract_wait_time_and_oxygen(comment):
     Extracts wait time in minutes and oxygen volume in liters from a comment string.
 
+- extract_wait_time_and_oxygen_columns(comments):
+    Extracts wait time and oxygen volume from a Series of comment strings.
+
+- prepare_dispatch_df(df, workers):
+    Cleans and normalizes Traumasoft dispatch data before it is merged.
+
+- prepare_download_df(df, workers):
+    Extracts, standardizes and normalizes Call the Car download data before it is merged.
+
 - standardize_name(df):
     Combines 'First Name' and 'Last Name' into 'Patient Name' in the DataFrame.
 
 - standardize_address(df):
     Standardizes address columns and creates new combined address columns in the DataFrame.
 
+- normalize_date_column(dates):
+    Parses a Series of date strings into datetime64 values used as join keys.
+
+- format_date_column(dates):
+    Formats a Series of datetime64 values as "M/D/YYYY" strings.
+
+- configure_address_cache(maxsize, path):
+    Replaces the address cache used by the normalization functions.
+
+- parse_address(address):
+    Parses an address into its normalized components, using the address cache.
+
+- address_parser_stats():
+    Returns how many parsed addresses took the rule-based fast path.
+
 - normalize_address(address):
     Normalizes an address and returns the first line of the normalized address.
 
 - normalize_and_concatenate_address(address):
     Normalizes an address and concatenates its components into a single string.
+
+- parse_addresses(addresses, workers):
+    Parses addresses that are not cached yet, across a process pool for large inputs.
+
+- normalize_address_columns(columns, concatenate, workers):
+    Normalizes the addresses in one or more Series, parsing each distinct address once.
+
+- apply_report_dtypes(df):
+    Gives the report columns explicit types for columnar output formats.
+
+- check_compression(compression):
+    Checks that a CSV compression is supported and its package is installed.
+
+- write_report(df, output_file, output_format, compression, chunksize):
+    Writes the merged report as CSV, Parquet or Feather, atomically.
+
+- iter_report_csv(df, chunksize):
+    Yields the merged report as CSV text, one chunk of rows at a time.
 """
 
+import gzip
+import importlib.util
+import multiprocessing
 import os
 import re
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 
 import pandas as pd
-from scourgify import normalize_address_record
 
-
-def combine_csv_files(input_files):
+import address_rules
+from address_cache import AddressCache
+from profiling import profiled
+from schema import DISPATCH_SCHEMA, DOWNLOAD_SCHEMA, schema_for
+
+# Parsed address records shared by normalize_address and normalize_and_concatenate_address
+address_cache = AddressCache()
+_NOT_CACHED = object()
+
+# Number of addresses parsed by the rules of `address_rules` and by scourgify
+_parser_counts = {"fast_path": 0, "scourgify": 0}
+_parser_counts_lock = threading.Lock()
+
+# Patterns to match wait time and oxygen in CTC origin comments
+WAIT_TIME_PATTERN = re.compile(r"Wait time:\s*(\d+)\s*minutes", re.IGNORECASE)
+OXYGEN_PATTERN = re.compile(
+    r"(\d+)\s*(?:liter|liters|LPM|L|lts|LITERS|lt|l)\b", re.IGNORECASE
+)
+
+# Run numbers of the Traumasoft export, such as "5001" or "5001-1"
+RUN_NUMBER_PATTERN = re.compile(r"\d+(-\d+)?$")
+
+# Phrases implying an oxygen requirement even when no volume is given
+OXYGEN_KEYWORDS = ["Therapist REQ", "Deep suction", "Vent", "tracheostomy"]
+OXYGEN_KEYWORDS_PATTERN = re.compile("|".join(map(re.escape, OXYGEN_KEYWORDS)))
+
+# Input files can be exported as CSV or converted to a columnar format
+INPUT_EXTENSIONS = (".csv", ".parquet", ".feather")
+
+# Formats the merged report can be written in
+OUTPUT_FORMATS = ("csv", "parquet", "feather")
+
+# Compressions of CSV reports and the suffix they add to the file name
+CSV_COMPRESSIONS = {"gzip": ".gz", "zstd": ".zst"}
+
+# Number of report rows converted to CSV and written at a time
+WRITE_CHUNK_ROWS = 50_000
+
+# Engines CSV files can be read with: pandas' C parser, or pyarrow's multi-threaded
+# parser with string columns kept in Arrow memory
+CSV_ENGINES = ("pandas", "pyarrow")
+
+# Values read as missing, the default `na_values` of `pd.read_csv`
+CSV_NA_VALUES = [
+    "",
+    "#N/A",
+    "#N/A N/A",
+    "#NA",
+    "-1.#IND",
+    "-1.#QNAN",
+    "-NaN",
+    "-nan",
+    "1.#IND",
+    "1.#QNAN",
+    "<NA>",
+    "N/A",
+    "NA",
+    "NULL",
+    "NaN",
+    "None",
+    "n/a",
+    "nan",
+    "null",
+]
+
+# Format of "Date of Service" in the Traumasoft and CTC exports
+DATE_FORMAT = "%m/%d/%Y"
+
+# Below this many uncached addresses, parsing serially is faster than starting workers
+PARALLEL_MIN_ADDRESSES = 2000
+
+
+@profiled("combine_csv_files")
+def combine_csv_files(input_files, chunksize=None, read_workers=None, engine="pandas"):
     """
     Combine CSV files from a specified directory or a list of files into two DataFrames.
 
@@ -38,11 +172,33 @@ def combine_csv_files(input_files):
     and one for "dispatch" files. For "dispatch" files, trailing rows with NaN values in a
     specified column are removed.
 
+    Only the columns of the schema of each file type are read, with their declared
+    dtypes, so every chunk and file gets the same types (see `read_input_file`). When
+    `chunksize` is given, each file is streamed in chunks of that many rows, and
+    "dispatch" chunks are cleaned as they are read. In both modes the pieces are
+    concatenated once at the end.
+
+    Files are read concurrently in a thread pool, since the C parser of `pd.read_csv`
+    releases the GIL for much of its work. The combined DataFrames keep the order of
+    the files, and the row counts of each file are printed in that order.
+
+    With `engine="pyarrow"`, each file is parsed by pyarrow on several threads and its
+    string columns are stored as Arrow strings instead of Python objects (see
+    `read_input_file`). The pandas C parser is used instead when pyarrow is not
+    installed.
+
     Parameters:
     -----------
     input_files : str or list
         If a string, it represents the directory containing the CSV files to process.
         If a list, it represents the specific filenames to process.
+    chunksize : int, optional
+        Number of rows read at a time. If None, each file is read in one call.
+    read_workers : int, optional
+        Maximum number of files read at the same time. If None, the default of
+        `concurrent.futures.ThreadPoolExecutor` is used.
+    engine : str, optional
+        One of `CSV_ENGINES`, "pandas" by default.
 
     Returns:
     --------
@@ -56,6 +212,8 @@ def combine_csv_files(input_files):
     -------
     ValueError
         If `input_files` is neither a string nor a list.
+    SchemaError
+        If a file lacks a required column of its schema.
 
     Example:
     --------
@@ -65,12 +223,67 @@ def combine_csv_files(input_files):
     >>> specific_files = ["Download1.csv", "dispatch1.csv"]
     >>> combined_dfs = combine_csv_files(specific_files)
     >>> download_df, dispatch_df = combined_dfs[0], combined_dfs[1]
+
+    >>> combined_dfs = combine_csv_files("path/to/directory", chunksize=100_000)
+    """
+
+    base_directory, download_files, dispatch_files = list_input_files(input_files)
+    engine = resolve_csv_engine(engine)
+
+    # Function to read files concurrently and combine them in file order
+    def process_files(file_list, file_type):
+        with ThreadPoolExecutor(max_workers=read_workers) as executor:
+            results = executor.map(
+                lambda file: read_input_file(
+                    os.path.join(base_directory, file),
+                    file_type,
+                    chunksize=chunksize,
+                    engine=engine,
+                ),
+                file_list,
+            )
+
+            pieces = []
+            for file, (temp_df, initial_row_count) in zip(file_list, results):
+                final_row_count = temp_df.shape[0]
+                pieces.append(temp_df)
+
+                print(
+                    f"Processed '{file_type}' file: {file} with {initial_row_count} initial rows and {final_row_count} final rows"
+                )
+
+        if not pieces:
+            return pd.DataFrame()
+        return pd.concat(pieces, ignore_index=True)
+
+    # Process 'Download' files
+    download_df = process_files(download_files, "Download")
+
+    # Process 'dispatch' files
+    dispatch_df = process_files(dispatch_files, "dispatch")
+
+    return [download_df, dispatch_df]
+
+
+def list_input_files(input_files):
     """
+    Lists the "Download" and "dispatch" input files in a directory or a list of files.
 
-    # Initialize empty DataFrames
-    download_df = pd.DataFrame()
-    dispatch_df = pd.DataFrame()
+    Input files can be CSV, Parquet or Feather files (see `INPUT_EXTENSIONS`).
 
+    Args:
+        input_files (str or list): The directory containing the CSV files, or the
+            specific filenames to process, which are looked up in the "input" directory.
+
+    Returns:
+        tuple: A tuple containing:
+            - base_directory (str): The directory the filenames are relative to.
+            - download_files (list): The "Download" filenames.
+            - dispatch_files (list): The "dispatch" filenames.
+
+    Raises:
+        ValueError: If `input_files` is neither a string nor a list.
+    """
     # Check if input_files is a string (input_files name) or a list (specific files)
     if isinstance(input_files, str):
         print(f"combine_csv_files: str {input_files} detected")
@@ -89,78 +302,203 @@ def combine_csv_files(input_files):
 
     # Filter files for 'Download' and 'dispatch'
     download_files = [
-        f for f in files if f.startswith("Download") and f.endswith(".csv")
+        f for f in files if f.startswith("Download") and f.endswith(INPUT_EXTENSIONS)
     ]
     dispatch_files = [
-        f for f in files if f.startswith("dispatch") and f.endswith(".csv")
+        f for f in files if f.startswith("dispatch") and f.endswith(INPUT_EXTENSIONS)
     ]
 
     print(f"download_files:\n{download_files}")
     print(f"dispatch_files:\n{dispatch_files}")
 
-    # Function to process and append CSV files
-    def process_files(file_list, df, file_type, clean_column=None):
-        for i, file in enumerate(file_list):
-            file_path = os.path.join(base_directory, file)
+    return base_directory, download_files, dispatch_files
 
-            temp_df = pd.read_csv(file_path, header=0, index_col=False)
-            initial_row_count = temp_df.shape[0]
 
-            if file_type == "dispatch" and clean_column is not None:
-                temp_df = remove_trailing_nan_rows(temp_df, clean_column)
-                # print(temp_df[clean_column].to_string())
+def resolve_csv_engine(engine):
+    """
+    Returns the CSV engine to read with, falling back to pandas without pyarrow.
 
-            final_row_count = temp_df.shape[0]
+    Args:
+        engine (str): One of `CSV_ENGINES`.
 
-            if i == 0:
-                df = temp_df.copy()  # Initialize df with temp_df content
-            else:
-                df = pd.concat([df, temp_df], ignore_index=True)
+    Returns:
+        str: `engine`, or "pandas" if it is "pyarrow" and pyarrow is not installed.
+
+    Raises:
+        ValueError: If `engine` is not supported.
+    """
+    if engine not in CSV_ENGINES:
+        raise ValueError(
+            f"Unsupported CSV engine '{engine}'. "
+            f"Expected one of: {', '.join(CSV_ENGINES)}."
+        )
+
+    if engine == "pyarrow" and importlib.util.find_spec("pyarrow") is None:
+        print("pyarrow is not installed, reading CSV files with the pandas C parser")
+        return "pandas"
+    return engine
+
+
+def read_input_file(file_path, file_type, chunksize=None, engine="pandas"):
+    """
+    Reads one "Download" or "dispatch" CSV, Parquet or Feather file.
 
-            print(
-                f"Processed '{file_type}' file: {file} with {initial_row_count} initial rows and {final_row_count} final rows"
+    The header is validated against the schema of the file type (see `schema`) before
+    any data is parsed, and only the columns of the schema are kept, with their declared
+    dtypes. Trailing rows without a valid "Run #" are removed from "dispatch" files.
+    When `chunksize` is given, a CSV file is streamed in chunks of that many rows and
+    each chunk is cleaned as it is read. Parquet and Feather files are typed already
+    and are read in one call.
+
+    With `engine="pyarrow"`, a CSV file is parsed by pyarrow on several threads and its
+    string columns become "string[pyarrow]" columns, see `_read_csv_pyarrow`. The
+    pyarrow parser cannot stream, so `chunksize` is ignored; the Arrow strings of a
+    whole file take less memory than the Python objects of the C parser.
+
+    Args:
+        file_path (str): The path of the input file.
+        file_type (str): Either "Download" or "dispatch".
+        chunksize (int, optional): Number of rows read at a time from a CSV file.
+        engine (str): One of `CSV_ENGINES`, see `resolve_csv_engine`.
+
+    Returns:
+        tuple: A tuple containing:
+            - df (pd.DataFrame): The cleaned data of the file.
+            - initial_row_count (int): The number of rows read before cleaning.
+
+    Raises:
+        SchemaError: If the file lacks a required column of its schema.
+    """
+    schema = schema_for(file_type)
+    source = os.path.basename(file_path)
+
+    if file_path.endswith((".parquet", ".feather")):
+        read_columnar = (
+            pd.read_parquet if file_path.endswith(".parquet") else pd.read_feather
+        )
+        df = read_columnar(file_path)
+        chunks = [df[schema.select(df.columns, source)]]
+    else:
+        # Check the header before parsing any data
+        usecols = schema.select(pd.read_csv(file_path, nrows=0).columns, source)
+        if engine == "pyarrow":
+            chunks = [_read_csv_pyarrow(file_path, usecols, schema)]
+        else:
+            chunks = pd.read_csv(
+                file_path,
+                header=0,
+                index_col=False,
+                usecols=usecols,
+                dtype=schema.dtypes,
+                chunksize=chunksize,
             )
-        return df  # Return the updated dataframe after concatenation
+            if chunksize is None:
+                chunks = [chunks]
 
-    # Process 'Download' files
-    download_df = process_files(download_files, download_df, "Download")
+    pieces = []
+    initial_row_count = 0
+    for chunk in chunks:
+        initial_row_count += chunk.shape[0]
 
-    # Process 'dispatch' files
-    dispatch_df = process_files(
-        dispatch_files, dispatch_df, "dispatch", clean_column="Run #"
-    )
+        if file_type == "dispatch":
+            chunk = remove_trailing_nan_rows(chunk, "Run #")
 
-    return [download_df, dispatch_df]
+        pieces.append(chunk)
+
+    if not pieces:
+        return pd.DataFrame(), initial_row_count
+    if len(pieces) == 1:
+        return pieces[0], initial_row_count
+    return pd.concat(pieces, ignore_index=True), initial_row_count
+
+
+def _read_csv_pyarrow(file_path, usecols, schema):
+    """
+    Reads the columns `usecols` of a CSV file with pyarrow's multi-threaded parser.
+
+    `pd.read_csv(engine="pyarrow")` lets pyarrow infer a type for every column and
+    only casts it to the requested dtype afterwards, which turns "08:00" into
+    "08:00:00" and drops the leading zeros of ZIP codes. The string columns of the
+    schema are declared to pyarrow instead, and become "string[pyarrow]" columns.
+    Columns without a declared dtype are inferred and converted to NumPy dtypes, as the
+    C parser gives them.
+    """
+    import pyarrow as pa
+    from pyarrow import csv
+
+    table = csv.read_csv(
+        file_path,
+        convert_options=csv.ConvertOptions(
+            include_columns=usecols,
+            column_types={
+                column: pa.string()
+                for column, dtype in schema.dtypes.items()
+                if dtype is str and column in usecols
+            },
+            null_values=CSV_NA_VALUES,
+            strings_can_be_null=True,
+        ),
+    )
+    string_dtype = pd.StringDtype("pyarrow")
+    return table.to_pandas(
+        types_mapper=lambda type: string_dtype if type == pa.string() else None
+    )
 
 
 def remove_trailing_nan_rows(df, column_name):
     """
-    Removes all rows starting from the first row where the specified column has NaN values.
+    Removes the footer rows of a dispatch export, and any other row without a valid
+    run number in the specified column.
+
+    A valid run number is a number, optionally followed by a dash and a trip number,
+    such as "5001" or "5001-1" (see `RUN_NUMBER_PATTERN`). The footer block, blank rows
+    and the "Total:" row, is found by scanning backwards from the last row. The rows
+    before it are checked with a vectorized `str.isdecimal`, and only those that fail
+    it are matched against the pattern. A numeric column, as Parquet and Feather files
+    may have, keeps its rows with whole, non-negative numbers.
 
     Args:
         df (pd.DataFrame): The DataFrame to be cleaned.
-        column_name (str): The name of the column to check for NaN values.
+        column_name (str): The name of the column holding the run numbers.
 
     Returns:
-        pd.DataFrame: The cleaned DataFrame without trailing rows that contain
-        NaN in the specified column.
+        pd.DataFrame: The rows of `df` with a valid run number, with their original
+        index.
     """
-    # first_nan_index = df[df[column_name].isna()].index[0]
-    # cleaned_df = df.iloc[:first_nan_index]
+    runs = df[column_name]
 
-    # Remove rows where the specified column has NaN values
-    df_cleaned = df.dropna(subset=[column_name])
+    # Scan backwards over the footer block, which is usually two rows long
+    end = len(runs)
+    while end > 0 and not _is_run_number(runs.iat[end - 1]):
+        end -= 1
+    runs = runs.iloc[:end]
 
-    # Remove rows where the specified column contains non-numeric data (assuming "Run #" should be numeric)
-    df_cleaned = df_cleaned[df_cleaned[column_name].str.match(r"\d+(-\d+)?$", na=False)]
+    if pd.api.types.is_numeric_dtype(runs.dtype):
+        valid = (runs.notna() & runs.ge(0) & runs.mod(1).eq(0)).to_numpy(bool)
+    else:
+        valid = runs.str.isdecimal().astype("boolean").fillna(False).to_numpy(bool)
+        # Only numbers with a trip number, blanks and stray text are matched. Arrow
+        # string columns only take the pattern as a string
+        (others,) = (~valid).nonzero()
+        if len(others):
+            valid[others] = (
+                runs.iloc[others]
+                .str.match(RUN_NUMBER_PATTERN.pattern, na=False)
+                .to_numpy(bool)
+            )
 
-    # Find the last valid index in the specified column
-    last_valid_index = df_cleaned[column_name].last_valid_index()
+    if valid.all():
+        return df.iloc[:end]
+    return df.iloc[:end][valid]
 
-    # Keep only the rows up to the last valid index
-    df_cleaned = df_cleaned.loc[:last_valid_index]
 
-    return df_cleaned
+def _is_run_number(value):
+    """
+    Returns whether a value of the "Run #" column is a valid run number.
+    """
+    if isinstance(value, str):
+        return RUN_NUMBER_PATTERN.match(value) is not None
+    return pd.api.types.is_number(value) and value >= 0 and value % 1 == 0
 
 
 def extract_wait_time_and_oxygen(comment):
@@ -181,26 +519,107 @@ def extract_wait_time_and_oxygen(comment):
             - oxygen (int or None): The extracted oxygen volume in liters. If not found and
               specific keywords are present, returns None. Otherwise, returns 0.
     """
-    # Define patterns to match wait time and oxygen
-    wait_time_pattern = r"Wait time:\s*(\d+)\s*minutes"
-    oxygen_pattern = r"(\d+)\s*(?:liter|liters|LPM|L|lts|LITERS|lt|l)\b"
-
-    wait_time_match = re.search(wait_time_pattern, comment, re.IGNORECASE)
+    wait_time_match = WAIT_TIME_PATTERN.search(comment)
     wait_time = int(wait_time_match.group(1)) if wait_time_match else 0
 
-    oxygen_match = re.search(oxygen_pattern, comment, re.IGNORECASE)
+    oxygen_match = OXYGEN_PATTERN.search(comment)
     oxygen = int(oxygen_match.group(1)) if oxygen_match else 0
 
     # Check for phrases implying oxygen requirement
-    if any(
-        keyword in comment
-        for keyword in ["Therapist REQ", "Deep suction", "Vent", "tracheostomy"]
-    ):
+    if any(keyword in comment for keyword in OXYGEN_KEYWORDS):
         oxygen = oxygen if oxygen else None
 
     return wait_time, oxygen
 
 
+@profiled("extract_wait_time_and_oxygen")
+def extract_wait_time_and_oxygen_columns(comments):
+    """
+    Extracts wait time and oxygen requirement from a Series of comment strings.
+
+    This is the column-level version of `extract_wait_time_and_oxygen`. It uses the
+    same precompiled patterns through the vectorized `Series.str` methods and gives
+    the same values for every comment. Missing comments are treated as empty.
+
+    Args:
+        comments (pd.Series): The comment strings to extract information from.
+
+    Returns:
+        pd.DataFrame: A DataFrame with the same index as `comments` and columns:
+            - "Wait Time" (int): The extracted wait time in minutes, or 0 if not found.
+            - "Oxygen" (int or NaN): The extracted oxygen volume in liters. NaN where
+              it is not found and specific keywords are present, otherwise 0.
+    """
+    wait_time = (
+        comments.str.extract(WAIT_TIME_PATTERN, expand=False)
+        .fillna("0")
+        .astype("int64")
+    )
+    oxygen = (
+        comments.str.extract(OXYGEN_PATTERN, expand=False).fillna("0").astype("int64")
+    )
+
+    # Check for phrases implying oxygen requirement. Arrow string columns only take
+    # the pattern as a string
+    requires_oxygen = comments.str.contains(OXYGEN_KEYWORDS_PATTERN.pattern, na=False)
+    oxygen = oxygen.mask(requires_oxygen & (oxygen == 0))
+
+    return pd.DataFrame({"Wait Time": wait_time, "Oxygen": oxygen})
+
+
+def prepare_dispatch_df(df, workers=1):
+    """
+    Cleans and normalizes Traumasoft dispatch data before it is merged.
+
+    Parses "Date of Service" into datetime64 values and normalizes "PU Address" to
+    the first line of the normalized address.
+
+    Args:
+        df (pd.DataFrame): The combined dispatch data.
+        workers (int): Maximum number of worker processes used to parse addresses.
+
+    Returns:
+        pd.DataFrame: The prepared DataFrame.
+    """
+    for column in DISPATCH_SCHEMA.date_columns:
+        df[column] = normalize_date_column(df[column])
+    df["PU Address"] = _as_str(df["PU Address"]).str.strip()
+    (df["PU Address"],) = normalize_address_columns([df["PU Address"]], workers=workers)
+    return df
+
+
+def prepare_download_df(df, workers=1):
+    """
+    Extracts, standardizes and normalizes Call the Car download data before it is merged.
+
+    Parses "Date of Service" into datetime64 values, extracts wait time and oxygen
+    from "Origin Comments", builds "Patient Name" and the combined address columns,
+    and normalizes "PU Address", "Pick Up Address" and "Drop Off Address".
+
+    Args:
+        df (pd.DataFrame): The combined download data.
+        workers (int): Maximum number of worker processes used to parse addresses.
+
+    Returns:
+        pd.DataFrame: The prepared DataFrame.
+    """
+    for column in DOWNLOAD_SCHEMA.date_columns:
+        df[column] = normalize_date_column(df[column])
+    df[["Wait Time", "Oxygen"]] = extract_wait_time_and_oxygen_columns(
+        df["Origin Comments"]
+    )
+    df = standardize_address(standardize_name(df))
+
+    (df["PU Address"],) = normalize_address_columns([df["PU Address"]], workers=workers)
+    df["Pick Up Address"], df["Drop Off Address"] = normalize_address_columns(
+        [df["Pick Up Address"], df["Drop Off Address"]],
+        concatenate=True,
+        workers=workers,
+    )
+    return df
+
+
+@profiled("standardize_name")
 def standardize_name(df):
     """
     Combines 'First Name' and 'Last Name' into 'Patient Name' in the DataFrame.
@@ -233,6 +652,7 @@ def standardize_name(df):
         raise
 
 
+@profiled("standardize_address")
 def standardize_address(df):
     """
     Standardizes address columns in the DataFrame and creates new columns for combined addresses.
@@ -268,28 +688,30 @@ def standardize_address(df):
             raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
 
         # Convert columns to string type to avoid .str accessor issues
-        for column in pickup_required_columns:
-            df[column] = df[column].astype(str).str.strip()
+        parts = {
+            column: _as_str(df[column]).str.strip()
+            for column in pickup_required_columns
+        }
 
         # Create new address columns
         df["Pick Up Address"] = (
-            df["Origin Street"]
+            parts["Origin Street"]
             + ", "
-            + df["Origin City"]
+            + parts["Origin City"]
             + ", "
-            + df["Origin State"]
+            + parts["Origin State"]
             + ", "
-            + df["Origin Postal"]
+            + parts["Origin Postal"]
         )
 
         df["Drop Off Address"] = (
-            df["Destination Street"]
+            parts["Destination Street"]
             + ", "
-            + df["Destination City"]
+            + parts["Destination City"]
             + ", "
-            + df["Destination State"]
+            + parts["Destination State"]
             + ", "
-            + df["Destination Postal"]
+            + parts["Destination Postal"]
         )
 
         # Define column mapping to compare PU Address between traumasoft and ctc dataframes
@@ -300,6 +722,10 @@ def standardize_address(df):
             "Origin Postal": "PU Zip",
         }
 
+        # Only the origin columns are kept cleaned; renaming them does not copy the
+        # data under copy-on-write
+        for column in column_mapping:
+            df[column] = parts[column]
         df = df.rename(columns=column_mapping)
 
     except Exception as e:
@@ -311,17 +737,243 @@ def standardize_address(df):
     return df
 
 
+def _as_str(values):
+    """
+    Converts a Series to strings like `astype(str)`, which spells missing values "nan"
+    in object columns but "<NA>" in the string columns of the pyarrow engine.
+    """
+    if isinstance(values.dtype, pd.StringDtype):
+        return values.fillna("nan")
+    return values.astype(str)
+
+
 def normalize_date(date_str):
     parts = date_str.split("/")
     return "/".join(str(int(part)) for part in parts)
 
 
+@profiled("normalize_date")
+def normalize_date_column(dates):
+    """
+    Parses a Series of date strings into datetime64 values.
+
+    Dates are parsed with the "M/D/YYYY" format used by the exports. Values that do
+    not match it, such as ISO formatted dates, are parsed again with a per-value
+    fallback. Times of day are dropped, and missing or unparseable values become NaT.
+    The result can be used as a join key directly; use `format_date_column` to get
+    the "M/D/YYYY" display strings back when writing output.
+
+    Args:
+        dates (pd.Series): The date strings to be parsed.
+
+    Returns:
+        pd.Series: The parsed dates, with the same index as `dates`.
+    """
+    parsed = pd.to_datetime(dates, format=DATE_FORMAT, errors="coerce")
+
+    unparsed = parsed.isna() & dates.notna()
+    if unparsed.any():
+        parsed[unparsed] = pd.to_datetime(
+            dates[unparsed], format="mixed", errors="coerce"
+        )
+
+    return parsed.dt.normalize()
+
+
+def format_date_column(dates):
+    """
+    Formats a Series of datetime64 values as "M/D/YYYY" strings without leading zeros.
+
+    Args:
+        dates (pd.Series): The dates to be formatted.
+
+    Returns:
+        pd.Series: The formatted dates as strings, with missing values for NaT.
+    """
+    return (
+        dates.dt.month.astype("Int64").astype("string")
+        + "/"
+        + dates.dt.day.astype("Int64").astype("string")
+        + "/"
+        + dates.dt.year.astype("Int64").astype("string")
+    )
+
+
+def configure_address_cache(maxsize=100_000, path=None):
+    """
+    Replaces the address cache used by the normalization functions.
+
+    The current cache is flushed and closed before it is replaced, and the counts of
+    `address_parser_stats` are reset.
+
+    Args:
+        maxsize (int): Maximum number of address records kept in memory.
+        path (str, optional): Path of a SQLite file used to persist records across runs.
+
+    Returns:
+        AddressCache: The new cache.
+    """
+    global address_cache
+
+    address_cache.close()
+    address_cache = AddressCache(maxsize=maxsize, path=path)
+    with _parser_counts_lock:
+        _parser_counts.update(fast_path=0, scourgify=0)
+    return address_cache
+
+
+def address_parser_stats():
+    """
+    Returns how many parsed addresses took the rule-based fast path.
+
+    Addresses found in the address cache are not counted.
+
+    Returns:
+        dict: The number of addresses normalized by `address_rules` ("fast_path") and
+        by scourgify ("scourgify"), and the share of the fast path ("hit_rate"), or
+        None for the share if no address was parsed.
+    """
+    with _parser_counts_lock:
+        stats = dict(_parser_counts)
+    parsed = stats["fast_path"] + stats["scourgify"]
+    stats["hit_rate"] = stats["fast_path"] / parsed if parsed else None
+    return stats
+
+
+def parse_address(address):
+    """
+    Parses an address into its normalized components, using the address cache.
+
+    Args:
+        address (str): The address to be normalized.
+
+    Returns:
+        dict: The normalized address record, or None if normalization fails.
+    """
+    if not isinstance(address, str):
+        return _parse_address_record(address)
+
+    record = address_cache.get(address, default=_NOT_CACHED)
+    if record is _NOT_CACHED:
+        record = _parse_address_record(address)
+        address_cache.put(address, record)
+    return record
+
+
+def parse_addresses(addresses, workers=1):
+    """
+    Parses many addresses, using the address cache and parsing each distinct address once.
+
+    Uncached addresses are first normalized by the rules of `address_rules`, and only
+    those the rules do not accept are parsed by scourgify. With more than one worker
+    and at least `PARALLEL_MIN_ADDRESSES` of these, they are split into chunks and
+    parsed in a `ProcessPoolExecutor`. Each worker process imports this module, and
+    with it scourgify and the usaddress model, once. Workers are started by a fork
+    server (or spawned where it is not available) rather than forked, since forking
+    a multithreaded process such as the report service can deadlock the children.
+    Smaller inputs are parsed serially so short runs don't pay the process startup
+    cost.
+
+    Args:
+        addresses (iterable of str): The raw addresses to be parsed.
+        workers (int): Maximum number of worker processes.
+
+    Returns:
+        dict: The normalized record (or None if normalization fails) for each
+        distinct address, in order of first appearance.
+    """
+    records = {}
+    uncached = []
+    for address in dict.fromkeys(addresses):
+        if not isinstance(address, str):
+            records[address] = _parse_address_record(address)
+            continue
+        record = address_cache.get(address, default=_NOT_CACHED)
+        if record is _NOT_CACHED:
+            uncached.append(address)
+        records[address] = record
+
+    # Well-formed addresses are normalized by rules, the rest by scourgify
+    parsed = [address_rules.normalize_address_record(a) for a in uncached]
+    remaining = [address for address, record in zip(uncached, parsed) if record is None]
+    _count_parsed(len(uncached) - len(remaining), len(remaining))
+
+    if workers <= 1 or len(remaining) < PARALLEL_MIN_ADDRESSES:
+        records_by_scourgify = [_parse_with_scourgify(a) for a in remaining]
+    else:
+        # A few chunks per worker keeps the pool busy when chunks take uneven time
+        chunk_size = -(-len(remaining) // (workers * 4))
+        chunks = [
+            remaining[i : i + chunk_size] for i in range(0, len(remaining), chunk_size)
+        ]
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=_process_context()
+        ) as executor:
+            records_by_scourgify = [
+                record
+                for chunk_records in executor.map(_parse_address_chunk, chunks)
+                for record in chunk_records
+            ]
+
+    records_by_scourgify = iter(records_by_scourgify)
+    parsed = [
+        next(records_by_scourgify) if record is None else record for record in parsed
+    ]
+
+    for address, record in zip(uncached, parsed):
+        address_cache.put(address, record)
+        records[address] = record
+
+    return records
+
+
+def _process_context():
+    """
+    Returns the multiprocessing context of the address parsing workers.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def _parse_address_chunk(addresses):
+    return [_parse_with_scourgify(address) for address in addresses]
+
+
+def _parse_address_record(address):
+    record = address_rules.normalize_address_record(address)
+    if record is not None:
+        _count_parsed(1, 0)
+        return record
+    _count_parsed(0, 1)
+    return _parse_with_scourgify(address)
+
+
+def _parse_with_scourgify(address):
+    # scourgify loads the usaddress model on import, so it is only imported once an
+    # address actually needs parsing
+    from scourgify import normalize_address_record
+
+    try:
+        return dict(normalize_address_record(address))
+    except Exception as e:
+        print(f"Error normalizing address {address}: {e}")
+        return None
+
+
+def _count_parsed(fast_path, scourgify):
+    with _parser_counts_lock:
+        _parser_counts["fast_path"] += fast_path
+        _parser_counts["scourgify"] += scourgify
+
+
 def normalize_address(address):
     """
     Normalizes an address and returns the first line of the address.
 
     This function takes an address, normalizes it using the `normalize_address_record`
-    function, and returns the "address_line_1" component. If an error occurs during
+    function, and returns the "address_line_1" component. Parsed records are cached,
+    so repeated addresses are only parsed once. If an error occurs during
     normalization, it handles the exception and returns None.
 
     Args:
@@ -331,12 +983,13 @@ def normalize_address(address):
         str: The normalized first line of the address ("address_line_1"), or
         None if normalization fails.
     """
-    try:
-        normalized = normalize_address_record(address)
-        return normalized.get("address_line_1")
-    except Exception as e:
-        print(f"Error normalizing address {address}: {e}")
+    return _format_address_line_1(parse_address(address))
+
+
+def _format_address_line_1(normalized):
+    if normalized is None:
         return None
+    return normalized.get("address_line_1")
 
 
 def normalize_and_concatenate_address(address):
@@ -346,8 +999,9 @@ def normalize_and_concatenate_address(address):
     This function takes an address, normalizes it using the `normalize_address_record`
     function, and concatenates the components (address line 1, address line 2, city,
     state, and postal code) into a single string. Components that are None or empty
-    are omitted from the concatenated string. If an error occurs during normalization,
-    the function handles the exception and returns None.
+    are omitted from the concatenated string. Parsed records are cached, so repeated
+    addresses are only parsed once. If an error occurs during normalization, the
+    function handles the exception and returns None.
 
     Args:
         address (str): The address to be normalized.
@@ -355,21 +1009,259 @@ def normalize_and_concatenate_address(address):
     Returns:
         str: The normalized and concatenated address string, or None if normalization fails.
     """
-    try:
-        normalized = normalize_address_record(address)
-        normalized_address = ", ".join(
-            filter(
-                None,
-                [
-                    normalized.get("address_line_1"),
-                    normalized.get("address_line_2"),
-                    normalized.get("city"),
-                    normalized.get("state"),
-                    normalized.get("postal_code"),
-                ],
-            )
-        )
-        return normalized_address
-    except Exception as e:
-        print(f"Error normalizing address {address}: {e}")
+    return _format_full_address(parse_address(address))
+
+
+def _format_full_address(normalized):
+    if normalized is None:
         return None
+
+    normalized_address = ", ".join(
+        filter(
+            None,
+            [
+                normalized.get("address_line_1"),
+                normalized.get("address_line_2"),
+                normalized.get("city"),
+                normalized.get("state"),
+                normalized.get("postal_code"),
+            ],
+        )
+    )
+    return normalized_address
+
+
+@profiled("normalize_address")
+def normalize_address_columns(columns, concatenate=False, workers=1):
+    """
+    Normalizes the addresses in one or more Series, parsing each distinct address once.
+
+    The unique raw values across all of the given Series are gathered and normalized
+    once each with `normalize_address` (or `normalize_and_concatenate_address` when
+    `concatenate` is True). The results are then mapped back onto every Series with a
+    vectorized lookup, so an address repeated across rows and columns is parsed once.
+    Addresses are parsed with `parse_addresses`, which uses a process pool when
+    `workers` is greater than one and the input is large enough.
+
+    Args:
+        columns (list of pd.Series): The address Series to be normalized.
+        concatenate (bool): If True, return full concatenated addresses instead of
+            only the first address line.
+        workers (int): Maximum number of worker processes used for parsing.
+
+    Returns:
+        list of pd.Series: The normalized Series, in the same order and with the same
+        indexes as `columns`.
+
+    Example:
+        >>> ts_pu, ctc_pu = normalize_address_columns(
+        ...     [ts_df["PU Address"], ctc_df["PU Address"]]
+        ... )
+    """
+    format_address = _format_full_address if concatenate else _format_address_line_1
+
+    records = parse_addresses(
+        pd.unique(pd.concat(columns, ignore_index=True)), workers=workers
+    )
+    normalized = {
+        address: format_address(record) for address, record in records.items()
+    }
+
+    return [column.map(normalized) for column in columns]
+
+
+def apply_report_dtypes(df):
+    """
+    Gives the report columns explicit types for columnar output formats.
+
+    "Miles", "Wait Time Minutes" and "Oxygen Provided" become nullable integers when
+    all of their values are whole numbers, "Level of Service" and "Trip Status" become
+    categoricals, and every other object column holding only strings becomes a string
+    column. Dates and times keep their datetime64, date and time values.
+
+    Args:
+        df (pd.DataFrame): The merged report.
+
+    Returns:
+        pd.DataFrame: The report with typed columns.
+    """
+    df = df.copy()
+
+    for column in ["Miles", "Wait Time Minutes", "Oxygen Provided"]:
+        if column in df.columns:
+            values = pd.to_numeric(df[column], errors="coerce")
+            if values.dropna().mod(1).eq(0).all():
+                values = values.astype("Int64")
+            df[column] = values
+
+    for column in ["Level of Service", "Trip Status"]:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+
+    for column in df.columns:
+        if df[column].dtype == object and (
+            pd.api.types.infer_dtype(df[column], skipna=True) in ("string", "empty")
+        ):
+            df[column] = df[column].astype("string")
+
+    return df
+
+
+def check_compression(compression):
+    """
+    Checks that a CSV compression is supported and its package is installed.
+
+    gzip uses the standard library, zstd the optional `zstandard` package.
+
+    Args:
+        compression (str): One of `CSV_COMPRESSIONS`, or None for no compression.
+
+    Raises:
+        ValueError: If `compression` is not supported.
+        ImportError: If `compression` is "zstd" and zstandard is not installed.
+    """
+    if compression is None:
+        return
+    if compression not in CSV_COMPRESSIONS:
+        raise ValueError(
+            f"Unsupported compression '{compression}'. "
+            f"Expected one of: {', '.join(CSV_COMPRESSIONS)}."
+        )
+    if compression == "zstd" and importlib.util.find_spec("zstandard") is None:
+        raise ImportError(
+            "zstd compression requires the zstandard package: pip install zstandard"
+        )
+
+
+@profiled("write_report")
+def write_report(
+    df, output_file, output_format="csv", compression=None, chunksize=WRITE_CHUNK_ROWS
+):
+    """
+    Writes the merged report as CSV, Parquet or Feather, atomically.
+
+    The report is written to a temporary file in the directory of `output_file`,
+    flushed to disk with fsync and renamed over `output_file`, so a crash during the
+    write never leaves a truncated report behind.
+
+    CSV output formats "Date of Service" as "M/D/YYYY" strings and is written
+    `chunksize` rows at a time, optionally through gzip or zstd, so only one chunk is
+    rendered as text at a time. Parquet and Feather output keep the columns typed,
+    see `apply_report_dtypes`, and are compressed by pyarrow. Both columnar formats
+    require pyarrow.
+
+    Args:
+        df (pd.DataFrame): The merged report.
+        output_file (str): The path of the output file.
+        output_format (str): One of `OUTPUT_FORMATS`.
+        compression (str, optional): One of `CSV_COMPRESSIONS`, for CSV output only.
+        chunksize (int): Number of rows converted to CSV and written at a time.
+
+    Raises:
+        ValueError: If `output_format` or `compression` is not supported, or if
+            `compression` is given for a columnar format.
+        ImportError: If `compression` is "zstd" and zstandard is not installed.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unsupported output format '{output_format}'. "
+            f"Expected one of: {', '.join(OUTPUT_FORMATS)}."
+        )
+    check_compression(compression)
+    if compression is not None and output_format != "csv":
+        raise ValueError(
+            f"Compression is only supported for CSV output, not {output_format}."
+        )
+
+    with _atomic_output(output_file) as temp_path:
+        if output_format == "csv":
+            with open(temp_path, "wb") as raw, _compressed(
+                raw, compression, os.path.basename(output_file)
+            ) as f:
+                for text in iter_report_csv(df, chunksize):
+                    f.write(text.encode("utf-8"))
+            return
+
+        df = apply_report_dtypes(df).reset_index(drop=True)
+        if output_format == "parquet":
+            df.to_parquet(temp_path, index=False)
+        else:
+            df.to_feather(temp_path)
+
+
+@contextmanager
+def _atomic_output(output_file):
+    """
+    Yields the path of a temporary file next to `output_file`, which is flushed to
+    disk and renamed over `output_file` when the block succeeds, or removed if it
+    fails.
+    """
+    directory = os.path.dirname(os.path.abspath(output_file))
+    # Created by the writer rather than by tempfile.mkstemp, so that the report gets
+    # the usual permissions instead of 0600
+    temp_path = os.path.join(
+        directory, f".{os.path.basename(output_file)}.{uuid.uuid4().hex}.tmp"
+    )
+    try:
+        yield temp_path
+
+        fd = os.open(temp_path, os.O_RDWR)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_path, output_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # Persist the rename itself, where directories can be opened (not on Windows)
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+@contextmanager
+def _compressed(raw, compression, file_name):
+    """
+    Yields a binary file object compressing what is written to `raw`, or `raw`
+    itself without compression.
+    """
+    if compression is None:
+        yield raw
+    elif compression == "gzip":
+        # A fixed timestamp keeps the output, and so its checksum, reproducible
+        with gzip.GzipFile(
+            filename=file_name, mode="wb", compresslevel=6, fileobj=raw, mtime=0
+        ) as f:
+            yield f
+    else:
+        import zstandard
+
+        with zstandard.ZstdCompressor().stream_writer(raw, closefd=False) as f:
+            yield f
+
+
+def iter_report_csv(df, chunksize=None):
+    """
+    Yields the merged report as CSV text, one chunk of rows at a time.
+
+    "Date of Service" is formatted as "M/D/YYYY" strings, as in `write_report`. The
+    first chunk includes the header.
+
+    Args:
+        df (pd.DataFrame): The merged report.
+        chunksize (int, optional): Number of rows per chunk. Defaults to all rows.
+
+    Yields:
+        str: CSV text of the next chunk of rows.
+    """
+    chunksize = chunksize or max(len(df), 1)
+    for start in range(0, max(len(df), 1), chunksize):
+        chunk = df.iloc[start : start + chunksize].copy()
+        chunk["Date of Service"] = format_date_column(chunk["Date of Service"])
+        yield chunk.to_csv(index=False, header=start == 0)
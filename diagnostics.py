@@ -0,0 +1,106 @@
+"""
+Diagnostics of the trips the report merge leaves unmatched.
+
+The report is an inner merge of Traumasoft runs and Call the Car trips on 'Patient
+Name', 'Date of Service' and 'PU Address', which drops unmatched rows silently. This
+module finds those rows with one outer merge of the join keys and explains each of them
+by checking which subsets of the keys do have a match on the other side.
+
+Functions:
+- unmatched_trips(ts_df, ctc_df, on):
+    Returns the unmatched Traumasoft runs and Call the Car trips with a "reason" column.
+"""
+
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+
+# Reasons given when a pair of keys matches but the third does not, in order of
+# precedence, keyed by the two keys that match
+PARTIAL_MATCH_REASONS = {
+    ("Patient Name", "Date of Service"): "PU Address differs",
+    ("Date of Service", "PU Address"): "Patient Name differs",
+    ("Patient Name", "PU Address"): "Date of Service differs",
+}
+
+
+@profiled("diagnostics")
+def unmatched_trips(ts_df, ctc_df, on):
+    """
+    Returns the unmatched Traumasoft runs and Call the Car trips with a "reason" column.
+
+    An outer merge of the join keys with `indicator=True` finds the rows only found on
+    one side. Each of them is then explained by the first check that applies:
+
+    - "missing <key>": a join key is empty.
+    - "<key> differs": the other two keys match a row on the other side, see
+      `PARTIAL_MATCH_REASONS`.
+    - "Patient Name and PU Address differ": the date has rows on the other side.
+    - "no trips on Date of Service": the date has no rows on the other side.
+
+    Every check is a vectorized merge of key columns, so the cost stays close to that
+    of the report merge itself.
+
+    Args:
+        ts_df (pd.DataFrame): The prepared Traumasoft data.
+        ctc_df (pd.DataFrame): The prepared Call the Car data.
+        on (list): The join keys, 'Patient Name', 'Date of Service' and 'PU Address'.
+
+    Returns:
+        tuple: The unmatched rows of the Traumasoft and of the Call the Car data, in
+        their original order and with every original column, followed by "reason".
+    """
+    keys = pd.merge(
+        ts_df[on].assign(_ts_row=np.arange(len(ts_df))),
+        ctc_df[on].assign(_ctc_row=np.arange(len(ctc_df))),
+        on=on,
+        how="outer",
+        indicator=True,
+    )
+    ts_rows = np.sort(keys.loc[keys["_merge"] == "left_only", "_ts_row"].to_numpy())
+    ctc_rows = np.sort(keys.loc[keys["_merge"] == "right_only", "_ctc_row"].to_numpy())
+
+    unmatched_ts = ts_df.iloc[ts_rows.astype(np.int64)]
+    unmatched_ctc = ctc_df.iloc[ctc_rows.astype(np.int64)]
+    return (
+        unmatched_ts.assign(reason=_reasons(unmatched_ts, ctc_df, on)),
+        unmatched_ctc.assign(reason=_reasons(unmatched_ctc, ts_df, on)),
+    )
+
+
+def _reasons(unmatched, other, on):
+    """
+    Explains why each unmatched row has no match in `other`.
+    """
+    conditions = []
+    choices = []
+
+    for key in on:
+        conditions.append(unmatched[key].isna().to_numpy())
+        choices.append(f"missing {key}")
+
+    for matching_keys, reason in PARTIAL_MATCH_REASONS.items():
+        if set(matching_keys) <= set(on):
+            conditions.append(_has_match(unmatched, other, list(matching_keys)))
+            choices.append(reason)
+
+    return np.select(
+        conditions,
+        choices,
+        default=np.where(
+            _has_match(unmatched, other, ["Date of Service"]),
+            "Patient Name and PU Address differ",
+            "no trips on Date of Service",
+        ),
+    )
+
+
+def _has_match(df, other, keys):
+    """
+    Returns whether the keys of each row of `df` are found in `other`.
+    """
+    flags = df[keys].merge(
+        other[keys].drop_duplicates(), on=keys, how="left", indicator=True
+    )["_merge"]
+    return (flags == "both").to_numpy()
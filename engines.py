@@ -0,0 +1,158 @@
+"""
+Join engines of the report merge.
+
+The merge of the prepared Traumasoft runs and Call the Car trips is defined once in
+`pipeline.merge_report`: the join keys are encoded as integers, an engine finds the
+pairs of matching rows, and pandas takes the report columns of those rows. Engines only
+see the integer key columns, so every engine gives the same report as pandas, the
+reference engine.
+
+Classes:
+- PandasEngine:
+    Joins with `pd.merge`, the reference engine.
+
+- PolarsEngine:
+    Joins with a lazy, multi-threaded Polars query.
+
+- DuckDBEngine:
+    Joins with an embedded, multi-threaded DuckDB query.
+
+Functions:
+- resolve_join_engine(engine):
+    Returns the join engine of a name, falling back to pandas if its package is not
+    installed.
+"""
+
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+
+class PandasEngine:
+    """
+    Joins with `pd.merge`, the reference engine.
+
+    The rows of an inner merge are in the order of the left keys, and rows of the
+    right frame matching the same left row are in their original order. Other engines
+    must return the same order.
+    """
+
+    name = "pandas"
+
+    def join(self, left, right, on):
+        """
+        Returns the positions of the rows of an inner join of two frames.
+
+        Args:
+            left (pd.DataFrame): The left frame, with integer key columns.
+            right (pd.DataFrame): The right frame, with integer key columns.
+            on (list): The key columns.
+
+        Returns:
+            tuple: Arrays of the positions of the joined rows in `left` and `right`,
+            sorted by left position, then by right position.
+        """
+        rows = pd.merge(
+            _key_frame(left, on, "left_row"),
+            _key_frame(right, on, "right_row"),
+            on=on,
+            how="inner",
+        )
+        return rows["left_row"].to_numpy(), rows["right_row"].to_numpy()
+
+
+class PolarsEngine(PandasEngine):
+    """
+    Joins with a lazy, multi-threaded Polars query. Requires polars 0.20.4 or later.
+    """
+
+    name = "polars"
+
+    def join(self, left, right, on):
+        import polars as pl
+
+        left = pl.from_pandas(_key_frame(left, on, "left_row")).lazy()
+        right = pl.from_pandas(_key_frame(right, on, "right_row")).lazy()
+        rows = (
+            left.join(right, on=on, how="inner")
+            .select("left_row", "right_row")
+            .sort("left_row", "right_row")
+            .collect()
+        )
+        return rows["left_row"].to_numpy(), rows["right_row"].to_numpy()
+
+
+class DuckDBEngine(PandasEngine):
+    """
+    Joins with an embedded, multi-threaded DuckDB query.
+    """
+
+    name = "duckdb"
+
+    def join(self, left, right, on):
+        import duckdb
+
+        # Key columns are renamed so that the query does not quote report column names
+        keys = [f"key_{i}" for i in range(len(on))]
+        left_keys = _key_frame(left, on, "left_row").set_axis(
+            keys + ["left_row"], axis=1
+        )
+        right_keys = _key_frame(right, on, "right_row").set_axis(
+            keys + ["right_row"], axis=1
+        )
+        condition = " AND ".join(f"l.{key} = r.{key}" for key in keys)
+
+        with duckdb.connect() as connection:
+            connection.register("left_keys", left_keys)
+            connection.register("right_keys", right_keys)
+            rows = connection.execute(
+                "SELECT l.left_row, r.right_row "
+                f"FROM left_keys AS l JOIN right_keys AS r ON {condition} "
+                "ORDER BY l.left_row, r.right_row"
+            ).fetchnumpy()
+        return np.asarray(rows["left_row"]), np.asarray(rows["right_row"])
+
+
+# Join engines by name, and the package each one requires
+JOIN_ENGINES = {
+    "pandas": (PandasEngine, None),
+    "polars": (PolarsEngine, "polars"),
+    "duckdb": (DuckDBEngine, "duckdb"),
+}
+
+
+def resolve_join_engine(engine):
+    """
+    Returns the join engine of a name, falling back to pandas if its package is not
+    installed.
+
+    Args:
+        engine (str): One of `JOIN_ENGINES`.
+
+    Returns:
+        PandasEngine: The join engine.
+
+    Raises:
+        ValueError: If `engine` is not supported.
+    """
+    if engine not in JOIN_ENGINES:
+        raise ValueError(
+            f"Unsupported join engine '{engine}'. "
+            f"Expected one of: {', '.join(JOIN_ENGINES)}."
+        )
+
+    engine_class, package = JOIN_ENGINES[engine]
+    if package is not None and importlib.util.find_spec(package) is None:
+        print(f"{package} is not installed, merging with pandas")
+        return PandasEngine()
+    return engine_class()
+
+
+def _key_frame(df, on, row_column):
+    """
+    Returns the key columns of a frame with the position of each row.
+    """
+    keys = pd.DataFrame({column: df[column].to_numpy() for column in on})
+    keys[row_column] = np.arange(len(df), dtype="int64")
+    return keys
@@ -0,0 +1,209 @@
+"""
+Incremental processing of input files.
+
+Each input file is cleaned and normalized once, and the prepared DataFrame is stored in
+a cache directory together with a manifest of the file's size, modification time and
+SHA-256 hash. Later runs load unchanged files from the cache and only prepare new or
+modified files before the merge is recomputed.
+
+Classes:
+- FileManifest(cache_dir):
+    Manifest of input files and their prepared DataFrames in a cache directory.
+
+Functions:
+- combine_prepared_files(input_files, cache_dir, prepare, chunksize, engine):
+    Combines prepared "Download" and "dispatch" DataFrames, preparing only new or
+    modified files.
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import data_processing as dt
+from profiling import profiled
+
+# Increase when the preparation steps change, so earlier cached frames are not reused
+CACHE_VERSION = 3
+
+
+class FileManifest:
+    """
+    Manifest of input files and their prepared DataFrames in a cache directory.
+
+    An entry is reused when the file's size and modification time are unchanged, or
+    when they changed but the SHA-256 hash of its contents did not. Prepared frames
+    are stored as pickle files named after that hash.
+
+    Args:
+        cache_dir (str): The directory holding the manifest and the prepared frames.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.path = os.path.join(cache_dir, "manifest.json")
+        self.entries = {}
+        self._digests = {}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == self._version():
+                self.entries = manifest.get("files", {})
+
+    def load(self, file_path, options):
+        """
+        Returns the prepared DataFrame of an unchanged file, or None.
+
+        Args:
+            file_path (str): The path of the input file.
+            options (dict): The read options the frame must have been prepared with.
+
+        Returns:
+            pd.DataFrame: The cached prepared DataFrame, or None if the file is new,
+            modified, or was prepared with other options.
+        """
+        key = os.path.abspath(file_path)
+        entry = self.entries.get(key)
+        stat = os.stat(file_path)
+
+        if entry is None or entry["options"] != options:
+            return None
+
+        cache_file = os.path.join(self.cache_dir, entry["cache_file"])
+        if not os.path.exists(cache_file):
+            return None
+
+        if entry["size"] != stat.st_size or entry["mtime_ns"] != stat.st_mtime_ns:
+            digest = self._digest(file_path)
+            if digest != entry["sha256"]:
+                return None
+            entry["size"] = stat.st_size
+            entry["mtime_ns"] = stat.st_mtime_ns
+
+        return pd.read_pickle(cache_file)
+
+    def store(self, file_path, df, options):
+        """
+        Stores the prepared DataFrame of a file and records it in the manifest.
+
+        Args:
+            file_path (str): The path of the input file.
+            df (pd.DataFrame): The prepared DataFrame.
+            options (dict): The read options the frame was prepared with.
+        """
+        stat = os.stat(file_path)
+        digest = self._digest(file_path)
+        cache_file = f"{digest}.pkl"
+
+        df.to_pickle(os.path.join(self.cache_dir, cache_file))
+        self.entries[os.path.abspath(file_path)] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest,
+            "options": options,
+            "cache_file": cache_file,
+        }
+
+    def save(self):
+        """
+        Writes the manifest and removes prepared frames it no longer refers to.
+        """
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self._version(), "files": self.entries}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+        referenced = {entry["cache_file"] for entry in self.entries.values()}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pkl") and name not in referenced:
+                os.remove(os.path.join(self.cache_dir, name))
+
+    def _digest(self, file_path):
+        key = os.path.abspath(file_path)
+        if key not in self._digests:
+            sha256 = hashlib.sha256()
+            with open(file_path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha256.update(block)
+            self._digests[key] = sha256.hexdigest()
+        return self._digests[key]
+
+    @staticmethod
+    def _version():
+        return f"{CACHE_VERSION}-pandas-{pd.__version__}"
+
+
+@profiled("combine_prepared_files")
+def combine_prepared_files(
+    input_files, cache_dir, prepare, chunksize=None, engine="pandas"
+):
+    """
+    Combines prepared "Download" and "dispatch" DataFrames, preparing only new or modified files.
+
+    Files are listed like `data_processing.combine_csv_files` does. Each file that is
+    not in the manifest, or has changed since, is read with
+    `data_processing.read_input_file`, prepared with the function given for its type, and
+    stored in the cache. Unchanged files are loaded from the cache.
+
+    Args:
+        input_files (str or list): The directory containing the input files, or the
+            specific filenames to process.
+        cache_dir (str): The directory holding the manifest and the prepared frames.
+        prepare (dict): The function preparing a DataFrame for each file type, keyed by
+            "Download" and "dispatch".
+        chunksize (int, optional): Number of rows read at a time.
+        engine (str): The engine CSV files are read with, one of
+            `data_processing.CSV_ENGINES`. Frames prepared with another engine are
+            prepared again, since their dtypes differ.
+
+    Returns:
+        list of pandas.DataFrame: The prepared "Download" and "dispatch" DataFrames.
+
+    Example:
+        >>> ctc_df, ts_df = combine_prepared_files(
+        ...     "input",
+        ...     "cache",
+        ...     {"Download": dt.prepare_download_df, "dispatch": dt.prepare_dispatch_df},
+        ... )
+    """
+    base_directory, download_files, dispatch_files = dt.list_input_files(input_files)
+    manifest = FileManifest(cache_dir)
+    engine = dt.resolve_csv_engine(engine)
+    # Chunked and whole reads give the same columns and dtypes, see `schema`
+    options = {"columns": "schema", "engine": engine}
+
+    def process_files(file_list, file_type):
+        pieces = []
+        for file in file_list:
+            file_path = os.path.join(base_directory, file)
+
+            temp_df = manifest.load(file_path, options)
+            if temp_df is not None:
+                print(
+                    f"Loaded '{file_type}' file: {file} from cache with {temp_df.shape[0]} rows"
+                )
+            else:
+                temp_df, initial_row_count = dt.read_input_file(
+                    file_path, file_type, chunksize=chunksize, engine=engine
+                )
+                print(
+                    f"Processed '{file_type}' file: {file} with {initial_row_count} initial rows and {temp_df.shape[0]} final rows"
+                )
+                temp_df = prepare[file_type](temp_df)
+                manifest.store(file_path, temp_df, options)
+
+            pieces.append(temp_df)
+
+        if not pieces:
+            return pd.DataFrame()
+        return pd.concat(pieces, ignore_index=True)
+
+    download_df = process_files(download_files, "Download")
+    dispatch_df = process_files(dispatch_files, "dispatch")
+    manifest.save()
+
+    return [download_df, dispatch_df]
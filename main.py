@@ -13,159 +13,380 @@ This script performs the following steps:
 5. Normalizes address formats in both DataFrames.
 6. Merges the two DataFrames on 'Patient Name', 'Date of Service', and 'PU Address'.
 7. Selects specific columns of interest for the merged DataFrame.
-8. Saves the merged DataFrame to a CSV file in the specified output directory.
+8. Saves the merged DataFrame to a CSV, Parquet or Feather file in the specified output directory.
 
-The output CSV file contains the merged data with selected columns necessary for generating reports.
+The output file contains the merged data with selected columns necessary for generating reports.
 
 Requirements:
 - pandas
-- data_transformation (imported as dt)
+- data_processing (imported as dt)
+- pipeline, which builds the report and can also be imported by other programs
 
 Usage:
-    python main.py [parameters]
+    python main.py [parameters] [--workers N] [--chunksize N] [--engine ENGINE] [--incremental]
+                   [--output-format FORMAT] [--compression {gzip,zstd}]
+                   [--partition-by KEY [KEY ...]]
+                   [--no-diagnostics] [--fuzzy-match] [--fuzzy-threshold SCORE] [--fuzzy-zip]
+                   [--profile] [--profile-json FILE] [--cprofile FILE]
 
     Ensure that the input CSV file paths are correctly specified in the script before running.
     The merged CSV file will be saved in the 'output' directory.
 
+    Parsed addresses are cached in memory. Set ADDRESS_CACHE_PATH in the environment
+    (or .env) to persist them in a SQLite file that later runs reuse, and
+    ADDRESS_CACHE_SIZE to bound the number of addresses kept in memory.
+
 Parameters:
-    sys.argv[1:]: List
+    files: List
         Command-line arguments passed to the script.
         Each argument represents a file or input.
+    --workers N: int
+        Number of processes used to normalize addresses (default: 1).
+    --chunksize N: int
+        Stream each CSV file in chunks of N rows, keeping only the columns used by
+        the report.
+    --engine ENGINE: str
+        Engine of the run: pandas (default), the pandas C parser and pandas merge;
+        pyarrow, which parses each file on several threads and keeps string columns in
+        Arrow memory; or polars or duckdb, which also read with pyarrow and join the
+        runs and trips with a multi-threaded Polars or DuckDB query. Each engine falls
+        back to pandas when its package is not installed. pyarrow reads each file
+        whole, ignoring --chunksize.
+    --incremental:
+        Keep a manifest of input files and their prepared DataFrames in the cache
+        directory, and only prepare files that are new or changed since the last run.
+    --cache-dir DIR: str
+        Directory of the incremental cache (default: cache).
+    --output-format FORMAT: str
+        Format of the merged report: csv (default), parquet or feather. Input files can
+        also be Parquet or Feather files.
+    --compression COMPRESSION: str
+        Compress the CSV report with gzip, or with zstd (requires zstandard), and add
+        .gz or .zst to its name. Reports are always written to a temporary file first
+        and renamed into place once complete, so a failed run never leaves a truncated
+        report.
+    --partition-by KEY [KEY ...]: str
+        Write one report per month of 'Date of Service' (month) and/or per Level of
+        Service (los) instead of a single merged file, concurrently, with a manifest
+        of the files, their row counts and SHA-256 checksums in
+        output/merged_manifest.json.
+    --no-diagnostics:
+        Do not save the Traumasoft runs and Call the Car trips the merge leaves
+        unmatched. By default they are saved to output/unmatched_ts.csv and
+        output/unmatched_ctc.csv with a "reason" column naming the join key that
+        differs.
+    --fuzzy-match:
+        Pair the trips the exact merge drops by name and address similarity, within
+        the same date of service, and save the pairs with their scores to
+        output/fuzzy_matches.csv and the rest to output/fuzzy_unmatched.csv.
+    --fuzzy-threshold SCORE: float
+        Minimum similarity score of a fuzzy match, between 0 and 1 (default: 0.85).
+    --fuzzy-zip:
+        With --fuzzy-match, only fuzzy match trips with the same 'PU Zip' (requires a
+        'PU Zip' column in the dispatch export).
+    --profile:
+        Print a table of the wall time, CPU time, rows in and out and peak memory of
+        each stage.
+    --profile-json FILE: str
+        Save the stage measurements as a JSON trace (implies --profile).
+    --cprofile FILE: str
+        Save cProfile statistics of the run, for use with pstats or snakeviz.
 
 Example:
     $ python main.py # This will automatically take all files from the input folder
     $ python main.py file1.csv file2.csv
+    $ python main.py --workers 16
+    $ python main.py --chunksize 100000
+    $ python main.py --engine pyarrow
+    $ python main.py --engine polars
+    $ python main.py --incremental
+    $ python main.py --output-format parquet
+    $ python main.py --compression gzip
+    $ python main.py --partition-by month los
+    $ python main.py --fuzzy-match --fuzzy-threshold 0.8
+    $ python main.py --profile --profile-json trace.json
 """
 
+import argparse
+import cProfile
 import os
 import sys
 
-import pandas as pd
-from dotenv import load_dotenv
-import data_processing as dt
+import profiling
+
+# Output formats of `data_processing.write_report`, listed here so that --help does
+# not have to import pandas
+OUTPUT_FORMATS = ("csv", "parquet", "feather")
+
+# Engines of `pipeline.ReportConfig`, for the same reason
+ENGINES = ("pandas", "pyarrow", "polars", "duckdb")
+
+# Keys of `partitions.write_partitions`, for the same reason
+PARTITION_KEYS = ("month", "los")
+
+# Compressions of `data_processing.write_report`, for the same reason
+CSV_COMPRESSIONS = ("gzip", "zstd")
+
+
+def parse_arguments(argv=None):
+    """
+    Parses the command-line arguments of the script.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Merge Traumasoft and Call the Car exports into a billing report."
+    )
+    parser.add_argument(
+        "files",
+        nargs="*",
+        help="Files to process. Defaults to every file in the input folder.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes used to normalize addresses (default: 1).",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        help="Stream each CSV file in chunks of this many rows, keeping only the "
+        "columns used by the report.",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="pandas",
+        help="Engine of the run (default: pandas). pyarrow parses CSV files on "
+        "several threads and keeps strings in Arrow memory; polars and duckdb also "
+        "join with Polars or DuckDB. Falls back to pandas when the package is not "
+        "installed.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Cache each prepared input file and only prepare new or changed files.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default="cache",
+        help="Directory of the incremental cache (default: cache).",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="Format of the merged report (default: csv). Parquet and Feather "
+        "require pyarrow.",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=CSV_COMPRESSIONS,
+        help="Compress the CSV report with gzip, or zstd (requires zstandard).",
+    )
+    parser.add_argument(
+        "--partition-by",
+        nargs="+",
+        choices=PARTITION_KEYS,
+        metavar="KEY",
+        help="Write one report per month of service (month) and/or Level of Service "
+        "(los), with a manifest of the files, instead of a single merged file.",
+    )
+    parser.add_argument(
+        "--no-diagnostics",
+        action="store_true",
+        help="Do not save the unmatched runs and trips to unmatched_ts.csv and "
+        "unmatched_ctc.csv.",
+    )
+    parser.add_argument(
+        "--fuzzy-match",
+        action="store_true",
+        help="Pair trips the exact merge drops by name and address similarity, and "
+        "save them to fuzzy_matches.csv and fuzzy_unmatched.csv for review.",
+    )
+    parser.add_argument(
+        "--fuzzy-threshold",
+        type=float,
+        default=0.85,
+        help="Minimum similarity score of a fuzzy match, between 0 and 1 "
+        "(default: 0.85).",
+    )
+    parser.add_argument(
+        "--fuzzy-zip",
+        action="store_true",
+        help="With --fuzzy-match, only fuzzy match trips with the same 'PU Zip'. The "
+        "dispatch export must have a 'PU Zip' column.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time, CPU time, rows and peak memory of each stage.",
+    )
+    parser.add_argument(
+        "--profile-json",
+        metavar="FILE",
+        help="Save the stage measurements as a JSON trace (implies --profile).",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="FILE",
+        help="Save cProfile statistics of the run to FILE.",
+    )
+    args = parser.parse_args(argv)
+    if args.compression and args.output_format != "csv":
+        parser.error("--compression only applies to --output-format csv")
+    if args.fuzzy_zip and not args.fuzzy_match:
+        parser.error("--fuzzy-zip only applies to --fuzzy-match")
+    return args
 
 
 def main():
     """
     Entry point of the script.
 
-    Handles command-line arguments and performs operations based on them.
+    Handles command-line arguments and performs operations based on them. pandas, the
+    pipeline and dotenv are imported after the arguments are parsed, so --help and
+    invalid arguments return without loading them.
     """
 
+    args = parse_arguments()
+
+    from dotenv import load_dotenv
+    import pandas as pd
+    import data_processing as dt
+    import partitions
+    import pipeline
+    from schema import SchemaError
+
+    # Share column data between DataFrames until one of them is modified
+    pd.set_option("mode.copy_on_write", True)
+
+    # Optional instrumentation of each stage and of every function call
+    profiler = None
+    if args.profile or args.profile_json:
+        profiler = profiling.enable()
+    cprofiler = None
+    if args.cprofile:
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+
     load_dotenv()
 
+    # Reuse parsed addresses across rows and, if configured, across runs
+    dt.configure_address_cache(
+        maxsize=int(os.getenv("ADDRESS_CACHE_SIZE", "100000")),
+        path=os.getenv("ADDRESS_CACHE_PATH"),
+    )
+
     # python main.py
-    if len(sys.argv) == 1:
+    if not args.files:
         # Import the entire input folder
         print("Importing entire input folder")
-        input_df = dt.combine_csv_files("input")
+        input_files = "input"
     else:
         # Import specific files
-        parameters = [f"{param}" for param in sys.argv[1:]]
+        parameters = [f"{param}" for param in args.files]
         print("Parameters:", parameters)
-        input_df = dt.combine_csv_files(parameters)
-
-    ctc_df = input_df[0]
-    ts_df = input_df[1]
-
-    # Data cleaning and transformation for Traumasoft DataFrame
-    ts_df["Date of Service"] = ts_df["Date of Service"].apply(dt.normalize_date)
-    ts_df["PU Address"] = ts_df["PU Address"].astype(str).str.strip()
-    ts_df["PU Address"] = ts_df["PU Address"].apply(dt.normalize_address)
-
-    # Data extraction, transformation, and standardization for Call the Car DataFrame
-    ctc_df["Date of Service"] = ctc_df["Date of Service"].apply(dt.normalize_date)
-    ctc_df[["Wait Time", "Oxygen"]] = ctc_df["Origin Comments"].apply(
-        lambda x: pd.Series(dt.extract_wait_time_and_oxygen(x))
-    )
-    ctc_df = dt.standardize_address(dt.standardize_name(ctc_df))
-    ctc_df["PU Address"] = ctc_df["PU Address"].apply(dt.normalize_address)
-    ctc_df["Pick Up Address"] = ctc_df["Pick Up Address"].apply(
-        dt.normalize_and_concatenate_address
-    )
-    ctc_df["Drop Off Address"] = ctc_df["Drop Off Address"].apply(
-        dt.normalize_and_concatenate_address
-    )
-
-    # For debugging, output the processed dataframes to separate files
-    # with open("processed_ts_df.txt", "w", encoding="utf-8") as f:
-    #     print("Filename:", ts_df.to_string(), file=f)
-    # with open("processed_ctc_df.txt", "w", encoding="utf-8") as f:
-    #     print("Filename:", ctc_df.to_string(), file=f)
-
-    # Merge the DataFrames on 'Patient Name', 'Date of Service', and 'PU Address'
-    merged_df = pd.merge(
-        ts_df,
-        ctc_df,
-        on=["Patient Name", "Date of Service", "PU Address"],
-        how="inner",
-    )
-
-    merged_df["At Scene"] = pd.to_datetime(merged_df["At Scene"])
-    merged_df["At Destination"] = pd.to_datetime(merged_df["At Destination"])
-
-    # Create "At Scene Date" and "At Scene Time" columns
-    merged_df["Actual Pickup Arrival Date"] = merged_df["At Scene"].dt.date
-    merged_df["Actual Pickup Arrival Time"] = merged_df["At Scene"].dt.time
-    merged_df["Actual Drop off Arrival Date"] = merged_df["At Destination"].dt.date
-    merged_df["Actual Drop off Arrival Time"] = merged_df["At Destination"].dt.time
-
-    merged_df["CTC Trip ID"] = merged_df["Trip ID"]
-    merged_df["Member Last Name"] = merged_df["Last Name"]
-    merged_df["Member First Name"] = merged_df["First Name"]
-    merged_df["Requested Arrival Time"] = merged_df["Pickup Time_y"]
-    merged_df["Level of Service"] = merged_df["LOS_y"]
-    merged_df["Driver Name"] = merged_df["Crew"]
-    merged_df["Driver License Number"] = merged_df["Driver's License"]
-    merged_df["Vehicle VIN"] = merged_df["VIN"]
-    merged_df["Trip Status"] = merged_df["Status_x"]
-    merged_df["Mileage"] = merged_df["Miles"]
-    merged_df["Wait Time Minutes"] = merged_df["Wait Time"]
-    merged_df["Oxygen Provided"] = merged_df["Oxygen"]
-
-    # Constant values in merged dataframe
-    merged_df["Vendor Name"] = os.getenv("VENDOR_NAME")
-    merged_df["Vendor Tax ID"] = os.getenv("VENDOR_TAX_ID")
-    merged_df["Total Cost"] = ""
-    merged_df["Comment"] = ""
-
-    # Retain specific columns in the merged DataFrame
-    desired_columns = [
-        "Vendor Name",
-        "Vendor Tax ID",
-        "CTC Trip ID",
-        "Date of Service",
-        "Member Last Name",
-        "Member First Name",
-        "Pick Up Address",
-        "Drop Off Address",
-        "Requested Arrival Time",
-        "Appointment Time",
-        "Actual Pickup Arrival Date",
-        "Actual Pickup Arrival Time",
-        "Actual Drop off Arrival Date",
-        "Actual Drop off Arrival Time",
-        "Level of Service",
-        "Driver Name",
-        "Driver's License",
-        "Vehicle VIN",
-        "Trip Status",
-        "Miles",
-        "Wait Time Minutes",
-        "Oxygen Provided",
-        "Total Cost",
-        "Comment",
-    ]
-
-    merged_df = merged_df[desired_columns]
-
-    # Save the merged DataFrame to the output file
+        input_files = parameters
+
+    config = pipeline.ReportConfig.from_env(
+        workers=args.workers,
+        chunksize=args.chunksize,
+        engine=args.engine,
+        incremental=args.incremental,
+        cache_dir=args.cache_dir,
+        fuzzy_threshold=args.fuzzy_threshold,
+        fuzzy_block_by_zip=args.fuzzy_zip,
+    )
+    try:
+        dt.check_compression(args.compression)
+    except ImportError as e:
+        sys.exit(f"Error: {e}")
+
+    try:
+        ctc_df, ts_df = pipeline.prepare_files(input_files, config)
+    except SchemaError as e:
+        sys.exit(f"Error: {e}")
+    merged_df = pipeline.merge_report(ctc_df, ts_df, config)
+
+    # Save the merged DataFrame to the output file, or to one file per partition
     output_folder = "output"
     os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, "merged.csv")
-    merged_df.to_csv(output_file, index=False)
+    if args.partition_by:
+        manifest = partitions.write_partitions(
+            merged_df,
+            output_folder,
+            args.partition_by,
+            args.output_format,
+            compression=args.compression,
+        )
+        print(
+            f"{len(manifest['files'])} {args.output_format.upper()} partitions saved to "
+            f"{output_folder}, listed in "
+            f"{os.path.join(output_folder, 'merged_manifest.json')}"
+        )
+    else:
+        output_file = os.path.join(
+            output_folder,
+            f"merged.{args.output_format}"
+            f"{dt.CSV_COMPRESSIONS.get(args.compression, '')}",
+        )
+        dt.write_report(
+            merged_df, output_file, args.output_format, compression=args.compression
+        )
+
+        print(f"{args.output_format.upper()} saved to {output_file}")
+
+    # Explain which join key kept each unmatched run or trip out of the report
+    if not args.no_diagnostics:
+        unmatched_ts, unmatched_ctc = pipeline.diagnose_unmatched(ctc_df, ts_df)
+        for df, name in (
+            (unmatched_ts, "unmatched_ts"),
+            (unmatched_ctc, "unmatched_ctc"),
+        ):
+            unmatched_file = os.path.join(output_folder, f"{name}.csv")
+            dt.write_report(df, unmatched_file)
+            print(f"{len(df)} unmatched rows saved to {unmatched_file}")
+
+    # Pair the trips the exact merge dropped, for review
+    if args.fuzzy_match:
+        matches, unmatched = pipeline.fuzzy_match_report(ctc_df, ts_df, config)
+        matches_file = os.path.join(output_folder, "fuzzy_matches.csv")
+        unmatched_file = os.path.join(output_folder, "fuzzy_unmatched.csv")
+        dt.write_report(matches, matches_file)
+        dt.write_report(unmatched, unmatched_file)
+        print(f"{len(matches)} fuzzy matches saved to {matches_file}")
+        print(f"{len(unmatched)} unmatched trips saved to {unmatched_file}")
+
+    dt.address_cache.close()
+    cache_stats = dt.address_cache.stats()
+    print(
+        f"Address cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses"
+    )
+    parser_stats = dt.address_parser_stats()
+    if parser_stats["hit_rate"] is not None:
+        print(
+            f"Address fast path: {parser_stats['fast_path']} of "
+            f"{parser_stats['fast_path'] + parser_stats['scourgify']} parsed addresses "
+            f"({parser_stats['hit_rate']:.1%})"
+        )
+
+    if cprofiler is not None:
+        cprofiler.disable()
+        cprofiler.dump_stats(args.cprofile)
+        print(f"cProfile stats saved to {args.cprofile}")
 
-    print(f"CSV saved to {output_file}")
+    if profiler is not None:
+        profiling.disable()
+        print(profiler.summary())
+        if args.profile_json:
+            profiler.write_json(args.profile_json)
+            print(f"Stage trace saved to {args.profile_json}")
 
 
 if __name__ == "__main__":
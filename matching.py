@@ -0,0 +1,273 @@
+"""
+Fuzzy matching of trips the exact merge leaves unmatched.
+
+The report joins Traumasoft runs and Call the Car trips on exact 'Patient Name', 'Date
+of Service' and 'PU Address' values, so a typo, a suite number or an abbreviation is
+enough to drop a trip. This module pairs the leftover rows by similarity instead.
+
+Rows are blocked by 'Date of Service' (and optionally 'PU Zip'), so only trips of the
+same day are compared. Inside a block, Call the Car trips are indexed by their name
+tokens and house number, and each Traumasoft run is only scored against trips sharing
+one of those tokens. The cost therefore grows with the number of trips per day, not
+with the product of both exports.
+
+Functions:
+- unmatched_rows(df, other, on):
+    Returns the rows of a DataFrame whose key has no exact match in another.
+
+- fuzzy_match(ts_df, ctc_df, threshold, block_by_zip):
+    Pairs Traumasoft runs and Call the Car trips by name and address similarity.
+"""
+
+import heapq
+import re
+from difflib import SequenceMatcher
+
+import pandas as pd
+
+from profiling import profiled
+
+# Columns identifying a trip on each side
+TS_ID_COLUMN = "Run #"
+CTC_ID_COLUMN = "Trip ID"
+
+# Columns the rows are blocked and scored on
+DATE_COLUMN = "Date of Service"
+ZIP_COLUMN = "PU Zip"
+NAME_COLUMN = "Patient Name"
+ADDRESS_COLUMN = "PU Address"
+
+# Weight of the name in the combined score; the address makes up the rest
+NAME_WEIGHT = 0.5
+
+# Blocks with at most this many Call the Car trips are compared in full
+SMALL_BLOCK_SIZE = 8
+
+# Number of indexed candidates scored per trip, and the number of trips above which
+# a token is too common to select candidates
+MAX_CANDIDATES = 10
+MAX_POSTINGS = 50
+
+TOKEN_PATTERN = re.compile(r"[A-Z0-9]+")
+
+MATCH_COLUMNS = [
+    "Run #",
+    "CTC Trip ID",
+    "Date of Service",
+    "TS Patient Name",
+    "CTC Patient Name",
+    "TS PU Address",
+    "CTC PU Address",
+    "Name Score",
+    "Address Score",
+    "Score",
+]
+
+UNMATCHED_COLUMNS = ["Source", "ID", "Date of Service", "Patient Name", "PU Address"]
+
+
+def unmatched_rows(df, other, on):
+    """
+    Returns the rows of a DataFrame whose key has no exact match in another.
+
+    Keys are compared as `pd.merge` compares them, so these are exactly the rows an
+    inner merge on `on` drops.
+
+    Args:
+        df (pd.DataFrame): The rows to check.
+        other (pd.DataFrame): The DataFrame they are merged with.
+        on (list): The key columns.
+
+    Returns:
+        pd.DataFrame: The rows of `df` without a match, in their original order.
+    """
+    flags = df[on].merge(other[on].drop_duplicates(), on=on, how="left", indicator=True)
+    return df[(flags["_merge"] == "left_only").to_numpy()]
+
+
+@profiled("fuzzy_match")
+def fuzzy_match(ts_df, ctc_df, threshold=0.85, block_by_zip=False):
+    """
+    Pairs Traumasoft runs and Call the Car trips by name and address similarity.
+
+    Only rows of the same block are compared: the same 'Date of Service', and the same
+    'PU Zip' when `block_by_zip` is True. The score of a pair is the weighted average
+    of the similarity of the names and of the pickup addresses. Pairs scoring at least
+    `threshold` are matched greedily from the highest score down, so each run and trip
+    is used at most once.
+
+    Args:
+        ts_df (pd.DataFrame): The prepared Traumasoft runs left unmatched.
+        ctc_df (pd.DataFrame): The prepared Call the Car trips left unmatched.
+        threshold (float): Minimum score of a match, between 0 and 1.
+        block_by_zip (bool): If True, also block by 'PU Zip'. Both DataFrames must have
+            that column.
+
+    Returns:
+        tuple: A tuple containing:
+            - matches (pd.DataFrame): One row per matched pair, with the columns in
+              `MATCH_COLUMNS`, from the highest score down.
+            - unmatched (pd.DataFrame): The runs and trips that are still unmatched,
+              with the columns in `UNMATCHED_COLUMNS`.
+
+    Raises:
+        ValueError: If `block_by_zip` is True and a DataFrame has no 'PU Zip' column.
+    """
+    block_columns = [DATE_COLUMN]
+    if block_by_zip:
+        for name, df in (("Traumasoft", ts_df), ("Call the Car", ctc_df)):
+            if ZIP_COLUMN not in df.columns:
+                raise ValueError(
+                    f"Cannot block by ZIP: the {name} data has no '{ZIP_COLUMN}' column."
+                )
+        block_columns.append(ZIP_COLUMN)
+
+    ts_names, ts_addresses = _text(ts_df[NAME_COLUMN]), _text(ts_df[ADDRESS_COLUMN])
+    ctc_names, ctc_addresses = _text(ctc_df[NAME_COLUMN]), _text(ctc_df[ADDRESS_COLUMN])
+
+    pairs = []
+    ctc_blocks = _blocks(ctc_df, block_columns)
+    for key, ts_positions in _blocks(ts_df, block_columns).items():
+        ctc_positions = ctc_blocks.get(key)
+        if ctc_positions is None:
+            continue
+
+        index = _TokenIndex(ctc_positions, ctc_names, ctc_addresses)
+        for ts_position in ts_positions:
+            name, address = ts_names[ts_position], ts_addresses[ts_position]
+            # SequenceMatcher caches its analysis of the second sequence, so the
+            # matchers of a run are reused for all of its candidates
+            name_matcher = SequenceMatcher(None, b=name)
+            address_matcher = SequenceMatcher(None, b=address)
+            for ctc_position in index.candidates(name, address):
+                name_matcher.set_seq1(ctc_names[ctc_position])
+                address_matcher.set_seq1(ctc_addresses[ctc_position])
+                scores = _score(name_matcher, address_matcher, threshold)
+                if scores is not None:
+                    pairs.append((scores, ts_position, ctc_position))
+
+    # Keep the best pairs first, using each run and trip at most once
+    pairs.sort(key=lambda pair: (-pair[0][2], pair[1], pair[2]))
+    used_ts, used_ctc, matched = set(), set(), []
+    for scores, ts_position, ctc_position in pairs:
+        if ts_position in used_ts or ctc_position in used_ctc:
+            continue
+        used_ts.add(ts_position)
+        used_ctc.add(ctc_position)
+        matched.append((scores, ts_position, ctc_position))
+
+    ts_matched = ts_df.iloc[[pair[1] for pair in matched]]
+    ctc_matched = ctc_df.iloc[[pair[2] for pair in matched]]
+    matches = pd.DataFrame(
+        {
+            "Run #": ts_matched[TS_ID_COLUMN].to_numpy(),
+            "CTC Trip ID": ctc_matched[CTC_ID_COLUMN].to_numpy(),
+            "Date of Service": ts_matched[DATE_COLUMN].to_numpy(),
+            "TS Patient Name": ts_matched[NAME_COLUMN].to_numpy(),
+            "CTC Patient Name": ctc_matched[NAME_COLUMN].to_numpy(),
+            "TS PU Address": ts_matched[ADDRESS_COLUMN].to_numpy(),
+            "CTC PU Address": ctc_matched[ADDRESS_COLUMN].to_numpy(),
+            "Name Score": [round(pair[0][0], 3) for pair in matched],
+            "Address Score": [round(pair[0][1], 3) for pair in matched],
+            "Score": [round(pair[0][2], 3) for pair in matched],
+        },
+        columns=MATCH_COLUMNS,
+    )
+
+    unmatched = pd.concat(
+        [
+            _unmatched_report(ts_df, used_ts, "Traumasoft", TS_ID_COLUMN),
+            _unmatched_report(ctc_df, used_ctc, "Call the Car", CTC_ID_COLUMN),
+        ],
+        ignore_index=True,
+    )
+    return matches, unmatched
+
+
+class _TokenIndex:
+    """
+    Index of the Call the Car trips of one block by name token and house number.
+
+    Candidates are ranked by the tokens they share with the searched trip, rarer tokens
+    counting more, and only the best `MAX_CANDIDATES` are returned. Tokens found in
+    more than `MAX_POSTINGS` trips, such as common first names, are too frequent to
+    narrow the search and are ignored, which keeps the cost of a search bounded however
+    large the block is.
+    """
+
+    def __init__(self, positions, names, addresses):
+        self.positions = positions
+        self.postings = {}
+        if len(positions) <= SMALL_BLOCK_SIZE:
+            return
+        for position in positions:
+            for token in _tokens(names[position], addresses[position]):
+                self.postings.setdefault(token, []).append(position)
+
+    def candidates(self, name, address):
+        if len(self.positions) <= SMALL_BLOCK_SIZE:
+            return self.positions
+
+        weights = {}
+        for token in _tokens(name, address):
+            postings = self.postings.get(token, ())
+            if len(postings) > MAX_POSTINGS:
+                continue
+            for position in postings:
+                weights[position] = weights.get(position, 0.0) + 1 / len(postings)
+        return heapq.nlargest(MAX_CANDIDATES, weights, key=weights.get)
+
+
+def _tokens(name, address):
+    tokens = {token for token in TOKEN_PATTERN.findall(name) if len(token) > 1}
+    house_number = TOKEN_PATTERN.match(address)
+    if house_number and house_number.group().isdigit():
+        tokens.add(f"#{house_number.group()}")
+    return tokens
+
+
+def _score(name_matcher, address_matcher, threshold):
+    # quick_ratio is a cheaper upper bound of ratio, so most weak pairs stop here
+    bound = (
+        NAME_WEIGHT * name_matcher.quick_ratio()
+        + (1 - NAME_WEIGHT) * address_matcher.quick_ratio()
+    )
+    if bound < threshold:
+        return None
+
+    name_score = name_matcher.ratio()
+    address_score = address_matcher.ratio()
+    score = NAME_WEIGHT * name_score + (1 - NAME_WEIGHT) * address_score
+    if score < threshold:
+        return None
+    return name_score, address_score, score
+
+
+def _blocks(df, columns):
+    if df.empty:
+        return {}
+    keys = [df[column].astype(str).to_numpy() for column in columns]
+    return {
+        key if isinstance(key, tuple) else (key,): positions
+        for key, positions in pd.Series(range(len(df)))
+        .groupby(keys, sort=False)
+        .indices.items()
+    }
+
+
+def _text(series):
+    return series.fillna("").astype(str).str.upper().str.strip().tolist()
+
+
+def _unmatched_report(df, used, source, id_column):
+    remaining = df.iloc[[i for i in range(len(df)) if i not in used]]
+    return pd.DataFrame(
+        {
+            "Source": source,
+            "ID": remaining[id_column].to_numpy(),
+            "Date of Service": remaining[DATE_COLUMN].to_numpy(),
+            "Patient Name": remaining[NAME_COLUMN].to_numpy(),
+            "PU Address": remaining[ADDRESS_COLUMN].to_numpy(),
+        },
+        columns=UNMATCHED_COLUMNS,
+    )
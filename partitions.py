@@ -0,0 +1,239 @@
+"""
+Partitioned output of the billing report.
+
+Billing needs one report per month of service and per Level of Service. Instead of
+writing one merged file and splitting it afterwards, the merged report is grouped once
+by the partition keys and each group is written to its own file on a thread pool. A
+manifest lists each file with its partition values, row count and SHA-256 checksum.
+
+Functions:
+- partition_report(df, partition_by):
+    Splits the merged report into one DataFrame per combination of partition values.
+
+- write_partitions(df, output_dir, partition_by, output_format, compression, workers):
+    Writes each partition of the merged report to its own file, concurrently, and
+    saves a manifest of the files.
+"""
+
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import data_processing as dt
+from profiling import profiled
+
+# Partition keys: the month of "Date of Service" and "Level of Service"
+PARTITION_KEYS = ("month", "los")
+
+# Name of the partition values of rows without a date of service or Level of Service
+MISSING_PARTITION = "unknown"
+
+# Name of the manifest of the partition files
+MANIFEST_FILE = "merged_manifest.json"
+
+# Characters that are replaced in the partition values used in file names
+FILE_NAME_PATTERN = re.compile(r"[^A-Za-z0-9-]+")
+
+
+def partition_report(df, partition_by):
+    """
+    Splits the merged report into one DataFrame per combination of partition values.
+
+    "month" partitions by the year and month of "Date of Service", as "YYYY-MM", and
+    "los" by "Level of Service". Rows missing a value are kept in a partition named
+    "unknown". The report is grouped once, whatever the number of keys.
+
+    Args:
+        df (pd.DataFrame): The merged report.
+        partition_by (list): Partition keys, each one of `PARTITION_KEYS`.
+
+    Returns:
+        list: Tuples of the partition values, as a dict of key to value, and the rows
+        of the partition, sorted by the partition values.
+
+    Raises:
+        ValueError: If a partition key is not supported or is repeated.
+    """
+    if not partition_by:
+        raise ValueError("At least one partition key is required.")
+    for key in partition_by:
+        if key not in PARTITION_KEYS:
+            raise ValueError(
+                f"Unsupported partition key '{key}'. "
+                f"Expected one of: {', '.join(PARTITION_KEYS)}."
+            )
+    if len(set(partition_by)) != len(partition_by):
+        raise ValueError("Partition keys must not be repeated.")
+
+    keys = [_partition_keys(df, key) for key in partition_by]
+    grouped = df.groupby(keys, sort=True, dropna=False)
+    partitions = []
+    for values, rows in grouped.indices.items():
+        if not isinstance(values, tuple):
+            values = (values,)
+        values = [
+            MISSING_PARTITION if pd.isna(value) else str(value) for value in values
+        ]
+        partitions.append((dict(zip(partition_by, values)), df.take(rows)))
+    return partitions
+
+
+@profiled("write_partitions")
+def write_partitions(
+    df, output_dir, partition_by, output_format="csv", compression=None, workers=None
+):
+    """
+    Writes each partition of the merged report to its own file, concurrently, and
+    saves a manifest of the files.
+
+    Partition files are named "merged_<values>.<format>", such as
+    "merged_2024-01_Ambulatory.csv", and written atomically with
+    `data_processing.write_report` on a thread pool. The manifest,
+    "merged_manifest.json", lists the partition keys, the output format and, for each
+    file, its partition values, row count and SHA-256 checksum. It is written last, so
+    it only lists complete files. Partition files of an earlier run that this run did
+    not write, as listed by the previous manifest, are then removed.
+
+    Args:
+        df (pd.DataFrame): The merged report.
+        output_dir (str): The directory of the partition files and the manifest.
+        partition_by (list): Partition keys, each one of `PARTITION_KEYS`.
+        output_format (str): One of `data_processing.OUTPUT_FORMATS`.
+        compression (str, optional): One of `data_processing.CSV_COMPRESSIONS`, for
+            CSV output only. Adds ".gz" or ".zst" to the file names.
+        workers (int, optional): Maximum number of files written at the same time. If
+            None, the default of `concurrent.futures.ThreadPoolExecutor` is used.
+
+    Returns:
+        dict: The manifest.
+
+    Raises:
+        ValueError: If a partition key, the output format or the compression is not
+            supported.
+        ImportError: If `compression` is "zstd" and zstandard is not installed.
+    """
+    if output_format not in dt.OUTPUT_FORMATS:
+        raise ValueError(
+            f"Unsupported output format '{output_format}'. "
+            f"Expected one of: {', '.join(dt.OUTPUT_FORMATS)}."
+        )
+    dt.check_compression(compression)
+    extension = f"{output_format}{dt.CSV_COMPRESSIONS.get(compression, '')}"
+    partitions = partition_report(df, partition_by)
+    os.makedirs(output_dir, exist_ok=True)
+
+    # File names of the partitions, made unique if two values only differ by
+    # characters that are replaced
+    file_names = []
+    for values, _ in partitions:
+        stem = "_".join(_file_name_part(value) for value in values.values())
+        name = f"merged_{stem}.{extension}"
+        suffix = 2
+        while name in file_names:
+            name = f"merged_{stem}_{suffix}.{extension}"
+            suffix += 1
+        file_names.append(name)
+
+    def write_partition(file_name, partition):
+        output_file = os.path.join(output_dir, file_name)
+        dt.write_report(partition, output_file, output_format, compression)
+        return _file_digest(output_file)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = list(
+            executor.map(
+                write_partition,
+                file_names,
+                [partition for _, partition in partitions],
+            )
+        )
+
+    manifest = {
+        "partition_by": list(partition_by),
+        "format": output_format,
+        "compression": compression,
+        "rows": len(df),
+        "files": [
+            {
+                "file": file_name,
+                "partition": values,
+                "rows": len(partition),
+                "sha256": digest,
+            }
+            for file_name, (values, partition), digest in zip(
+                file_names, partitions, digests
+            )
+        ],
+    }
+
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+    previous_files = _manifest_files(manifest_path)
+    with dt._atomic_output(manifest_path) as temp_path:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+    # Stale partitions of an earlier run would otherwise be mixed with this run's
+    for file_name in previous_files.difference(file_names):
+        try:
+            os.remove(os.path.join(output_dir, file_name))
+        except FileNotFoundError:
+            pass
+
+    return manifest
+
+
+def _partition_keys(df, key):
+    """
+    Returns the values of one partition key for each row of the report.
+
+    Months are grouped as periods rather than formatted strings, which only the
+    partition values are converted to.
+    """
+    if key == "month":
+        return pd.to_datetime(df["Date of Service"]).dt.to_period("M")
+    return df["Level of Service"].astype(object)
+
+
+def _file_name_part(value):
+    """
+    Returns a partition value with the characters unsafe in file names replaced.
+    """
+    return FILE_NAME_PATTERN.sub("_", value).strip("_") or MISSING_PARTITION
+
+
+def _manifest_files(manifest_path):
+    """
+    Returns the names of the partition files listed by a manifest, or an empty set if
+    there is no readable manifest.
+    """
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            files = json.load(f)["files"]
+    except (OSError, ValueError, KeyError, TypeError):
+        return set()
+
+    # Only plain partition file names are trusted, never paths
+    return {
+        entry["file"]
+        for entry in files
+        if isinstance(entry, dict)
+        and isinstance(entry.get("file"), str)
+        and entry["file"].startswith("merged_")
+        and os.path.basename(entry["file"]) == entry["file"]
+        and entry["file"] != MANIFEST_FILE
+    }
+
+
+def _file_digest(file_path):
+    """
+    Returns the SHA-256 hash of a file's contents.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
@@ -0,0 +1,436 @@
+"""
+Importable report pipeline.
+
+Builds the merged billing report in memory from Traumasoft and Call the Car data, given
+either DataFrames or input files. A long-running process can call these functions many
+times, keeping the usaddress model and the address cache of `data_processing` warm
+between reports.
+
+Classes:
+- ReportConfig:
+    Settings of a report run.
+
+Functions:
+- prepare_inputs(ctc_df, ts_df, config):
+    Cleans, extracts, standardizes and normalizes copies of the raw DataFrames.
+
+- encode_join_keys(ts_df, ctc_df):
+    Replaces the join keys of both DataFrames with integer codes of one factorization.
+
+- resolve_engines(engine):
+    Returns the names of the CSV engine and the join engine of a report run.
+
+- merge_report(ctc_df, ts_df, config):
+    Merges prepared DataFrames and selects the columns of the billing report.
+
+- build_report(ctc_df, ts_df, config):
+    Builds the billing report from raw Call the Car and Traumasoft DataFrames.
+
+- prepare_files(input_files, config):
+    Reads and prepares the Call the Car and Traumasoft data of input files.
+
+- build_report_from_files(input_files, config):
+    Builds the billing report from a directory or a list of input files.
+
+- diagnose_unmatched(ctc_df, ts_df):
+    Returns the prepared trips the exact merge leaves unmatched, with the reason.
+
+- fuzzy_match_report(ctc_df, ts_df, config):
+    Pairs the prepared trips the exact merge leaves unmatched by similarity.
+"""
+
+import os
+from dataclasses import dataclass
+
+import pandas as pd
+from pandas.api.extensions import take
+
+import data_processing as dt
+import diagnostics
+import engines
+import incremental
+import matching
+import profiling
+from schema import SchemaError
+
+# Engines of a report run, with the CSV engine the inputs are read with and the engine
+# the prepared data are joined with. Polars and DuckDB work on Arrow memory, so their
+# inputs are read by pyarrow
+ENGINES = {
+    "pandas": ("pandas", "pandas"),
+    "pyarrow": ("pyarrow", "pandas"),
+    "polars": ("pyarrow", "polars"),
+    "duckdb": ("pyarrow", "duckdb"),
+}
+
+# Columns the merged DataFrames are joined on
+JOIN_COLUMNS = ["Patient Name", "Date of Service", "PU Address"]
+
+# Columns of the billing report, in order
+OUTPUT_COLUMNS = [
+    "Vendor Name",
+    "Vendor Tax ID",
+    "CTC Trip ID",
+    "Date of Service",
+    "Member Last Name",
+    "Member First Name",
+    "Pick Up Address",
+    "Drop Off Address",
+    "Requested Arrival Time",
+    "Appointment Time",
+    "Actual Pickup Arrival Date",
+    "Actual Pickup Arrival Time",
+    "Actual Drop off Arrival Date",
+    "Actual Drop off Arrival Time",
+    "Level of Service",
+    "Driver Name",
+    "Driver's License",
+    "Vehicle VIN",
+    "Trip Status",
+    "Miles",
+    "Wait Time Minutes",
+    "Oxygen Provided",
+    "Total Cost",
+    "Comment",
+]
+
+# Columns of the report taken from each side of the merge, mapped to their report
+# names. The arrival timestamps are split into date and time columns after the merge.
+TS_REPORT_COLUMNS = {
+    "At Scene": "At Scene",
+    "At Destination": "At Destination",
+    "Crew": "Driver Name",
+    "Driver's License": "Driver's License",
+    "VIN": "Vehicle VIN",
+    "Status": "Trip Status",
+    "Miles": "Miles",
+}
+CTC_REPORT_COLUMNS = {
+    "Trip ID": "CTC Trip ID",
+    "Last Name": "Member Last Name",
+    "First Name": "Member First Name",
+    "Pick Up Address": "Pick Up Address",
+    "Drop Off Address": "Drop Off Address",
+    "Pickup Time": "Requested Arrival Time",
+    "Appointment Time": "Appointment Time",
+    "LOS": "Level of Service",
+    "Wait Time": "Wait Time Minutes",
+    "Oxygen": "Oxygen Provided",
+}
+
+
+@dataclass
+class ReportConfig:
+    """
+    Settings of a report run.
+
+    Attributes:
+        vendor_name (str): Value of the "Vendor Name" column.
+        vendor_tax_id (str): Value of the "Vendor Tax ID" column.
+        workers (int): Maximum number of worker processes used to parse addresses.
+        chunksize (int): Number of rows read at a time from CSV files, or None to
+            read each file in one call.
+        engine (str): The engine of the run, one of `ENGINES`: "pandas" (default),
+            "pyarrow" to read CSV files with pyarrow, or "polars" or "duckdb" to also
+            join with Polars or DuckDB.
+        incremental (bool): If True, reuse prepared input files from `cache_dir`.
+        cache_dir (str): Directory of the incremental cache.
+        fuzzy_threshold (float): Minimum similarity score of a fuzzy match.
+        fuzzy_block_by_zip (bool): If True, only fuzzy match trips with the same
+            'PU Zip' as well as the same 'Date of Service'.
+    """
+
+    vendor_name: str | None = None
+    vendor_tax_id: str | None = None
+    workers: int = 1
+    chunksize: int | None = None
+    engine: str = "pandas"
+    incremental: bool = False
+    cache_dir: str = "cache"
+    fuzzy_threshold: float = 0.85
+    fuzzy_block_by_zip: bool = False
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """
+        Creates a config with the vendor read from VENDOR_NAME and VENDOR_TAX_ID.
+
+        Args:
+            **kwargs: Other settings of the config.
+
+        Returns:
+            ReportConfig: The config.
+        """
+        return cls(
+            vendor_name=os.getenv("VENDOR_NAME"),
+            vendor_tax_id=os.getenv("VENDOR_TAX_ID"),
+            **kwargs,
+        )
+
+
+def prepare_inputs(ctc_df, ts_df, config=None):
+    """
+    Cleans, extracts, standardizes and normalizes copies of the raw DataFrames.
+
+    Args:
+        ctc_df (pd.DataFrame): The raw Call the Car (Download) data.
+        ts_df (pd.DataFrame): The Traumasoft (dispatch) data, without footer rows.
+        config (ReportConfig, optional): The settings of the run.
+
+    Returns:
+        tuple: The prepared Call the Car and Traumasoft DataFrames. The given
+        DataFrames are not modified.
+    """
+    config = config or ReportConfig()
+    return (
+        dt.prepare_download_df(ctc_df.copy(), workers=config.workers),
+        dt.prepare_dispatch_df(ts_df.copy(), workers=config.workers),
+    )
+
+
+def encode_join_keys(ts_df, ctc_df):
+    """
+    Replaces the join keys of both DataFrames with integer codes of one factorization.
+
+    Each key column is factorized once over both DataFrames, so equal values get equal
+    codes on both sides and the merge compares integers instead of strings. Missing
+    values get the code -1 on both sides, so they match each other as in a merge on
+    the original values.
+
+    Args:
+        ts_df (pd.DataFrame): The prepared Traumasoft data.
+        ctc_df (pd.DataFrame): The prepared Call the Car data.
+
+    Returns:
+        tuple: A tuple containing:
+            - ts_df (pd.DataFrame): A shallow copy of `ts_df` with coded keys.
+            - ctc_df (pd.DataFrame): A shallow copy of `ctc_df` with coded keys.
+            - uniques (dict): The distinct values of each key column, indexed by code.
+    """
+    ts_df = ts_df.copy(deep=False)
+    ctc_df = ctc_df.copy(deep=False)
+    uniques = {}
+    for column in JOIN_COLUMNS:
+        codes, uniques[column] = pd.factorize(
+            pd.concat([ts_df[column], ctc_df[column]], ignore_index=True)
+        )
+        ts_df[column] = codes[: len(ts_df)]
+        ctc_df[column] = codes[len(ts_df) :]
+    return ts_df, ctc_df, uniques
+
+
+def resolve_engines(engine):
+    """
+    Returns the names of the CSV engine and the join engine of a report run.
+
+    Args:
+        engine (str): One of `ENGINES`.
+
+    Returns:
+        tuple: The name of the CSV engine, see `data_processing.read_input_file`, and
+        of the join engine, see `engines.resolve_join_engine`.
+
+    Raises:
+        ValueError: If `engine` is not supported.
+    """
+    if engine not in ENGINES:
+        raise ValueError(
+            f"Unsupported engine '{engine}'. Expected one of: {', '.join(ENGINES)}."
+        )
+    return ENGINES[engine]
+
+
+def merge_report(ctc_df, ts_df, config=None):
+    """
+    Merges prepared DataFrames and selects the columns of the billing report.
+
+    The DataFrames are joined on 'Patient Name', 'Date of Service' and 'PU Address',
+    encoded as integers by `encode_join_keys`. The join engine of `config.engine` finds
+    the matching rows from the codes alone, and the report columns of those rows are
+    taken with pandas, so every engine gives the same report. Only the join keys and
+    the columns in `TS_REPORT_COLUMNS` and `CTC_REPORT_COLUMNS` are merged, already
+    under their report names, so no other column is copied into the merged data.
+    "Date of Service" stays a datetime64 column; `data_processing.write_report`
+    formats it when writing CSV.
+
+    Args:
+        ctc_df (pd.DataFrame): The prepared Call the Car data.
+        ts_df (pd.DataFrame): The prepared Traumasoft data.
+        config (ReportConfig, optional): The settings of the run.
+
+    Returns:
+        pd.DataFrame: The billing report, with the columns in `OUTPUT_COLUMNS`.
+    """
+    config = config or ReportConfig()
+    join_engine = engines.resolve_join_engine(resolve_engines(config.engine)[1])
+
+    # Project each side on the columns of the report, under their report names
+    ts_df = ts_df[JOIN_COLUMNS + list(TS_REPORT_COLUMNS)].rename(
+        columns=TS_REPORT_COLUMNS
+    )
+    ctc_df = ctc_df[JOIN_COLUMNS + list(CTC_REPORT_COLUMNS)].rename(
+        columns=CTC_REPORT_COLUMNS
+    )
+
+    # Merge the DataFrames on 'Patient Name', 'Date of Service', and 'PU Address'
+    with profiling.stage("merge", rows_in=len(ts_df) + len(ctc_df)) as record:
+        ts_df, ctc_df, uniques = encode_join_keys(ts_df, ctc_df)
+        ts_rows, ctc_rows = join_engine.join(ts_df, ctc_df, JOIN_COLUMNS)
+        merged_df = pd.concat(
+            [
+                ts_df.take(ts_rows).reset_index(drop=True),
+                ctc_df.drop(columns=JOIN_COLUMNS).take(ctc_rows).reset_index(drop=True),
+            ],
+            axis=1,
+        )
+        record.rows_out = len(merged_df)
+
+    merged_df["Date of Service"] = take(
+        uniques["Date of Service"],
+        merged_df["Date of Service"].to_numpy(),
+        allow_fill=True,
+    )
+
+    # Split the arrival timestamps into date and time columns
+    at_scene = pd.to_datetime(merged_df["At Scene"])
+    at_destination = pd.to_datetime(merged_df["At Destination"])
+    merged_df["Actual Pickup Arrival Date"] = at_scene.dt.date
+    merged_df["Actual Pickup Arrival Time"] = at_scene.dt.time
+    merged_df["Actual Drop off Arrival Date"] = at_destination.dt.date
+    merged_df["Actual Drop off Arrival Time"] = at_destination.dt.time
+
+    # Constant values in merged dataframe
+    merged_df["Vendor Name"] = config.vendor_name
+    merged_df["Vendor Tax ID"] = config.vendor_tax_id
+    merged_df["Total Cost"] = ""
+    merged_df["Comment"] = ""
+
+    # Retain specific columns in the merged DataFrame
+    return merged_df[OUTPUT_COLUMNS]
+
+
+def build_report(ctc_df, ts_df, config=None):
+    """
+    Builds the billing report from raw Call the Car and Traumasoft DataFrames.
+
+    Args:
+        ctc_df (pd.DataFrame): The raw Call the Car (Download) data.
+        ts_df (pd.DataFrame): The Traumasoft (dispatch) data, without footer rows.
+        config (ReportConfig, optional): The settings of the run.
+
+    Returns:
+        pd.DataFrame: The billing report, with the columns in `OUTPUT_COLUMNS`.
+
+    Example:
+        >>> ctc_df, ts_df = data_processing.combine_csv_files("input")
+        >>> report = build_report(ctc_df, ts_df, ReportConfig(vendor_name="Viewpoint"))
+    """
+    return merge_report(*prepare_inputs(ctc_df, ts_df, config), config)
+
+
+def prepare_files(input_files, config=None):
+    """
+    Reads and prepares the Call the Car and Traumasoft data of input files.
+
+    Args:
+        input_files (str or list): The directory containing the input files, or the
+            specific filenames to process, as for `data_processing.combine_csv_files`.
+        config (ReportConfig, optional): The settings of the run.
+
+    Returns:
+        tuple: The prepared Call the Car and Traumasoft DataFrames.
+
+    Raises:
+        SchemaError: If a file is missing required columns, or if
+            `config.fuzzy_block_by_zip` is True and the dispatch files have no
+            'PU Zip' column.
+    """
+    config = config or ReportConfig()
+    csv_engine, _ = resolve_engines(config.engine)
+
+    if config.incremental:
+        # Only prepare files that are new or changed since the last run
+        ctc_df, ts_df = incremental.combine_prepared_files(
+            input_files,
+            config.cache_dir,
+            {
+                "Download": lambda df: dt.prepare_download_df(
+                    df, workers=config.workers
+                ),
+                "dispatch": lambda df: dt.prepare_dispatch_df(
+                    df, workers=config.workers
+                ),
+            },
+            chunksize=config.chunksize,
+            engine=csv_engine,
+        )
+    else:
+        ctc_df, ts_df = dt.combine_csv_files(
+            input_files, chunksize=config.chunksize, engine=csv_engine
+        )
+        ctc_df = dt.prepare_download_df(ctc_df, workers=config.workers)
+        ts_df = dt.prepare_dispatch_df(ts_df, workers=config.workers)
+
+    # 'PU Zip' is optional in dispatch exports, so a missing column is reported here
+    # rather than by the fuzzy match, after the report has been written
+    if config.fuzzy_block_by_zip and matching.ZIP_COLUMN not in ts_df.columns:
+        raise SchemaError(
+            f"dispatch files have no '{matching.ZIP_COLUMN}' column, which is required "
+            "to fuzzy match by ZIP."
+        )
+    return ctc_df, ts_df
+
+
+def build_report_from_files(input_files, config=None):
+    """
+    Builds the billing report from a directory or a list of input files.
+
+    Args:
+        input_files (str or list): The directory containing the input files, or the
+            specific filenames to process, as for `data_processing.combine_csv_files`.
+        config (ReportConfig, optional): The settings of the run.
+
+    Returns:
+        pd.DataFrame: The billing report, with the columns in `OUTPUT_COLUMNS`.
+    """
+    ctc_df, ts_df = prepare_files(input_files, config)
+    return merge_report(ctc_df, ts_df, config)
+
+
+def diagnose_unmatched(ctc_df, ts_df):
+    """
+    Returns the prepared trips the exact merge leaves unmatched, with the reason.
+
+    Args:
+        ctc_df (pd.DataFrame): The prepared Call the Car data.
+        ts_df (pd.DataFrame): The prepared Traumasoft data.
+
+    Returns:
+        tuple: The unmatched Traumasoft runs and Call the Car trips, each with a
+        "reason" column, see `diagnostics.unmatched_trips`.
+    """
+    return diagnostics.unmatched_trips(ts_df, ctc_df, JOIN_COLUMNS)
+
+
+def fuzzy_match_report(ctc_df, ts_df, config=None):
+    """
+    Pairs the prepared trips the exact merge leaves unmatched by similarity.
+
+    The matches are meant for review; they are not added to the billing report.
+
+    Args:
+        ctc_df (pd.DataFrame): The prepared Call the Car data.
+        ts_df (pd.DataFrame): The prepared Traumasoft data.
+        config (ReportConfig, optional): The settings of the run.
+
+    Returns:
+        tuple: The matched pairs with their scores and the runs and trips that are
+        still unmatched, see `matching.fuzzy_match`.
+    """
+    config = config or ReportConfig()
+    return matching.fuzzy_match(
+        matching.unmatched_rows(ts_df, ctc_df, JOIN_COLUMNS),
+        matching.unmatched_rows(ctc_df, ts_df, JOIN_COLUMNS),
+        threshold=config.fuzzy_threshold,
+        block_by_zip=config.fuzzy_block_by_zip,
+    )
@@ -0,0 +1,295 @@
+"""
+Per-stage timing and memory instrumentation for the report pipeline.
+
+Stages are marked with the `stage` context manager or the `profiled` decorator. They
+cost next to nothing until a profiler is enabled with `enable`, after which each stage
+records its wall time, CPU time, rows in and out, the peak traced memory allocated
+during the stage (tracemalloc) and the peak resident set size of the process.
+
+Classes:
+- StageRecord:
+    Measurements of one run of a stage.
+
+- StageProfiler(trace_memory):
+    Collects stage records and summarizes them.
+
+Functions:
+- enable(trace_memory):
+    Starts recording stages in the current thread and returns the profiler.
+
+- disable():
+    Stops recording stages.
+
+- stage(name, rows_in):
+    Context manager measuring one stage if a profiler is enabled.
+
+- profiled(name):
+    Decorator measuring every call of a function as a stage.
+"""
+
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class StageRecord:
+    """
+    Measurements of one run of a stage.
+
+    Attributes:
+        name (str): The name of the stage.
+        rows_in (int): Number of rows going into the stage, if known.
+        rows_out (int): Number of rows coming out of the stage, if known.
+        wall_time (float): Elapsed time in seconds.
+        cpu_time (float): CPU time of the process in seconds.
+        peak_memory (int): Peak traced memory allocated during the stage, in bytes.
+        peak_rss (int): Peak resident set size of the process at the end of the
+            stage, in bytes.
+    """
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.peak_memory = None
+        self.peak_rss = None
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class StageProfiler:
+    """
+    Collects stage records and summarizes them.
+
+    Args:
+        trace_memory (bool): If True, trace Python memory allocations with tracemalloc
+            to measure the peak memory of each stage. Tracing slows the pipeline down.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.records = []
+        self._peaks = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Measures the code run inside the context as a stage.
+
+        Args:
+            name (str): The name of the stage.
+            rows_in (int, optional): Number of rows going into the stage.
+
+        Yields:
+            StageRecord: The record of the stage, whose `rows_out` can be set.
+        """
+        record = StageRecord(name, rows_in)
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+
+        if tracing:
+            start_memory, peak = tracemalloc.get_traced_memory()
+            # Keep the peak seen so far by enclosing stages before resetting it
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append(start_memory)
+
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        try:
+            yield record
+        finally:
+            record.wall_time = time.perf_counter() - start_wall
+            record.cpu_time = time.process_time() - start_cpu
+
+            if tracing:
+                peak = max(tracemalloc.get_traced_memory()[1], self._peaks.pop())
+                record.peak_memory = peak - start_memory
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                tracemalloc.reset_peak()
+
+            record.peak_rss = _peak_rss()
+            self.records.append(record)
+
+    def summary(self):
+        """
+        Returns a table of the stages, aggregated by name in order of first run.
+
+        Returns:
+            str: The summary table.
+        """
+        stages = {}
+        for record in self.records:
+            totals = stages.setdefault(
+                record.name,
+                {"calls": 0, "wall": 0.0, "cpu": 0.0, "in": None, "out": None},
+            )
+            totals["calls"] += 1
+            totals["wall"] += record.wall_time
+            totals["cpu"] += record.cpu_time
+            for key, rows in (("in", record.rows_in), ("out", record.rows_out)):
+                if rows is not None:
+                    totals[key] = (totals[key] or 0) + rows
+            if record.peak_memory is not None:
+                totals["peak"] = max(totals.get("peak", 0), record.peak_memory)
+            if record.peak_rss is not None:
+                totals["rss"] = max(totals.get("rss", 0), record.peak_rss)
+
+        lines = [
+            f"{'Stage':<30}{'Calls':>6}{'Wall (s)':>10}{'CPU (s)':>10}"
+            f"{'Rows in':>10}{'Rows out':>10}{'Peak MB':>10}{'RSS MB':>10}"
+        ]
+        for name, totals in stages.items():
+            lines.append(
+                f"{name:<30}{totals['calls']:>6}{totals['wall']:>10.3f}"
+                f"{totals['cpu']:>10.3f}{_format(totals['in']):>10}"
+                f"{_format(totals['out']):>10}"
+                f"{_format_megabytes(totals.get('peak')):>10}"
+                f"{_format_megabytes(totals.get('rss')):>10}"
+            )
+        return "\n".join(lines)
+
+    def write_json(self, path):
+        """
+        Writes every stage record to a JSON file.
+
+        Args:
+            path (str): The path of the JSON trace.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump([record.to_dict() for record in self.records], f, indent=2)
+
+
+_profiler = None
+_profiler_thread = None
+
+
+def enable(trace_memory=True):
+    """
+    Starts recording stages in the current thread.
+
+    Stages run in other threads, such as the file readers of `combine_csv_files`,
+    are not recorded.
+
+    Args:
+        trace_memory (bool): If True, start tracemalloc to measure peak memory.
+
+    Returns:
+        StageProfiler: The profiler collecting the records.
+    """
+    global _profiler, _profiler_thread
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _profiler = StageProfiler(trace_memory=trace_memory)
+    _profiler_thread = threading.get_ident()
+    return _profiler
+
+
+def disable():
+    """
+    Stops recording stages and stops tracemalloc if it is running.
+    """
+    global _profiler, _profiler_thread
+
+    _profiler = None
+    _profiler_thread = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Measures the code run inside the context as a stage if a profiler is enabled.
+
+    Args:
+        name (str): The name of the stage.
+        rows_in (int, optional): Number of rows going into the stage.
+
+    Yields:
+        StageRecord: The record of the stage, whose `rows_out` can be set.
+
+    Example:
+        >>> with stage("merge", rows_in=len(ts_df) + len(ctc_df)) as record:
+        ...     merged_df = pd.merge(ts_df, ctc_df, on=keys)
+        ...     record.rows_out = len(merged_df)
+    """
+    profiler = _profiler
+    if profiler is None or threading.get_ident() != _profiler_thread:
+        yield StageRecord(name, rows_in)
+        return
+
+    with profiler.stage(name, rows_in) as record:
+        yield record
+
+
+def profiled(name):
+    """
+    Decorator measuring every call of a function as a stage.
+
+    Rows in are counted from the first argument and rows out from the return value,
+    when they are DataFrames, Series, or lists or tuples of them.
+
+    Args:
+        name (str): The name of the stage.
+
+    Returns:
+        function: The decorator.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profiler is None:
+                return function(*args, **kwargs)
+
+            rows_in = _count_rows(args[0]) if args else None
+            with stage(name, rows_in) as record:
+                result = function(*args, **kwargs)
+                record.rows_out = _count_rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def _count_rows(value):
+    if isinstance(value, (list, tuple)):
+        counts = [_count_rows(item) for item in value]
+        if counts and all(count is not None for count in counts):
+            return sum(counts)
+        return None
+    if hasattr(value, "shape") and hasattr(value, "index"):
+        return len(value)
+    return None
+
+
+def _peak_rss():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _format(value):
+    return "" if value is None else str(value)
+
+
+def _format_megabytes(value):
+    return "" if value is None else f"{value / 2**20:.1f}"
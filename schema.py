@@ -0,0 +1,186 @@
+"""
+Schemas of the Call the Car and Traumasoft exports.
+
+Each export format declares the columns the report needs, the dtype each of them is
+read with, and its date columns. Files are read with only these columns, and their
+header is checked before any data is parsed, so a column renamed by a vendor fails
+with a clear error naming the file and the missing column instead of a KeyError in a
+later stage.
+
+Classes:
+- SchemaError:
+    Raised when an input file does not match the schema of its format.
+
+- ExportSchema(file_type, columns, optional_columns, date_columns):
+    Columns, dtypes and date columns of one export format.
+
+Functions:
+- schema_for(file_type):
+    Returns the schema of the "Download" or "dispatch" format.
+"""
+
+import difflib
+from dataclasses import dataclass, field
+
+
+class SchemaError(ValueError):
+    """
+    Raised when an input file does not match the schema of its format.
+    """
+
+
+@dataclass(frozen=True)
+class ExportSchema:
+    """
+    Columns, dtypes and date columns of one export format.
+
+    Attributes:
+        file_type (str): The prefix of the file names, "Download" or "dispatch".
+        columns (dict): The dtype of each required column, or None to let the reader
+            infer it.
+        optional_columns (dict): The dtype of each column that is used when present.
+        date_columns (tuple): The columns holding dates. They are read as strings and
+            parsed by the prepare steps with `data_processing.DATE_FORMAT`.
+    """
+
+    file_type: str
+    columns: dict
+    optional_columns: dict = field(default_factory=dict)
+    date_columns: tuple = ()
+
+    @property
+    def dtypes(self):
+        """
+        dict: The dtype of each column with a declared dtype, for `pd.read_csv`.
+        """
+        return {
+            column: dtype
+            for column, dtype in {**self.columns, **self.optional_columns}.items()
+            if dtype is not None
+        }
+
+    def usecols(self, column):
+        """
+        Returns whether a column is read, for the `usecols` argument of `pd.read_csv`.
+
+        Args:
+            column (str): The name of a column of the file.
+
+        Returns:
+            bool: True if the column is required or optional.
+        """
+        return column in self.columns or column in self.optional_columns
+
+    def select(self, header, source):
+        """
+        Validates the header of a file and returns the columns to read from it.
+
+        Args:
+            header (list): The column names of the file.
+            source (str): The file name, for the error message.
+
+        Returns:
+            list: The columns of the header that are required or optional, in file
+            order.
+
+        Raises:
+            SchemaError: If required columns are missing, see `validate`.
+        """
+        self.validate(header, source)
+        return [column for column in header if self.usecols(column)]
+
+    def validate(self, header, source):
+        """
+        Checks that the header of a file has every required column.
+
+        Args:
+            header (list): The column names of the file.
+            source (str): The file name, for the error message.
+
+        Raises:
+            SchemaError: If required columns are missing. The message lists them,
+                with the closest column of the file for each when there is one.
+        """
+        header = [str(column) for column in header]
+        missing = [column for column in self.columns if column not in header]
+        if not missing:
+            return
+
+        descriptions = []
+        for column in missing:
+            close = difflib.get_close_matches(column, header, n=1)
+            descriptions.append(
+                f"'{column}' (found '{close[0]}')" if close else f"'{column}'"
+            )
+        raise SchemaError(
+            f"{self.file_type} file '{source}' is missing required "
+            f"column{'s' if len(missing) > 1 else ''} {', '.join(descriptions)}. "
+            "Was a column renamed in the export?"
+        )
+
+
+DOWNLOAD_SCHEMA = ExportSchema(
+    file_type="Download",
+    columns={
+        "Trip ID": None,
+        "Date of Service": str,
+        "First Name": str,
+        "Last Name": str,
+        "Origin Street": str,
+        "Origin City": str,
+        "Origin State": str,
+        "Origin Postal": str,
+        "Origin Comments": str,
+        "Destination Street": str,
+        "Destination City": str,
+        "Destination State": str,
+        "Destination Postal": str,
+        "Pickup Time": str,
+        "Appointment Time": str,
+        "LOS": str,
+    },
+    date_columns=("Date of Service",),
+)
+
+DISPATCH_SCHEMA = ExportSchema(
+    file_type="dispatch",
+    columns={
+        "Run #": str,
+        "Date of Service": str,
+        "Patient Name": str,
+        "PU Address": str,
+        "At Scene": str,
+        "At Destination": str,
+        "Crew": str,
+        "Driver's License": str,
+        "VIN": str,
+        "Status": str,
+        "Miles": None,
+    },
+    # Used to block fuzzy matches by ZIP code when the export has it
+    optional_columns={"PU Zip": str},
+    date_columns=("Date of Service",),
+)
+
+SCHEMAS = {schema.file_type: schema for schema in (DOWNLOAD_SCHEMA, DISPATCH_SCHEMA)}
+
+
+def schema_for(file_type):
+    """
+    Returns the schema of the "Download" or "dispatch" format.
+
+    Args:
+        file_type (str): Either "Download" or "dispatch".
+
+    Returns:
+        ExportSchema: The schema of the format.
+
+    Raises:
+        ValueError: If `file_type` is not a known format.
+    """
+    try:
+        return SCHEMAS[file_type]
+    except KeyError:
+        raise ValueError(
+            f"Unknown file type '{file_type}'. Expected one of: {', '.join(SCHEMAS)}."
+        ) from None
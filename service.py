@@ -0,0 +1,442 @@
+"""
+Long-running report service.
+
+Serves the billing report over HTTP on a TCP port or a Unix socket. The service loads
+pandas, scourgify and the usaddress model once at startup and keeps the address cache
+in memory between requests, so each report only pays for the addresses it has not seen
+before.
+
+Endpoints:
+- POST /report:
+    Accepts "Download" and "dispatch" files uploaded as multipart/form-data and
+    streams back the merged report as CSV.
+
+- GET /health:
+    Returns the address cache statistics and the number of admitted requests as JSON.
+
+Reports are built by a bounded pool of worker threads. At most `workers + queue`
+requests are admitted at a time; further requests are rejected immediately with
+503 Service Unavailable and a Retry-After header instead of piling up.
+
+Classes:
+- ReportHandler:
+    Request handler of the report service.
+
+- ReportServer(server_address, workers, queue, config, max_upload):
+    Threaded HTTP server building reports with a bounded worker pool.
+
+- UnixReportServer(socket_path, workers, queue, config, max_upload):
+    Report server listening on a Unix socket.
+
+Functions:
+- parse_uploads(content_type, body):
+    Extracts the uploaded input files from a multipart/form-data request body.
+
+- warm_up():
+    Loads the usaddress model before the first request.
+
+Usage:
+    python service.py [--host HOST] [--port PORT] [--socket PATH] [--workers N]
+                      [--queue N] [--address-workers N] [--max-upload-mb N]
+
+Example:
+    $ python service.py --port 8000 --workers 2
+    $ curl -F "files=@input/Download.csv" -F "files=@input/dispatch.csv" \\
+          http://localhost:8000/report -o merged.csv
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.parser import BytesParser
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pandas as pd
+from dotenv import load_dotenv
+import data_processing as dt
+import pipeline
+from schema import SchemaError
+
+# Number of report rows converted to CSV and sent at a time
+STREAM_CHUNK_ROWS = 10_000
+
+# Seconds a rejected client is asked to wait before retrying
+RETRY_AFTER = 5
+
+
+def parse_uploads(content_type, body):
+    """
+    Extracts the uploaded input files from a multipart/form-data request body.
+
+    Only the base name of each uploaded filename is kept. Like the input folder, the
+    upload must contain "Download" and "dispatch" files with an extension in
+    `data_processing.INPUT_EXTENSIONS`; form fields without a filename are ignored.
+
+    Args:
+        content_type (str): The Content-Type header of the request.
+        body (bytes): The request body.
+
+    Returns:
+        dict: The contents of each uploaded file, keyed by filename.
+
+    Raises:
+        ValueError: If the body is not multipart/form-data, a filename is not a
+            "Download" or "dispatch" input file or is uploaded twice, or either kind of
+            file is missing.
+    """
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    if message.get_content_type() != "multipart/form-data":
+        raise ValueError("Expected a multipart/form-data request body.")
+
+    uploads = {}
+    for part in message.iter_parts():
+        filename = part.get_filename()
+        if not filename:
+            continue
+
+        filename = os.path.basename(filename.replace("\\", "/"))
+        if not filename.startswith(("Download", "dispatch")) or not filename.endswith(
+            dt.INPUT_EXTENSIONS
+        ):
+            raise ValueError(
+                f"Unexpected file '{filename}'. Expected 'Download' or 'dispatch' "
+                f"files ending with {', '.join(dt.INPUT_EXTENSIONS)}."
+            )
+        if filename in uploads:
+            raise ValueError(f"File '{filename}' was uploaded more than once.")
+        uploads[filename] = part.get_payload(decode=True) or b""
+
+    for file_type in ("Download", "dispatch"):
+        if not any(filename.startswith(file_type) for filename in uploads):
+            raise ValueError(f"No '{file_type}' file was uploaded.")
+
+    return uploads
+
+
+def warm_up():
+    """
+    Loads the usaddress model before the first request.
+
+    The model is loaded when scourgify is first imported, which would otherwise
+    happen during the first report with an address the rules of `address_rules` do
+    not accept.
+    """
+    import scourgify  # noqa: F401
+
+
+class ReportHandler(BaseHTTPRequestHandler):
+    """
+    Request handler of the report service.
+    """
+
+    server_version = "ReportService/1.0"
+    # Seconds to wait on a client socket before giving up on the request
+    timeout = 60
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        self._send_json(
+            HTTPStatus.OK,
+            {
+                "status": "ok",
+                "address_cache": dt.address_cache.stats(),
+                "address_parser": dt.address_parser_stats(),
+                "admitted": self.server.admitted,
+                "capacity": self.server.capacity,
+            },
+        )
+
+    def do_POST(self):
+        if self.path != "/report":
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self.send_error(HTTPStatus.LENGTH_REQUIRED)
+            return
+        if not length.isdigit():
+            self.send_error(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+            return
+        if int(length) > self.server.max_upload:
+            self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            return
+
+        # Admission control: reject the request when the pool and its queue are full
+        if not self.server.admit():
+            self.send_response(HTTPStatus.SERVICE_UNAVAILABLE)
+            self.send_header("Retry-After", str(RETRY_AFTER))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        try:
+            body = self.rfile.read(int(length))
+            try:
+                uploads = parse_uploads(self.headers.get("Content-Type", ""), body)
+            except ValueError as e:
+                self.send_error(HTTPStatus.BAD_REQUEST, str(e))
+                return
+            del body
+
+            try:
+                merged_df = self.server.jobs.submit(
+                    self.server.build_report, uploads
+                ).result()
+            except SchemaError as e:
+                self.send_error(HTTPStatus.BAD_REQUEST, str(e))
+                return
+            except Exception:
+                traceback.print_exc()
+                self.send_error(
+                    HTTPStatus.INTERNAL_SERVER_ERROR, "The report could not be built."
+                )
+                return
+
+            # Stream the CSV without a Content-Length; the connection is closed after it
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/csv; charset=utf-8")
+            self.send_header("Content-Disposition", 'attachment; filename="merged.csv"')
+            self.end_headers()
+            for text in dt.iter_report_csv(merged_df, STREAM_CHUNK_ROWS):
+                self.wfile.write(text.encode("utf-8"))
+        finally:
+            self.server.release()
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "local"
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ReportServerMixin:
+    """
+    Bounded worker pool and admission control shared by the TCP and Unix socket servers.
+    """
+
+    daemon_threads = True
+
+    def _setup_pool(self, workers, queue, config, max_upload):
+        if workers < 1:
+            raise ValueError("Parameter 'workers' must be at least 1.")
+        if queue < 0:
+            raise ValueError("Parameter 'queue' must not be negative.")
+
+        self.config = config or pipeline.ReportConfig()
+        self.max_upload = max_upload
+        self.capacity = workers + queue
+        self.admitted = 0
+        self.jobs = ThreadPoolExecutor(max_workers=workers)
+        self._admission_lock = threading.Lock()
+
+    def admit(self):
+        """
+        Admits a request if fewer than `workers + queue` requests are in progress.
+
+        Returns:
+            bool: True if the request was admitted and must be released afterwards.
+        """
+        with self._admission_lock:
+            if self.admitted >= self.capacity:
+                return False
+            self.admitted += 1
+            return True
+
+    def release(self):
+        """
+        Releases a request admitted by `admit`.
+        """
+        with self._admission_lock:
+            self.admitted -= 1
+
+    def build_report(self, uploads):
+        """
+        Builds the report from uploaded files in a temporary input directory.
+
+        Args:
+            uploads (dict): The contents of each uploaded file, keyed by filename.
+
+        Returns:
+            pd.DataFrame: The billing report.
+        """
+        with tempfile.TemporaryDirectory(prefix="report-") as input_directory:
+            for filename, content in uploads.items():
+                with open(os.path.join(input_directory, filename), "wb") as f:
+                    f.write(content)
+            merged_df = pipeline.build_report_from_files(input_directory, self.config)
+
+        # Persist newly parsed addresses if the cache is backed by a file
+        dt.address_cache.flush()
+        return merged_df
+
+    def server_close(self):
+        super().server_close()
+        self.jobs.shutdown(wait=True)
+
+
+class ReportServer(_ReportServerMixin, socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Threaded HTTP server building reports with a bounded worker pool.
+
+    Each connection is handled in its own thread, but at most `workers` reports are
+    built at a time and at most `workers + queue` requests are admitted.
+
+    Args:
+        server_address (tuple): The host and port to listen on.
+        workers (int): Number of reports built at a time.
+        queue (int): Number of admitted requests waiting for a worker.
+        config (ReportConfig, optional): The settings of each report run.
+        max_upload (int): Maximum size of a request body, in bytes.
+    """
+
+    def __init__(
+        self, server_address, workers=1, queue=4, config=None, max_upload=200 * 2**20
+    ):
+        self._setup_pool(workers, queue, config, max_upload)
+        super().__init__(server_address, ReportHandler)
+
+
+class UnixReportServer(
+    _ReportServerMixin, socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    """
+    Report server listening on a Unix socket.
+
+    Args:
+        socket_path (str): The path of the Unix socket. An existing socket file is
+            replaced.
+        workers (int): Number of reports built at a time.
+        queue (int): Number of admitted requests waiting for a worker.
+        config (ReportConfig, optional): The settings of each report run.
+        max_upload (int): Maximum size of a request body, in bytes.
+    """
+
+    def __init__(
+        self, socket_path, workers=1, queue=4, config=None, max_upload=200 * 2**20
+    ):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self._setup_pool(workers, queue, config, max_upload)
+        super().__init__(socket_path, ReportHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def parse_arguments(argv=None):
+    """
+    Parses the command-line arguments of the service.
+
+    Args:
+        argv (list, optional): The arguments to parse. Defaults to sys.argv[1:].
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description="Serve billing reports built from uploaded Traumasoft and Call "
+        "the Car exports."
+    )
+    parser.add_argument(
+        "--host", default="127.0.0.1", help="Host to listen on (default: 127.0.0.1)."
+    )
+    parser.add_argument(
+        "--port", type=int, default=8000, help="Port to listen on (default: 8000)."
+    )
+    parser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="Listen on a Unix socket at PATH instead of a TCP port.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of reports built at a time (default: 2).",
+    )
+    parser.add_argument(
+        "--queue",
+        type=int,
+        default=4,
+        help="Number of requests waiting for a worker before new requests are "
+        "rejected with 503 (default: 4).",
+    )
+    parser.add_argument(
+        "--address-workers",
+        type=int,
+        default=1,
+        help="Number of processes used to normalize addresses per report (default: 1).",
+    )
+    parser.add_argument(
+        "--max-upload-mb",
+        type=int,
+        default=200,
+        help="Maximum size of an upload in megabytes (default: 200).",
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    Entry point of the service.
+    """
+    args = parse_arguments()
+
+    load_dotenv()
+
+    # Share column data between DataFrames until one of them is modified
+    pd.set_option("mode.copy_on_write", True)
+
+    # The address cache lives as long as the service
+    dt.configure_address_cache(
+        maxsize=int(os.getenv("ADDRESS_CACHE_SIZE", "100000")),
+        path=os.getenv("ADDRESS_CACHE_PATH"),
+    )
+    warm_up()
+
+    config = pipeline.ReportConfig.from_env(workers=args.address_workers)
+    options = {
+        "workers": args.workers,
+        "queue": args.queue,
+        "config": config,
+        "max_upload": args.max_upload_mb * 2**20,
+    }
+    if args.socket:
+        server = UnixReportServer(args.socket, **options)
+        print(f"Serving reports on unix:{args.socket}")
+    else:
+        server = ReportServer((args.host, args.port), **options)
+        print(f"Serving reports on http://{args.host}:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dt.address_cache.close()
+
+
+if __name__ == "__main__":
+    main()
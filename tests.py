@@ -2,8 +2,43 @@
 Test cases
 """
 
+import ast
+import contextlib
+import hashlib
+import importlib.util
+import inspect
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
 import unittest
-from data_processing import extract_wait_time_and_oxygen
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+import address_rules
+import data_processing
+import diagnostics
+import engines
+import pipeline
+from address_cache import AddressCache
+import profiling
+import main
+import matching
+import partitions as partitions_module
+import service
+from incremental import FileManifest
+from schema import SchemaError
+from data_processing import (
+    extract_wait_time_and_oxygen,
+    extract_wait_time_and_oxygen_columns,
+    remove_trailing_nan_rows,
+)
 
 
 class CommentExtractTest(unittest.TestCase):
@@ -394,5 +429,1219 @@ class CommentExtractTest(unittest.TestCase):
         self.assertEqual(extract_wait_time_and_oxygen(input), expected)
 
 
+class CommentExtractColumnsTest(unittest.TestCase):
+    """
+    Validate the column-level extraction against the scalar one on every
+    CommentExtractTest fixture
+    """
+
+    @staticmethod
+    def fixtures():
+        tree = ast.parse(inspect.getsource(CommentExtractTest))
+        return [
+            node.value.value
+            for node in ast.walk(tree)
+            if isinstance(node, ast.Assign)
+            and isinstance(node.targets[0], ast.Name)
+            and node.targets[0].id == "input"
+        ]
+
+    def test_matches_scalar_extraction(self):
+        comments = pd.Series(self.fixtures())
+        self.assertEqual(len(comments), 70)
+
+        extracted = extract_wait_time_and_oxygen_columns(comments)
+
+        for comment, wait_time, oxygen in zip(
+            comments, extracted["Wait Time"], extracted["Oxygen"]
+        ):
+            expected_wait_time, expected_oxygen = extract_wait_time_and_oxygen(comment)
+            self.assertEqual(wait_time, expected_wait_time, comment)
+            if expected_oxygen is None:
+                self.assertTrue(pd.isna(oxygen), comment)
+            else:
+                self.assertEqual(oxygen, expected_oxygen, comment)
+
+    def test_keeps_integer_oxygen_without_keywords(self):
+        extracted = extract_wait_time_and_oxygen_columns(
+            pd.Series(["Wait time: 15 minutes// Oxygen 2L", None], index=[5, 6])
+        )
+        self.assertEqual(extracted.index.tolist(), [5, 6])
+        self.assertEqual(extracted["Wait Time"].tolist(), [15, 0])
+        self.assertEqual(extracted["Oxygen"].tolist(), [2, 0])
+        self.assertEqual(extracted["Oxygen"].dtype, "int64")
+
+
+class DateColumnTest(unittest.TestCase):
+    """
+    Validate vectorized parsing and formatting of "Date of Service"
+    """
+
+    def test_parses_export_and_iso_dates(self):
+        dates = data_processing.normalize_date_column(
+            pd.Series(["08/06/2024", "8/6/2024", "2024-08-06", None, "not a date"])
+        )
+        self.assertEqual(dates.dtype, "datetime64[ns]")
+        self.assertEqual(dates[0], pd.Timestamp(2024, 8, 6))
+        self.assertTrue((dates[:3] == dates[0]).all())
+        self.assertTrue(dates[3:].isna().all())
+
+    def test_formats_without_leading_zeros(self):
+        formatted = data_processing.format_date_column(
+            pd.Series(pd.to_datetime(["2024-08-06", "2024-12-31", None]))
+        )
+        self.assertEqual(formatted[:2].tolist(), ["8/6/2024", "12/31/2024"])
+        self.assertTrue(pd.isna(formatted[2]))
+
+
+class RemoveTrailingNanRowsTest(unittest.TestCase):
+    """
+    Validate removal of the footer rows of dispatch exports
+    """
+
+    RUNS = ["5001", "5002-1", None, "abc", "5003", None, "Total:"]
+
+    def test_removes_footer_and_invalid_runs(self):
+        df = pd.DataFrame({"Run #": self.RUNS, "Miles": range(7)})
+
+        cleaned = remove_trailing_nan_rows(df, "Run #")
+
+        self.assertEqual(cleaned["Run #"].tolist(), ["5001", "5002-1", "5003"])
+        self.assertEqual(cleaned.index.tolist(), [0, 1, 4])
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+    def test_arrow_strings(self):
+        df = pd.DataFrame({"Run #": self.RUNS}, dtype="string[pyarrow]")
+
+        cleaned = remove_trailing_nan_rows(df, "Run #")
+
+        self.assertEqual(cleaned["Run #"].tolist(), ["5001", "5002-1", "5003"])
+
+    def test_numeric_runs(self):
+        df = pd.DataFrame({"Run #": [5001, 5002, 5003, None, 22.5, -1, None]})
+
+        cleaned = remove_trailing_nan_rows(df, "Run #")
+
+        self.assertEqual(cleaned["Run #"].tolist(), [5001, 5002, 5003])
+
+    def test_no_footer(self):
+        df = pd.DataFrame({"Run #": ["5001", "5002"]})
+
+        self.assertEqual(len(remove_trailing_nan_rows(df, "Run #")), 2)
+        self.assertEqual(len(remove_trailing_nan_rows(df.iloc[:0], "Run #")), 0)
+
+
+class CombineCsvFilesTest(unittest.TestCase):
+    """
+    Validate that streamed ingestion matches reading whole files
+    """
+
+    HEADER = (
+        "Run #,Date of Service,Patient Name,PU Address,At Scene,At Destination,"
+        "Crew,Driver's License,VIN,Status,Miles,Notes\n"
+    )
+    DISPATCH = HEADER + (
+        '5001,06/03/2024,"Smith, John",123 Main Street,08:05,08:45,J,D1,V1,Closed,12,a\n'
+        '5002,06/03/2024,"Chen, Wei",456 north Oak ave,09:35,10:15,R,D2,V2,Closed,7,b\n'
+        '5003,06/04/2024,"Khan, Aisha",1 Broadway,10:05,10:45,J,D1,V1,Closed,3,c\n'
+        ",,,,,,,,,,,\n"
+        "Total:,,,,,,,,,,22,\n"
+    )
+
+    def test_chunked_matches_whole_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("dispatch_1.csv", "dispatch_2.csv"):
+                with open(os.path.join(directory, name), "w") as f:
+                    f.write(self.DISPATCH)
+
+            _, whole = data_processing.combine_csv_files(directory)
+            _, chunked = data_processing.combine_csv_files(directory, chunksize=2)
+
+        self.assertEqual(len(chunked), 6)
+        self.assertNotIn("Notes", chunked.columns)
+        self.assertEqual(chunked["Run #"].tolist(), ["5001", "5002", "5003"] * 2)
+        pd.testing.assert_frame_equal(chunked, whole, check_dtype=False)
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+    def test_pyarrow_engine_matches_c_parser(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "dispatch_1.csv"), "w") as f:
+                f.write(self.DISPATCH.replace(",a\n", ",a\n5004,,,,,,,,,,,\n", 1))
+
+            _, c_parser = data_processing.combine_csv_files(directory)
+            _, pyarrow = data_processing.combine_csv_files(directory, engine="pyarrow")
+
+        self.assertEqual(pyarrow["Run #"].dtype, pd.StringDtype("pyarrow"))
+        self.assertEqual(pyarrow["At Scene"][0], "08:05")
+        pd.testing.assert_frame_equal(
+            pyarrow.astype(object).where(pyarrow.notna(), None),
+            c_parser.astype(object).where(c_parser.notna(), None),
+        )
+
+    def test_missing_column_fails_before_parsing(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "dispatch_1.csv"), "w") as f:
+                f.write(self.DISPATCH.replace("PU Address", "Pickup Address", 1))
+
+            with self.assertRaises(SchemaError) as context:
+                data_processing.combine_csv_files(directory)
+
+        message = str(context.exception)
+        self.assertIn("dispatch_1.csv", message)
+        self.assertIn("'PU Address' (found 'Pickup Address')", message)
+
+    def test_parallel_reads_keep_file_order(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for number in range(8):
+                with open(os.path.join(directory, f"dispatch_{number}.csv"), "w") as f:
+                    f.write(self.HEADER)
+                    f.write(f"{number}01-1,,,,,,,,,,1,\n{number}02,,,,,,,,,,2,\n")
+
+            files = [f for f in os.listdir(directory) if f.startswith("dispatch")]
+            _, dispatch_df = data_processing.combine_csv_files(
+                directory, read_workers=4
+            )
+
+        expected = [run for f in files for run in (f"{f[9]}01-1", f"{f[9]}02")]
+        self.assertEqual(dispatch_df["Run #"].tolist(), expected)
+
+
+class WriteReportTest(unittest.TestCase):
+    """
+    Validate CSV and columnar report output
+    """
+
+    REPORT = pd.DataFrame(
+        {
+            "Date of Service": pd.to_datetime(["2024-06-03", "2024-06-04"]),
+            "Level of Service": ["BLS", "ALS"],
+            "Trip Status": ["Closed", "Closed"],
+            "Miles": [12.0, 7.0],
+            "Wait Time Minutes": [0, 90],
+            "Oxygen Provided": [2.0, None],
+        }
+    )
+
+    def test_csv_formats_dates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "merged.csv")
+            data_processing.write_report(self.REPORT, output_file)
+            written = pd.read_csv(output_file, dtype=str)
+
+        self.assertEqual(written["Date of Service"].tolist(), ["6/3/2024", "6/4/2024"])
+
+    def test_chunks_match_single_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            chunked = os.path.join(directory, "chunked.csv")
+            whole = os.path.join(directory, "whole.csv")
+            data_processing.write_report(self.REPORT, chunked, chunksize=1)
+            data_processing.write_report(self.REPORT, whole, chunksize=None)
+            with open(chunked, "rb") as a, open(whole, "rb") as b:
+                self.assertEqual(a.read(), b.read())
+
+    def test_gzip_is_readable_and_reproducible(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "merged.csv.gz")
+            outputs = []
+            for _ in range(2):
+                data_processing.write_report(
+                    self.REPORT, output_file, compression="gzip"
+                )
+                with open(output_file, "rb") as f:
+                    outputs.append(f.read())
+            written = pd.read_csv(output_file, dtype=str)
+
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(written["Date of Service"].tolist(), ["6/3/2024", "6/4/2024"])
+
+    def test_failed_write_keeps_previous_report(self):
+        class Unprintable:
+            def __str__(self):
+                raise RuntimeError("cannot format")
+
+        report = self.REPORT.astype({"Trip Status": object})
+        report.loc[1, "Trip Status"] = Unprintable()
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "merged.csv")
+            data_processing.write_report(self.REPORT, output_file)
+            with open(output_file, "rb") as f:
+                previous = f.read()
+
+            with self.assertRaises(RuntimeError):
+                data_processing.write_report(report, output_file, chunksize=1)
+
+            with open(output_file, "rb") as f:
+                self.assertEqual(f.read(), previous)
+            self.assertEqual(os.listdir(directory), ["merged.csv"])
+
+    def test_rejects_unsupported_compression(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ValueError):
+                data_processing.write_report(
+                    self.REPORT, os.path.join(directory, "merged.csv"), compression="xz"
+                )
+            with self.assertRaises(ValueError):
+                data_processing.write_report(
+                    self.REPORT,
+                    os.path.join(directory, "merged.parquet"),
+                    "parquet",
+                    compression="gzip",
+                )
+
+    @unittest.skipUnless(importlib.util.find_spec("zstandard"), "requires zstandard")
+    def test_zstd_is_readable(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output_file = os.path.join(directory, "merged.csv.zst")
+            data_processing.write_report(self.REPORT, output_file, compression="zstd")
+            written = pd.read_csv(output_file, dtype=str)
+
+        self.assertEqual(written["Level of Service"].tolist(), ["BLS", "ALS"])
+
+    @unittest.skipIf(importlib.util.find_spec("zstandard"), "zstandard is installed")
+    def test_zstd_requires_zstandard(self):
+        with self.assertRaises(ImportError):
+            data_processing.check_compression("zstd")
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "requires pyarrow")
+    def test_columnar_formats_keep_types(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for output_format in ("parquet", "feather"):
+                output_file = os.path.join(directory, f"merged.{output_format}")
+                data_processing.write_report(self.REPORT, output_file, output_format)
+                read = (
+                    pd.read_parquet if output_format == "parquet" else pd.read_feather
+                )
+                written = read(output_file)
+
+                self.assertEqual(written["Date of Service"].dtype, "datetime64[ns]")
+                self.assertEqual(written["Miles"].dtype, "Int64")
+                self.assertEqual(written["Oxygen Provided"].tolist(), [2, pd.NA])
+                self.assertEqual(written["Trip Status"].dtype, "category")
+
+
+class PartitionsTest(unittest.TestCase):
+    """
+    Validate the partitioned report output and its manifest
+    """
+
+    REPORT = pd.DataFrame(
+        {
+            "Date of Service": pd.to_datetime(
+                ["2024-06-03", "2024-07-01", "2024-06-04", None, "2024-06-30"]
+            ),
+            "Level of Service": ["BLS", "ALS", "BLS", "BLS", "W/C Van"],
+            "Trip Status": ["Closed"] * 5,
+            "Miles": [12.0, 7.0, 3.0, 1.0, 5.0],
+        }
+    )
+
+    def test_partitions_by_month_and_los(self):
+        partitions = partitions_module.partition_report(self.REPORT, ["month", "los"])
+
+        self.assertEqual(
+            [(values["month"], values["los"], len(df)) for values, df in partitions],
+            [
+                ("2024-06", "BLS", 2),
+                ("2024-06", "W/C Van", 1),
+                ("2024-07", "ALS", 1),
+                ("unknown", "BLS", 1),
+            ],
+        )
+        self.assertEqual(partitions[0][1]["Miles"].tolist(), [12.0, 3.0])
+
+    def test_rejects_unknown_keys(self):
+        with self.assertRaises(ValueError):
+            partitions_module.partition_report(self.REPORT, ["year"])
+        with self.assertRaises(ValueError):
+            partitions_module.partition_report(self.REPORT, ["los", "los"])
+
+    def test_writes_partitions_and_manifest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            manifest = partitions_module.write_partitions(
+                self.REPORT, directory, ["los"], workers=2
+            )
+            with open(os.path.join(directory, "merged_manifest.json")) as f:
+                self.assertEqual(json.load(f), manifest)
+
+            self.assertEqual(
+                [(entry["file"], entry["rows"]) for entry in manifest["files"]],
+                [
+                    ("merged_ALS.csv", 1),
+                    ("merged_BLS.csv", 3),
+                    ("merged_W_C_Van.csv", 1),
+                ],
+            )
+            for entry in manifest["files"]:
+                output_file = os.path.join(directory, entry["file"])
+                written = pd.read_csv(output_file, dtype=str)
+                self.assertEqual(len(written), entry["rows"])
+                self.assertTrue(
+                    (written["Level of Service"] == entry["partition"]["los"]).all()
+                )
+                with open(output_file, "rb") as f:
+                    self.assertEqual(
+                        hashlib.sha256(f.read()).hexdigest(), entry["sha256"]
+                    )
+
+            whole = os.path.join(directory, "whole.csv")
+            data_processing.write_report(
+                self.REPORT[self.REPORT["Level of Service"] == "BLS"], whole
+            )
+            with open(whole, "rb") as a, open(
+                os.path.join(directory, "merged_BLS.csv"), "rb"
+            ) as b:
+                self.assertEqual(a.read(), b.read())
+
+    def test_removes_stale_partitions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            partitions_module.write_partitions(self.REPORT, directory, ["los"])
+            partitions_module.write_partitions(
+                self.REPORT[self.REPORT["Level of Service"] == "BLS"],
+                directory,
+                ["los"],
+            )
+
+            self.assertEqual(
+                sorted(os.listdir(directory)),
+                ["merged_BLS.csv", "merged_manifest.json"],
+            )
+
+
+class AddressCacheTest(unittest.TestCase):
+    """
+    Validate eviction and persistence of parsed address records
+    """
+
+    def test_evicts_least_recently_used(self):
+        cache = AddressCache(maxsize=2)
+        cache.put("1 MAIN ST", {"address_line_1": "1 MAIN ST"})
+        cache.put("2 MAIN ST", {"address_line_1": "2 MAIN ST"})
+        cache.get("1 MAIN ST")
+        cache.put("3 MAIN ST", {"address_line_1": "3 MAIN ST"})
+        self.assertNotIn("2 MAIN ST", cache)
+        self.assertIn("1 MAIN ST", cache)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 0, "size": 2})
+
+    def test_persists_records_between_runs(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "addresses.sqlite")
+            cache = AddressCache(path=path)
+            cache.put("1 Main Street", {"address_line_1": "1 MAIN ST"})
+            cache.put("nan", None)
+            cache.close()
+
+            cache = AddressCache(path=path)
+            self.assertEqual(cache.get("1 Main Street"), {"address_line_1": "1 MAIN ST"})
+            self.assertIsNone(cache.get("nan", default="missing"))
+            self.assertEqual(cache.get("2 Main Street", default="missing"), "missing")
+            self.assertEqual(cache.stats()["misses"], 1)
+            cache.close()
+
+
+class NormalizeAddressColumnsTest(unittest.TestCase):
+    """
+    Validate batch normalization of address columns
+    """
+
+    def setUp(self):
+        data_processing.configure_address_cache()
+
+    def test_parses_each_address_once(self):
+        ts_addresses = pd.Series(["123 Main Street", "456 north Oak ave"] * 3)
+        ctc_addresses = pd.Series(["123 Main Street"] * 4, index=[10, 11, 12, 13])
+
+        ts_normalized, ctc_normalized = data_processing.normalize_address_columns(
+            [ts_addresses, ctc_addresses]
+        )
+
+        self.assertEqual(
+            ts_normalized.tolist(), ["123 MAIN ST", "456 N OAK AVE"] * 3
+        )
+        self.assertEqual(ctc_normalized.index.tolist(), [10, 11, 12, 13])
+        self.assertEqual(ctc_normalized.tolist(), ["123 MAIN ST"] * 4)
+        self.assertEqual(data_processing.address_cache.stats()["misses"], 2)
+
+    def test_concatenates_components(self):
+        (normalized,) = data_processing.normalize_address_columns(
+            [pd.Series(["456 north Oak ave apt 5, Pasadena, CA, 91101"])],
+            concatenate=True,
+        )
+        self.assertEqual(normalized[0], "456 N OAK AVE, APT 5, PASADENA, CA, 91101")
+
+    def test_process_pool_matches_serial(self):
+        addresses = pd.Series(
+            # Units written with "#" are left to scourgify, and so to the process pool
+            [
+                f"{number} north Oak ave #{number}, Pasadena, CA, 91101"
+                for number in range(40)
+            ]
+        )
+        (serial,) = data_processing.normalize_address_columns([addresses])
+
+        data_processing.configure_address_cache()
+        minimum = data_processing.PARALLEL_MIN_ADDRESSES
+        data_processing.PARALLEL_MIN_ADDRESSES = 1
+        try:
+            (parallel,) = data_processing.normalize_address_columns(
+                [addresses], workers=2
+            )
+        finally:
+            data_processing.PARALLEL_MIN_ADDRESSES = minimum
+
+        self.assertEqual(parallel.tolist(), serial.tolist())
+
+    def test_process_pool_does_not_fork(self):
+        # Forking the multithreaded report service can deadlock the workers
+        self.assertNotEqual(
+            data_processing._process_context().get_start_method(), "fork"
+        )
+
+
+class AddressRulesTest(unittest.TestCase):
+    """
+    Validate the rule-based address normalization against scourgify
+    """
+
+    STREET_NAMES = [
+        "Main",
+        "Oak",
+        "Park",
+        "Lake",
+        "3rd",
+        "21st",
+        "La Brea",
+        "Glenoaks",
+        "La Cienega",
+        "Highway",
+        "County Road",
+        "PO Box",
+        "Tx",
+        "Long Beach",
+        "Santa Fe",
+        "San Pedro",
+        "Martin Luther King",
+        "North",
+        "Circle",
+        "Ave",
+        "Mill Creek",
+        "Sunset",
+        "Church",
+        "1st Church",
+        "Camino",
+        "Camino Real",
+        "Calle Mayor",
+        "Via",
+        "Paseo",
+        "Avenida",
+        "Century San",
+        "San Juan",
+        "Oak And",
+        "And",
+        "Business City",
+    ]
+    SUFFIXES = [
+        "St",
+        "St.",
+        "Street",
+        "Ave",
+        "Blvd",
+        "Dr",
+        "Way",
+        "Ct",
+        "Rd",
+        "Lane",
+        "Trl",
+        "Avenue",
+        "Hwy",
+        "Pkwy",
+        "Sq",
+    ]
+    DIRECTIONALS = ["", "", "N ", "s ", "East ", "Northwest ", "NE ", "SW "]
+    UNITS = ["", "", " Apt 5", " Suite 200", " Unit B", " Ste 4A", " Apt E", " #3"]
+    CITIES = [
+        "Los Angeles, CA, 90001",
+        "Long Beach, CA, 90802-1234",
+        "Park, NV, 89101",
+        "Mission Viejo, CA, 92487",
+        "Union City, NY, 93333",
+    ]
+
+    def corpus(self, size, seed=0):
+        rng = random.Random(seed)
+        addresses = []
+        for _ in range(size):
+            street = (
+                f"{rng.randint(1, 20000)} {rng.choice(self.DIRECTIONALS)}"
+                f"{rng.choice(self.STREET_NAMES)} {rng.choice(self.SUFFIXES)}"
+                f"{rng.choice(self.UNITS)}"
+            )
+            if rng.random() < 0.5:
+                street = f"{street}, {rng.choice(self.CITIES)}"
+            addresses.append(street.upper() if rng.random() < 0.5 else street)
+        return list(dict.fromkeys(addresses))
+
+    def test_matches_scourgify(self):
+        from scourgify import normalize_address_record
+
+        corpus = self.corpus(5000)
+        fast = {}
+        for address in corpus:
+            record = address_rules.normalize_address_record(address)
+            if record is not None:
+                fast[address] = record
+
+        for address, record in fast.items():
+            self.assertEqual(record, dict(normalize_address_record(address)), address)
+
+        self.assertGreater(len(fast) / len(corpus), 0.15)
+
+    def test_leaves_ambiguous_addresses_to_scourgify(self):
+        for address in [
+            "123 Maple Ct",
+            "12 Main Hwy E",
+            "5 Oak St #4",
+            "5 Oak St Apt E",
+            "7 King Expressway",
+            "1 Main St, Los Angeles, CA, nan",
+            "1 Main St, Los Angeles, CA 90001",
+            "12 N St",
+            "Main St",
+            "1 E La Cienega Rd Apt 5",
+            "3 Highway Dr",
+            "2 County Road Dr",
+            "24955 PO Box St",
+            "50 E Tx Lane",
+            "59 SW Long Beach Lane",
+            "6100 NE Santa Fe Trl",
+            "6100 Sunrise Santa Fe Trl",
+            "100 E Camino Lane",
+            "5497 Northwest Camino Avenue",
+            "5509 E Camino Hwy Unit 10, Mission Viejo, CA, 92487",
+            "12 Calle Mayor Ave",
+            "4003 Century San Pkwy, Union City, NY, 93333",
+            "12 Oak And Sq",
+            "74951 Business City Way, Union City, UT, 95447",
+        ]:
+            self.assertIsNone(address_rules.normalize_address_record(address), address)
+
+    def test_counts_fast_path(self):
+        data_processing.configure_address_cache()
+
+        data_processing.parse_addresses(["123 Main St", "5 Oak St #4", "123 Main St"])
+
+        stats = data_processing.address_parser_stats()
+        self.assertEqual((stats["fast_path"], stats["scourgify"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+
+class FileManifestTest(unittest.TestCase):
+    """
+    Validate reuse and invalidation of prepared input files
+    """
+
+    def test_reuses_only_unchanged_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, "dispatch_1.csv")
+            cache_dir = os.path.join(directory, "cache")
+            options = {"columns": "all"}
+            with open(file_path, "w") as f:
+                f.write("Run #\n5001\n")
+
+            manifest = FileManifest(cache_dir)
+            self.assertIsNone(manifest.load(file_path, options))
+            manifest.store(file_path, pd.DataFrame({"Run #": ["5001"]}), options)
+            manifest.save()
+
+            manifest = FileManifest(cache_dir)
+            self.assertEqual(manifest.load(file_path, options)["Run #"][0], "5001")
+            self.assertIsNone(manifest.load(file_path, {"columns": "report"}))
+
+            with open(file_path, "w") as f:
+                f.write("Run #\n5002\n")
+            self.assertIsNone(FileManifest(cache_dir).load(file_path, options))
+
+
+class ProfilingTest(unittest.TestCase):
+    """
+    Validate stage records collected by the profiler
+    """
+
+    def tearDown(self):
+        profiling.disable()
+
+    def test_records_stages_and_rows(self):
+        profiler = profiling.enable()
+
+        with profiling.stage("outer", rows_in=3) as record:
+            data_processing.normalize_date_column(pd.Series(["6/3/2024"] * 3))
+            record.rows_out = 2
+
+        names = [record.name for record in profiler.records]
+        self.assertEqual(names, ["normalize_date", "outer"])
+        inner, outer = profiler.records
+        self.assertEqual((inner.rows_in, inner.rows_out), (3, 3))
+        self.assertEqual((outer.rows_in, outer.rows_out), (3, 2))
+        self.assertGreaterEqual(outer.peak_memory, inner.peak_memory)
+        self.assertGreaterEqual(outer.wall_time, inner.wall_time)
+        self.assertIn("normalize_date", profiler.summary())
+
+    def test_does_nothing_when_disabled(self):
+        with profiling.stage("merge") as record:
+            record.rows_out = 1
+        self.assertIsNone(profiling._profiler)
+
+
+def report_inputs():
+    """
+    Raw Call the Car and Traumasoft DataFrames for three trips, two of which match
+    """
+    ctc_df = pd.DataFrame(
+        {
+            "Trip ID": [1001, 1002, 1003],
+            "Date of Service": ["6/3/2024", "6/3/2024", "6/4/2024"],
+            "First Name": ["John ", "Wei", "Aisha"],
+            "Last Name": ["Smith", "Chen", "Khan"],
+            "Origin Street": ["123 Main Street", "456 north Oak ave", "1 Broadway"],
+            "Origin City": ["Los Angeles", "Pasadena", "Glendale"],
+            "Origin State": ["CA", "CA", "CA"],
+            "Origin Postal": [90001, 91101, 91203],
+            "Origin Comments": [
+                "Wait time: 90 minutes// Oxygen 2L",
+                "Wait time: 0 minutes// Deep suction//Resp Therapist REQ",
+                "Wait time: 0 minutes// None",
+            ],
+            "Destination Street": ["1 Broadway", "123 Main Street", "9 Elm St apt 5"],
+            "Destination City": ["Glendale", "Los Angeles", "Glendale"],
+            "Destination State": ["CA", "CA", "CA"],
+            "Destination Postal": [91203, 90001, 91203],
+            "Pickup Time": ["08:00", "09:30", "10:00"],
+            "Appointment Time": ["09:00", "10:30", "11:00"],
+            "LOS": ["BLS", "ALS", "BLS"],
+            "Status": ["Completed", "Completed", "Completed"],
+        }
+    )
+    ts_df = pd.DataFrame(
+        {
+            "Run #": ["5001", "5002-1", "5003"],
+            "Date of Service": ["06/03/2024", "06/03/2024", "06/05/2024"],
+            "Patient Name": ["Smith, John", "Chen, Wei", "Khan, Aisha"],
+            "PU Address": ["123 MAIN ST", "456 N Oak Avenue ", "1 Broadway"],
+            "At Scene": ["06/03/2024 08:05", "06/03/2024 09:35", "06/05/2024 10:05"],
+            "At Destination": [
+                "06/03/2024 08:45",
+                "06/03/2024 10:15",
+                "06/05/2024 10:45",
+            ],
+            "Pickup Time": ["08:00", "09:30", "10:00"],
+            "LOS": ["BLS", "ALS", "BLS"],
+            "Status": ["Closed", "Closed", "Closed"],
+            "Crew": ["Doe, J", "Roe, R", "Doe, J"],
+            "Driver's License": ["D123", "D456", "D123"],
+            "VIN": ["1FT", "2FT", "1FT"],
+            "Miles": [12, 7, 3],
+        }
+    )
+    return ctc_df, ts_df
+
+
+class BuildReportTest(unittest.TestCase):
+    """
+    Validate the report built in memory from raw DataFrames
+    """
+
+    def test_merges_matching_trips(self):
+        ctc_df, ts_df = report_inputs()
+        report = pipeline.build_report(
+            ctc_df, ts_df, pipeline.ReportConfig(vendor_name="Viewpoint")
+        )
+
+        self.assertEqual(report.columns.tolist(), pipeline.OUTPUT_COLUMNS)
+        self.assertEqual(report["CTC Trip ID"].tolist(), [1001, 1002])
+        self.assertEqual(report["Vendor Name"].tolist(), ["Viewpoint"] * 2)
+        self.assertEqual(
+            report["Pick Up Address"].tolist(),
+            [
+                "123 MAIN ST, LOS ANGELES, CA, 90001",
+                "456 N OAK AVE, PASADENA, CA, 91101",
+            ],
+        )
+        self.assertEqual(report["Wait Time Minutes"].tolist(), [90, 0])
+        self.assertTrue(pd.isna(report["Oxygen Provided"][1]))
+        self.assertEqual(report["Trip Status"].tolist(), ["Closed", "Closed"])
+
+    def test_encoded_keys_merge_like_values(self):
+        ctc_df, ts_df = pipeline.prepare_inputs(*report_inputs())
+        ts_df.loc[2, "PU Address"] = None
+        ctc_df.loc[2, "PU Address"] = None
+        ts_df.loc[2, "Date of Service"] = ctc_df.loc[2, "Date of Service"]
+
+        ts_codes, ctc_codes, uniques = pipeline.encode_join_keys(ts_df, ctc_df)
+        self.assertEqual(ts_codes["PU Address"].tolist(), [0, 1, -1])
+        self.assertEqual(ctc_codes["PU Address"].tolist(), [0, 1, -1])
+        self.assertEqual(
+            uniques["PU Address"].tolist(), ["123 MAIN ST", "456 N OAK AVE"]
+        )
+
+        expected = pd.merge(ts_df, ctc_df, on=pipeline.JOIN_COLUMNS)
+        report = pipeline.merge_report(ctc_df, ts_df)
+        self.assertEqual(report["CTC Trip ID"].tolist(), [1001, 1002, 1003])
+        pd.testing.assert_series_equal(
+            report["Date of Service"], expected["Date of Service"]
+        )
+
+    def test_leaves_inputs_unchanged(self):
+        ctc_df, ts_df = report_inputs()
+        pipeline.build_report(ctc_df, ts_df)
+        pd.testing.assert_frame_equal(ctc_df, report_inputs()[0])
+        pd.testing.assert_frame_equal(ts_df, report_inputs()[1])
+
+    def test_copy_on_write_gives_same_report(self):
+        expected = pipeline.build_report(*report_inputs())
+        with pd.option_context("mode.copy_on_write", True):
+            ctc_df, ts_df = report_inputs()
+            report = pipeline.build_report(ctc_df, ts_df)
+            pd.testing.assert_frame_equal(ctc_df, report_inputs()[0])
+        pd.testing.assert_frame_equal(report, expected)
+
+
+class JoinEnginesTest(unittest.TestCase):
+    """
+    Validate that every join engine pairs the rows pd.merge pairs, in the same order
+    """
+
+    def key_frames(self, rows, seed=0):
+        rng = random.Random(seed)
+        columns = ["Patient Name", "Date of Service", "PU Address"]
+        left, right = (
+            pd.DataFrame(
+                {
+                    column: [rng.randint(-1, 5) for _ in range(rows)]
+                    for column in columns
+                }
+            )
+            for _ in range(2)
+        )
+        return left, right, columns
+
+    def expected_rows(self, left, right, columns):
+        merged = pd.merge(
+            left.assign(left_row=range(len(left))),
+            right.assign(right_row=range(len(right))),
+            on=columns,
+        )
+        return merged["left_row"].tolist(), merged["right_row"].tolist()
+
+    def test_engines_match_pandas_merge(self):
+        left, right, columns = self.key_frames(500)
+        expected = self.expected_rows(left, right, columns)
+
+        for name, (engine_class, package) in engines.JOIN_ENGINES.items():
+            if package is not None and importlib.util.find_spec(package) is None:
+                continue
+            with self.subTest(engine=name):
+                left_rows, right_rows = engine_class().join(left, right, columns)
+                self.assertEqual((left_rows.tolist(), right_rows.tolist()), expected)
+
+    def test_report_matches_pandas_engine(self):
+        ctc_df, ts_df = pipeline.prepare_inputs(*report_inputs())
+        expected = pipeline.merge_report(ctc_df, ts_df)
+
+        for engine in pipeline.ENGINES:
+            with self.subTest(engine=engine):
+                report = pipeline.merge_report(
+                    ctc_df, ts_df, pipeline.ReportConfig(engine=engine)
+                )
+                pd.testing.assert_frame_equal(report, expected)
+
+    def assert_engine_matches_pandas(self, engine_class, engine):
+        self.assertIsInstance(engines.resolve_join_engine(engine), engine_class)
+
+        left, right, columns = self.key_frames(2000, seed=1)
+        for left_keys, right_keys in (
+            (left, right),
+            (left, right + 10),
+            (left.iloc[:0], right),
+        ):
+            expected = engines.PandasEngine().join(left_keys, right_keys, columns)
+            rows = engine_class().join(left_keys, right_keys, columns)
+            for positions, expected_positions in zip(rows, expected):
+                self.assertEqual(positions.tolist(), expected_positions.tolist())
+
+        ctc_df, ts_df = pipeline.prepare_inputs(*report_inputs())
+        pd.testing.assert_frame_equal(
+            pipeline.merge_report(ctc_df, ts_df, pipeline.ReportConfig(engine=engine)),
+            pipeline.merge_report(ctc_df, ts_df),
+        )
+
+    @unittest.skipUnless(importlib.util.find_spec("polars"), "requires polars")
+    def test_polars_matches_pandas(self):
+        self.assert_engine_matches_pandas(engines.PolarsEngine, "polars")
+
+    @unittest.skipUnless(importlib.util.find_spec("duckdb"), "requires duckdb")
+    def test_duckdb_matches_pandas(self):
+        self.assert_engine_matches_pandas(engines.DuckDBEngine, "duckdb")
+
+    def test_rejects_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            pipeline.resolve_engines("spark")
+        with self.assertRaises(ValueError):
+            engines.resolve_join_engine("pyarrow")
+
+    @unittest.skipIf(importlib.util.find_spec("polars"), "polars is installed")
+    def test_falls_back_to_pandas(self):
+        self.assertIsInstance(
+            engines.resolve_join_engine("polars"), engines.PandasEngine
+        )
+        self.assertEqual(engines.resolve_join_engine("polars").name, "pandas")
+
+
+def multipart_body(files, boundary="report-boundary"):
+    """
+    Encodes files as a multipart/form-data request body
+    """
+    body = b""
+    for filename, content in files.items():
+        body += (
+            (
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="files"; filename="{filename}"\r\n'
+                "Content-Type: text/csv\r\n\r\n"
+            ).encode()
+            + content
+            + b"\r\n"
+        )
+    body += f"--{boundary}--\r\n".encode()
+    return f"multipart/form-data; boundary={boundary}", body
+
+
+class FuzzyMatchTest(unittest.TestCase):
+    """
+    Validate the fuzzy matching of trips the exact merge leaves unmatched
+    """
+
+    def trips(self, names, addresses, dates, ids):
+        return pd.DataFrame(
+            {
+                "Run #": ids,
+                "Trip ID": ids,
+                "Date of Service": pd.to_datetime(dates),
+                "Patient Name": names,
+                "PU Address": addresses,
+            }
+        )
+
+    def test_matches_typos_on_the_same_day(self):
+        ts_df = self.trips(
+            ["Smith, Jon", "Chen, Wei", "Khan, Aisha"],
+            ["123 MAIN ST", "456 N OAK AVE STE 2", "1 BROADWAY"],
+            ["2024-06-03", "2024-06-03", "2024-06-05"],
+            ["5001", "5002", "5003"],
+        )
+        ctc_df = self.trips(
+            ["Smith, John", "Chen, Wei", "Khan, Aisha"],
+            ["123 MAIN ST", "456 N OAK AVE", "1 BROADWAY"],
+            ["2024-06-03", "2024-06-03", "2024-06-04"],
+            [1001, 1002, 1003],
+        )
+        matches, unmatched = matching.fuzzy_match(ts_df, ctc_df)
+
+        self.assertEqual(matches.columns.tolist(), matching.MATCH_COLUMNS)
+        self.assertEqual(
+            sorted(zip(matches["Run #"], matches["CTC Trip ID"])),
+            [("5001", 1001), ("5002", 1002)],
+        )
+        self.assertTrue((matches["Score"] >= 0.85).all())
+        self.assertEqual(
+            sorted(zip(unmatched["Source"], unmatched["ID"])),
+            [("Call the Car", 1003), ("Traumasoft", "5003")],
+        )
+
+    def test_matches_each_trip_once(self):
+        ts_df = self.trips(
+            ["Smith, John", "Smith, John"],
+            ["123 MAIN ST", "123 MAIN ST"],
+            ["2024-06-03"] * 2,
+            ["5001", "5002"],
+        )
+        ctc_df = self.trips(["Smith, Jon"], ["123 MAIN ST"], ["2024-06-03"], [1001])
+        matches, unmatched = matching.fuzzy_match(ts_df, ctc_df)
+
+        self.assertEqual(matches["Run #"].tolist(), ["5001"])
+        self.assertEqual(unmatched["ID"].tolist(), ["5002"])
+
+    def test_indexes_large_blocks(self):
+        count = matching.SMALL_BLOCK_SIZE * 10
+        names = [f"Patient{i}, John" for i in range(count)]
+        addresses = [f"{100 + i} MAIN ST" for i in range(count)]
+        ts_df = self.trips(
+            [name.replace("John", "Jon") for name in names],
+            addresses,
+            ["2024-06-03"] * count,
+            [str(5000 + i) for i in range(count)],
+        )
+        ctc_df = self.trips(
+            names, addresses, ["2024-06-03"] * count, list(range(1000, 1000 + count))
+        )
+        matches, unmatched = matching.fuzzy_match(ts_df, ctc_df)
+
+        self.assertEqual(len(matches), count)
+        self.assertTrue(
+            (matches["Run #"].astype(int) - matches["CTC Trip ID"] == 4000).all()
+        )
+        self.assertTrue(unmatched.empty)
+
+    def test_block_by_zip_requires_column(self):
+        ts_df = self.trips(["Smith, John"], ["1 MAIN ST"], ["2024-06-03"], ["5001"])
+        with self.assertRaises(ValueError):
+            matching.fuzzy_match(ts_df, ts_df, block_by_zip=True)
+
+    def test_block_by_zip_checks_dispatch_files(self):
+        ctc_df, ts_df = report_inputs()
+        config = pipeline.ReportConfig(fuzzy_block_by_zip=True)
+        with tempfile.TemporaryDirectory() as directory:
+            ctc_df.to_csv(os.path.join(directory, "Download_1.csv"), index=False)
+            ts_df.to_csv(os.path.join(directory, "dispatch_1.csv"), index=False)
+            with self.assertRaises(SchemaError) as context:
+                pipeline.prepare_files(directory, config)
+
+            ts_df["PU Zip"] = ["90001", "91101", "91203"]
+            ts_df.to_csv(os.path.join(directory, "dispatch_1.csv"), index=False)
+            _, ts_prepared = pipeline.prepare_files(directory, config)
+
+        self.assertIn("'PU Zip'", str(context.exception))
+        self.assertEqual(ts_prepared["PU Zip"].tolist(), ["90001", "91101", "91203"])
+
+    def test_block_by_zip_requires_fuzzy_match(self):
+        self.assertTrue(
+            main.parse_arguments(["--fuzzy-match", "--fuzzy-zip"]).fuzzy_zip
+        )
+        with contextlib.redirect_stderr(io.StringIO()):
+            with self.assertRaises(SystemExit):
+                main.parse_arguments(["--fuzzy-zip"])
+
+    def test_unmatched_rows_are_dropped_by_merge(self):
+        ctc_df, ts_df = pipeline.prepare_inputs(*report_inputs())
+        merged = pd.merge(ts_df, ctc_df, on=pipeline.JOIN_COLUMNS)
+        unmatched = matching.unmatched_rows(ts_df, ctc_df, pipeline.JOIN_COLUMNS)
+
+        self.assertEqual(unmatched["Run #"].tolist(), ["5003"])
+        self.assertEqual(len(merged) + len(unmatched), len(ts_df))
+
+        matches, unmatched = pipeline.fuzzy_match_report(ctc_df, ts_df)
+        self.assertTrue(matches.empty)
+        self.assertEqual(len(unmatched), 2)
+
+
+class DiagnosticsTest(unittest.TestCase):
+    """
+    Validate the reasons given for unmatched runs and trips
+    """
+
+    def test_reasons(self):
+        ts_df = pd.DataFrame(
+            {
+                "Run #": ["5001", "5002", "5003", "5004", "5005", "5006", "5007"],
+                "Patient Name": [
+                    "Smith, John",
+                    "Chen, Wei",
+                    "Khan, Aisha",
+                    "Diaz, Ana",
+                    "Lee, Min",
+                    "Park, Jae",
+                    None,
+                ],
+                "Date of Service": pd.to_datetime(
+                    [
+                        "2024-06-03",
+                        "2024-06-03",
+                        "2024-06-04",
+                        "2024-06-05",
+                        "2024-06-03",
+                        "2024-07-01",
+                        "2024-06-03",
+                    ]
+                ),
+                "PU Address": [
+                    "1 MAIN ST",
+                    "2 OAK AVE STE 1",
+                    "3 ELM ST",
+                    "4 PINE ST",
+                    "5 BIRCH RD",
+                    "6 CEDAR LN",
+                    "7 ASH CT",
+                ],
+            }
+        )
+        ctc_df = pd.DataFrame(
+            {
+                "Trip ID": [1001, 1002, 1003, 1004, 1008],
+                "Patient Name": [
+                    "Smith, John",
+                    "Chen, Wei",
+                    "Kahn, Aisha",
+                    "Diaz, Ana",
+                    "Gray, Tom",
+                ],
+                "Date of Service": pd.to_datetime(
+                    [
+                        "2024-06-03",
+                        "2024-06-03",
+                        "2024-06-04",
+                        "2024-06-06",
+                        "2024-08-01",
+                    ]
+                ),
+                "PU Address": [
+                    "1 MAIN ST",
+                    "2 OAK AVE",
+                    "3 ELM ST",
+                    "4 PINE ST",
+                    "8 ELM ST",
+                ],
+            }
+        )
+        unmatched_ts, unmatched_ctc = diagnostics.unmatched_trips(
+            ts_df, ctc_df, pipeline.JOIN_COLUMNS
+        )
+
+        self.assertEqual(
+            dict(zip(unmatched_ts["Run #"], unmatched_ts["reason"])),
+            {
+                "5002": "PU Address differs",
+                "5003": "Patient Name differs",
+                "5004": "Date of Service differs",
+                "5005": "Patient Name and PU Address differ",
+                "5006": "no trips on Date of Service",
+                "5007": "missing Patient Name",
+            },
+        )
+        self.assertEqual(
+            dict(zip(unmatched_ctc["Trip ID"], unmatched_ctc["reason"])),
+            {
+                1002: "PU Address differs",
+                1003: "Patient Name differs",
+                1004: "Date of Service differs",
+                1008: "no trips on Date of Service",
+            },
+        )
+        self.assertEqual(
+            unmatched_ts.columns.tolist(), ts_df.columns.tolist() + ["reason"]
+        )
+
+    def test_matches_merge(self):
+        ctc_df, ts_df = pipeline.prepare_inputs(*report_inputs())
+        unmatched_ts, unmatched_ctc = pipeline.diagnose_unmatched(ctc_df, ts_df)
+
+        self.assertEqual(unmatched_ts["Run #"].tolist(), ["5003"])
+        self.assertEqual(unmatched_ctc["Trip ID"].tolist(), [1003])
+        self.assertEqual(unmatched_ts["reason"].tolist(), ["Date of Service differs"])
+
+
+class ServiceTest(unittest.TestCase):
+    """
+    Validate the report service
+    """
+
+    def setUp(self):
+        ctc_df, ts_df = report_inputs()
+        # Exports end with footer rows without a run number
+        ts_df = pd.concat([ts_df, pd.DataFrame({"Run #": ["Total: 3"]})])
+        self.uploads = {
+            "Download.csv": ctc_df.to_csv(index=False).encode(),
+            "dispatch.csv": ts_df.to_csv(index=False).encode(),
+        }
+        self.server = service.ReportServer(("127.0.0.1", 0), workers=1, queue=0)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def post_report(self, files):
+        content_type, body = multipart_body(files)
+        request = urllib.request.Request(
+            f"{self.url}/report", data=body, headers={"Content-Type": content_type}
+        )
+        with urllib.request.urlopen(request) as response:
+            return response.read().decode()
+
+    def test_streams_merged_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for filename, content in self.uploads.items():
+                with open(os.path.join(directory, filename), "wb") as f:
+                    f.write(content)
+            expected = pipeline.build_report_from_files(directory, self.server.config)
+            output_file = os.path.join(directory, "merged.csv")
+            data_processing.write_report(expected, output_file)
+            with open(output_file, encoding="utf-8") as f:
+                self.assertEqual(self.post_report(self.uploads), f.read())
+
+    def test_rejects_unexpected_files(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.post_report({"Download.csv": self.uploads["Download.csv"]})
+        self.assertEqual(context.exception.code, 400)
+
+        with self.assertRaises(ValueError):
+            service.parse_uploads(*multipart_body({"../notes.txt": b""}))
+
+    def test_rejects_renamed_columns(self):
+        uploads = dict(self.uploads)
+        uploads["dispatch.csv"] = uploads["dispatch.csv"].replace(b"VIN", b"Vehicle", 1)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            self.post_report(uploads)
+        self.assertEqual(context.exception.code, 400)
+
+    def test_rejects_requests_over_capacity(self):
+        self.assertTrue(self.server.admit())
+        try:
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                self.post_report(self.uploads)
+            self.assertEqual(context.exception.code, 503)
+            self.assertEqual(context.exception.headers["Retry-After"], "5")
+        finally:
+            self.server.release()
+
+        with urllib.request.urlopen(f"{self.url}/health") as response:
+            self.assertEqual(json.load(response)["admitted"], 0)
+
+
+class StartupTest(unittest.TestCase):
+    """
+    Validate that heavy modules are only imported when needed
+    """
+
+    def loaded_modules(self, code):
+        result = subprocess.run(
+            [sys.executable, "-c", f"{code}; import sys; print(*sys.modules)"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return set(result.stdout.split())
+
+    def test_main_does_not_import_pandas(self):
+        modules = self.loaded_modules("import main")
+        self.assertNotIn("pandas", modules)
+        self.assertNotIn("data_processing", modules)
+
+    def test_data_processing_does_not_load_address_model(self):
+        self.assertNotIn("usaddress", self.loaded_modules("import data_processing"))
+
+    def test_output_formats_match(self):
+        self.assertEqual(main.OUTPUT_FORMATS, data_processing.OUTPUT_FORMATS)
+
+    def test_engines_match(self):
+        self.assertEqual(main.ENGINES, tuple(pipeline.ENGINES))
+
+    def test_csv_compressions_match(self):
+        self.assertEqual(main.CSV_COMPRESSIONS, tuple(data_processing.CSV_COMPRESSIONS))
+
+    def test_partition_keys_match(self):
+        self.assertEqual(main.PARTITION_KEYS, partitions_module.PARTITION_KEYS)
+
+
 if __name__ == "__main__":
     unittest.main()